@@ -0,0 +1,45 @@
+"""add_jobs_queue
+
+Revision ID: a3c7e9b1d5f2
+Revises: f2b6d8e0a1c3
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e9b1d5f2'
+down_revision = 'f2b6d8e0a1c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('status', sa.String(), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('run_at', sa.DateTime(), nullable=False, server_default=sa.text("(now() at time zone 'utc')")),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['public.tenants.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        schema='public'
+    )
+    op.create_index('ix_jobs_queued_run_at', 'jobs', ['run_at'], schema='public', postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ix_jobs_tenant_status', 'jobs', ['tenant_id', 'status'], schema='public')
+
+
+def downgrade():
+    op.drop_index('ix_jobs_tenant_status', table_name='jobs', schema='public')
+    op.drop_index('ix_jobs_queued_run_at', table_name='jobs', schema='public')
+    op.drop_table('jobs', schema='public')
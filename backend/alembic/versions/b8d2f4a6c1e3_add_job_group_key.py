@@ -0,0 +1,25 @@
+"""add_job_group_key
+
+Revision ID: b8d2f4a6c1e3
+Revises: a3c7e9b1d5f2
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b8d2f4a6c1e3'
+down_revision = 'a3c7e9b1d5f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('jobs', sa.Column('group_key', sa.String(), nullable=True), schema='public')
+    op.create_index('ix_jobs_queued_group', 'jobs', ['kind', 'group_key'], schema='public', postgresql_where=sa.text("status = 'queued'"))
+
+
+def downgrade():
+    op.drop_index('ix_jobs_queued_group', table_name='jobs', schema='public')
+    op.drop_column('jobs', 'group_key', schema='public')
@@ -0,0 +1,27 @@
+"""add_trail_next_run_at
+
+Revision ID: c1e5a7b9d3f4
+Revises: b8d2f4a6c1e3
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c1e5a7b9d3f4'
+down_revision = 'b8d2f4a6c1e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL: o agendador calcula a primeira execução das trilhas existentes
+    op.add_column('meta_trails', sa.Column('next_run_at', sa.DateTime(), nullable=True), schema='public')
+    op.create_index('ix_meta_trails_next_run_at', 'meta_trails', ['next_run_at'], schema='public',
+                    postgresql_where=sa.text("trigger_type = 'SCHEDULER' AND is_active"))
+
+
+def downgrade():
+    op.drop_index('ix_meta_trails_next_run_at', table_name='meta_trails', schema='public')
+    op.drop_column('meta_trails', 'next_run_at', schema='public')
@@ -0,0 +1,66 @@
+"""add_trail_run_log
+
+Revision ID: d3f7b9c1e5a8
+Revises: c1e5a7b9d3f4
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'd3f7b9c1e5a8'
+down_revision = 'c1e5a7b9d3f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trail_runs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('trail_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('trail_version', sa.DateTime(), nullable=True),
+        sa.Column('trigger', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('node_count', sa.Integer(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('duration_ms', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['public.tenants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['trail_id'], ['public.meta_trails.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        schema='public'
+    )
+    op.create_index('ix_trail_runs_tenant_trail_started', 'trail_runs', ['tenant_id', 'trail_id', 'started_at'], schema='public')
+
+    op.create_table('trail_run_steps',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('run_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('trail_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('node_id', sa.String(), nullable=False),
+        sa.Column('node_type', sa.String(), nullable=True),
+        sa.Column('action_type', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('config_size', sa.Integer(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=False),
+        sa.Column('duration_ms', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['run_id'], ['public.trail_runs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        schema='public'
+    )
+    op.create_index('ix_trail_run_steps_run', 'trail_run_steps', ['run_id'], schema='public')
+    op.create_index('ix_trail_run_steps_tenant_started', 'trail_run_steps', ['tenant_id', 'started_at'], schema='public')
+
+
+def downgrade():
+    op.drop_index('ix_trail_run_steps_tenant_started', table_name='trail_run_steps', schema='public')
+    op.drop_index('ix_trail_run_steps_run', table_name='trail_run_steps', schema='public')
+    op.drop_table('trail_run_steps', schema='public')
+    op.drop_index('ix_trail_runs_tenant_trail_started', table_name='trail_runs', schema='public')
+    op.drop_table('trail_runs', schema='public')
@@ -0,0 +1,35 @@
+"""add_index_flags_to_meta_fields
+
+Revision ID: d4e8f1a2b3c6
+Revises: c5d9a1b2e3f4
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8f1a2b3c6'
+down_revision = 'c5d9a1b2e3f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Flags that drive the managed entity_records indexes (IndexManager)
+    op.add_column('meta_fields', sa.Column('is_filterable', sa.Boolean(), server_default=sa.text('false'), nullable=True), schema='public')
+    op.add_column('meta_fields', sa.Column('is_sortable', sa.Boolean(), server_default=sa.text('false'), nullable=True), schema='public')
+
+    # Default keyset order of the list endpoint: (entity_id, created_at, id)
+    op.create_index(
+        'ix_entity_records_entity_created',
+        'entity_records',
+        ['entity_id', 'created_at', 'id'],
+        schema='public'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_entity_records_entity_created', table_name='entity_records', schema='public')
+    op.drop_column('meta_fields', 'is_sortable', schema='public')
+    op.drop_column('meta_fields', 'is_filterable', schema='public')
@@ -0,0 +1,62 @@
+"""add_search_columns_to_entity_records
+
+Revision ID: e7a1c3d5f9b2
+Revises: d4e8f1a2b3c6
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'e7a1c3d5f9b2'
+down_revision = 'd4e8f1a2b3c6'
+branch_labels = None
+depends_on = None
+
+# Keep in sync with app.engine.services.search_service.SEARCH_FIELD_TYPES
+SEARCH_FIELD_TYPES = "('text', 'long_text', 'select', 'email', 'phone', 'whatsapp')"
+
+
+def upgrade():
+    op.add_column('entity_records', sa.Column('search_text', sa.Text(), nullable=True), schema='public')
+    op.add_column('entity_records', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True), schema='public')
+
+    # Backfill from the text-typed fields of each entity
+    op.execute(f"""
+        UPDATE public.entity_records r
+        SET search_text = s.doc,
+            search_vector = to_tsvector('simple', s.doc)
+        FROM (
+            SELECT r2.id,
+                   string_agg(r2.data->>f.name, ' ' ORDER BY f.created_at)
+                       FILTER (WHERE jsonb_typeof(r2.data->f.name) NOT IN ('object', 'array')) AS doc
+            FROM public.entity_records r2
+            JOIN public.meta_fields f ON f.entity_id = r2.entity_id
+            WHERE f.field_type IN {SEARCH_FIELD_TYPES} AND f.is_virtual IS NOT TRUE
+            GROUP BY r2.id
+        ) s
+        WHERE s.id = r.id
+    """)
+
+    op.create_index('ix_entity_records_search', 'entity_records', ['search_vector'], schema='public', postgresql_using='gin')
+
+    # Optional substring search (SEARCH_TRIGRAM=1): only if pg_trgm can be installed
+    op.execute("""
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS ix_entity_records_search_trgm
+                ON public.entity_records USING gin (search_text gin_trgm_ops);
+        EXCEPTION WHEN others THEN
+            RAISE NOTICE 'pg_trgm unavailable, skipping trigram index: %', SQLERRM;
+        END $$;
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS public.ix_entity_records_search_trgm")
+    op.drop_index('ix_entity_records_search', table_name='entity_records', schema='public')
+    op.drop_column('entity_records', 'search_vector', schema='public')
+    op.drop_column('entity_records', 'search_text', schema='public')
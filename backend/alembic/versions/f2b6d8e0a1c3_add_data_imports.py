@@ -0,0 +1,46 @@
+"""add_data_imports
+
+Revision ID: f2b6d8e0a1c3
+Revises: e7a1c3d5f9b2
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d8e0a1c3'
+down_revision = 'e7a1c3d5f9b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('data_imports',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('entity_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('mapping', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('dry_run', sa.Boolean(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('processed_rows', sa.Integer(), nullable=True),
+        sa.Column('inserted_rows', sa.Integer(), nullable=True),
+        sa.Column('error_count', sa.Integer(), nullable=True),
+        sa.Column('errors', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.Column('created_by', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['public.tenants.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['entity_id'], ['public.meta_entities.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        schema='public'
+    )
+    op.create_index('ix_data_imports_tenant_created', 'data_imports', ['tenant_id', 'created_at'], schema='public')
+
+
+def downgrade():
+    op.drop_index('ix_data_imports_tenant_created', table_name='data_imports', schema='public')
+    op.drop_table('data_imports', schema='public')
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from ..db import session, models, schemas, models_system
 from ..core import security
 from typing import List
+from app.core.tenant_cache import tenant_cache
 
 router = APIRouter()
 
@@ -78,6 +79,7 @@ def create_tenant_user( # Renomeado para clareza
     
     db.commit()
     db.refresh(db_user)
+    tenant_cache.invalidate_membership(db_user.id, tenant_id)
     return db_user
 
 @router.get("/users", 
@@ -21,7 +21,7 @@ class DemoService:
         db = session.SessionCrm()
         schema_name = f"tenant_{tenant_id}"
         # Set Search Path to Tenant schema then Public (for global access if needed)
-        db.execute(text(f"SET search_path TO \"{schema_name}\", public"))
+        session.set_search_path(db, session.tenant_search_path(schema_name))
         return db
 
     def start_demo(self, tenant_id: int, user_id: Optional[int] = None):
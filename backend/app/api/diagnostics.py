@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Request, HTTPException
 from app.services.diagnostic_engine import DiagnosticEngine
+from app.core.http_client import http_pool
 from pydantic import BaseModel
 from typing import Optional
 
@@ -20,3 +21,11 @@ def run_diagnostics(
     engine = DiagnosticEngine()
     results = engine.run_all(tenant_slug=payload.tenant_slug)
     return results
+
+@router.get("/outbound-http")
+def outbound_http_metrics(request: Request):
+    """Per-destination latency, failure and circuit-breaker state of this process's outbound HTTP pool."""
+    if not getattr(request.state, "is_sysadmin", False):
+        raise HTTPException(status_code=403, detail="Requires SysAdmin privileges")
+
+    return http_pool.snapshot()
@@ -8,6 +8,7 @@ from app.system import models as models_system
 from app.engine import models_tenant
 from app.engine.services.seeder import seed_tenant_defaults
 from app.core import security
+from app.core.tenant_cache import tenant_cache
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -60,6 +61,8 @@ def create_tenant(
         db.add(membership)
         db.commit() # Commit Global State
         db.refresh(new_tenant)
+        tenant_cache.invalidate_tenant(new_tenant.slug)
+        tenant_cache.invalidate_membership(admin_user.id, new_tenant.id)
 
         # C2. Seed Defaults
         seed_tenant_defaults(db, new_tenant.id)
@@ -83,9 +86,8 @@ def create_tenant(
             conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS \"{schema_name}\""))
             conn.commit()
             
-            # Initialize Tables
-            conn.execute(text(f"SET search_path TO \"{schema_name}\", public"))
-            conn.commit()
+            # Initialize Tables (SET LOCAL: the pooled connection goes back on public)
+            conn.execute(text(f"SET LOCAL search_path TO {session.tenant_search_path(schema_name)}"))
             
             # Use BaseCrm from session (populated by models_tenant import)
             session.BaseCrm.metadata.create_all(bind=conn)
@@ -103,6 +105,7 @@ def create_tenant(
             # Ideally delete membership too if we just created it?
             # For MVP/SaaS Lite, let's keep it simple: Just try to delete tenant.
             db.commit()
+            tenant_cache.invalidate_tenant()
         except:
             pass
         raise HTTPException(status_code=500, detail=f"Failed to provision schema: {str(e)}")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, Request, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from ..db import session, models_tenant, schemas
@@ -23,7 +23,6 @@ def preview_order(
 def create_order(
     order: schemas.OrderCreate,
     request: Request,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(session.get_crm_db)
 ):
     # 1. Setup Context
@@ -66,10 +65,9 @@ def create_order(
     )
     
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    db.flush()
     
-    # 5. Dispatch Webhook
+    # 5. Webhook (outbox): gravado na mesma transação do pedido, entregue pelo worker
     from ..services.webhook_service import WebhookService
     webhook_service = WebhookService(db)
     
@@ -79,9 +77,10 @@ def create_order(
         "client_id": db_order.client_id,
         "created_at": str(db_order.created_at)
     }
+    webhook_service.enqueue_event("order.created", payload, tenant_id=getattr(request.state, "tenant_id", None))
     
-    # Executa em Background para não travar a req
-    background_tasks.add_task(webhook_service.dispatch_event, "order.created", payload)
+    db.commit()
+    db.refresh(db_order)
     
     return db_order
 
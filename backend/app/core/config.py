@@ -16,4 +16,63 @@ class Settings:
     # Integração N8N (Chave estática para segurança de Webhook)
     N8N_API_KEY: str = os.getenv("N8N_API_KEY", "sua_chave_secreta_n8n_aqui_altere_em_producao")
 
+    # Formula Engine (LRU de fórmulas compiladas, por processo)
+    FORMULA_CACHE_SIZE: int = int(os.getenv("FORMULA_CACHE_SIZE", 1024))
+
+    # Planos de execução de trilhas compilados (trail_compiler), por processo
+    TRAIL_PLAN_CACHE_SIZE: int = int(os.getenv("TRAIL_PLAN_CACHE_SIZE", 512))
+    # Ramos simultâneos de um nó PARALLEL (sobrescrito por trigger_config.max_concurrency da trilha)
+    TRAIL_MAX_PARALLEL: int = int(os.getenv("TRAIL_MAX_PARALLEL", 4))
+    # Log de execuções (trail_runs/trail_run_steps): buffer por processo gravado em lotes
+    # (ao atingir BATCH_SIZE nós ou a cada FLUSH_SECONDS); runs mais antigas que RETENTION_DAYS são removidas pelo worker
+    TRAIL_RUN_LOG: bool = os.getenv("TRAIL_RUN_LOG", "1").lower() in ("1", "true", "yes")
+    TRAIL_RUN_LOG_BATCH_SIZE: int = int(os.getenv("TRAIL_RUN_LOG_BATCH_SIZE", 500))
+    TRAIL_RUN_LOG_FLUSH_SECONDS: float = float(os.getenv("TRAIL_RUN_LOG_FLUSH_SECONDS", 5.0))
+    TRAIL_RUN_LOG_RETENTION_DAYS: int = int(os.getenv("TRAIL_RUN_LOG_RETENTION_DAYS", 30))
+
+    # Cache de metadados (MetaEntity/MetaField) por tenant. Com TENANT_CACHE_URL a invalidação
+    # alcança todos os workers (token no Redis); sem ela, o TTL é o limite da defasagem entre workers.
+    METADATA_CACHE_TTL: int = int(os.getenv("METADATA_CACHE_TTL", 60))
+
+    # Índice de gatilhos (entidade/evento -> trilhas e workflows) por tenant. Reconstruído
+    # quando a versão de origem muda: token no Redis com TENANT_CACHE_URL, senão uma query
+    # agregada em meta_trails/meta_workflows. O TTL é só uma recarga de segurança.
+    TRIGGER_INDEX_TTL: int = int(os.getenv("TRIGGER_INDEX_TTL", 30))
+
+    # Cache de autenticação do TenantMiddleware (tenant/membership/API key).
+    # TENANT_CACHE_URL (redis://...) compartilha o cache entre workers; vazio = cache local.
+    # Requer o pacote opcional redis (pip install redis), fora do requirements.txt.
+    TENANT_CACHE_TTL: int = int(os.getenv("TENANT_CACHE_TTL", 60))
+    TENANT_CACHE_URL: Optional[str] = os.getenv("TENANT_CACHE_URL")
+
+    # Fila de jobs (workflows/webhooks/trilhas) processada por `python -m app.worker`
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", 8))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+    JOB_RETRY_BASE_SECONDS: int = int(os.getenv("JOB_RETRY_BASE_SECONDS", 10))
+    JOB_RETRY_MAX_SECONDS: int = int(os.getenv("JOB_RETRY_MAX_SECONDS", 3600))
+    JOB_LOCK_TIMEOUT: int = int(os.getenv("JOB_LOCK_TIMEOUT", 900))
+    JOB_HEARTBEAT_INTERVAL: float = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 60.0)) # renova locked_at dos jobs em execução
+
+    # Pool HTTP de saída (app.core.http_client): conexões, limite por destino, timeouts e circuit breaker
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_PER_HOST: int = int(os.getenv("HTTP_MAX_PER_HOST", 10))
+    HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", 10.0))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5.0))
+    HTTP_BREAKER_THRESHOLD: int = int(os.getenv("HTTP_BREAKER_THRESHOLD", 5))
+    HTTP_BREAKER_COOLDOWN: float = float(os.getenv("HTTP_BREAKER_COOLDOWN", 30.0))
+
+    # Outbox de webhooks (WebhookConfig). WEBHOOK_BATCH_MAX > 1 agrupa eventos do mesmo
+    # webhook em um POST; WEBHOOK_BATCH_WINDOW segura o envio para acumular a rajada.
+    WEBHOOK_BATCH_MAX: int = int(os.getenv("WEBHOOK_BATCH_MAX", 1))
+    WEBHOOK_BATCH_WINDOW: float = float(os.getenv("WEBHOOK_BATCH_WINDOW", 2.0))
+
+    # Agendador de trilhas SCHEDULER (roda no worker; seguro com várias réplicas)
+    SCHEDULER_TICK_SECONDS: float = float(os.getenv("SCHEDULER_TICK_SECONDS", 15))
+    SCHEDULER_BATCH_SIZE: int = int(os.getenv("SCHEDULER_BATCH_SIZE", 100))
+
+    # Busca global (?q=): config do to_tsvector e substring via pg_trgm (requer a extensão)
+    SEARCH_TS_CONFIG: str = os.getenv("SEARCH_TS_CONFIG", "simple")
+    SEARCH_TRIGRAM: bool = os.getenv("SEARCH_TRIGRAM", "0").lower() in ("1", "true", "yes")
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,233 @@
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from collections import deque
+from typing import Any, Dict, Optional
+import httpx
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pool HTTP de saída do processo (webhooks, workflows, trilhas, IA, geocodificação).
+#   - Clientes compartilhados com keep-alive: um AsyncClient por event loop e um Client
+#     síncrono (thread-safe) para o código que roda em threads.
+#   - Limite de requisições simultâneas por destino (host:porta).
+#   - Circuit breaker por destino: HTTP_BREAKER_THRESHOLD falhas seguidas abrem o circuito;
+#     chamadas falham na hora (CircuitOpenError) até HTTP_BREAKER_COOLDOWN, depois uma
+#     chamada de teste (half-open) decide se fecha ou reabre.
+#   - Métricas por destino (latência, falhas, rejeições) em snapshot().
+# Falha = erro de transporte/timeout ou status 5xx/429. Outros status voltam ao chamador.
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str, retry_in: float):
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(f"Circuit open for {host} (retry in {retry_in:.0f}s)")
+
+class HostState:
+    """Breaker + métricas de um destino. Acesso sempre sob OutboundHttp._lock."""
+
+    LATENCY_SAMPLES = 256
+
+    def __init__(self):
+        self.state = "closed" # closed | open | half_open
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_status: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 1) if ordered else None
+        return {
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "consecutive_failures": self.consecutive_failures,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": round(ordered[-1], 1) if ordered else None},
+        }
+
+class OutboundHttp:
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_per_host: int = 10,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 30.0,
+    ):
+        self.max_per_host = max_per_host
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, HostState] = {}
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_slots: Dict[str, threading.BoundedSemaphore] = {}
+        # AsyncClient e semáforos asyncio pertencem a um event loop
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+    # --- Breaker / métricas ---
+
+    @staticmethod
+    def _host_key(url) -> str:
+        parsed = httpx.URL(url)
+        return f"{parsed.host}:{parsed.port or (443 if parsed.scheme == 'https' else 80)}"
+
+    def _acquire(self, host: str) -> bool:
+        """
+        Registra o início da chamada ou levanta CircuitOpenError.
+        Retorna True se esta chamada é a de teste (half-open): só ela decide o estado no _release.
+        """
+        with self._lock:
+            st = self._hosts.setdefault(host, HostState())
+            if st.state == "open":
+                elapsed = time.monotonic() - st.opened_at
+                if elapsed < self.breaker_cooldown:
+                    st.rejected += 1
+                    raise CircuitOpenError(host, self.breaker_cooldown - elapsed)
+                st.state = "half_open"
+            probe = False
+            if st.state == "half_open":
+                if st.probe_in_flight:
+                    st.rejected += 1
+                    raise CircuitOpenError(host, 0)
+                st.probe_in_flight = probe = True
+            st.in_flight += 1
+            return probe
+
+    def _release(self, host: str, started: float, probe: bool, status: Optional[int] = None, error: Optional[str] = None):
+        """Sem status nem erro: chamada interrompida (cancelamento/shutdown), só libera o slot e a sonda."""
+        failed = error is not None or (status is not None and (status >= 500 or status == 429))
+        with self._lock:
+            st = self._hosts[host]
+            st.in_flight -= 1
+            if probe:
+                st.probe_in_flight = False
+            if status is None and error is None:
+                return # não diz nada sobre o destino: o próximo _acquire faz nova sonda
+            st.requests += 1
+            st.latencies.append((time.perf_counter() - started) * 1000)
+            st.last_status = status
+            # Chamadas iniciadas antes de o circuito abrir não fecham nem reabrem o circuito
+            if failed:
+                st.failures += 1
+                st.consecutive_failures += 1
+                st.last_error = error or f"HTTP {status}"
+                if probe or (st.state == "closed" and st.consecutive_failures >= self.breaker_threshold):
+                    logger.warning(f"[HTTP] Circuit opened for {host}: {st.last_error}")
+                    st.state = "open"
+                    st.opened_at = time.monotonic()
+            elif probe:
+                logger.info(f"[HTTP] Circuit closed for {host}")
+                st.consecutive_failures = 0
+                st.state = "closed"
+            elif st.state == "closed":
+                st.consecutive_failures = 0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Métricas por destino deste processo."""
+        with self._lock:
+            return {host: st.snapshot() for host, st in sorted(self._hosts.items())}
+
+    # --- Async ---
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+            state = (client, {})
+            self._loops[loop] = state
+        return state
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Requisição pelo pool async. kwargs seguem httpx (json, headers, params, timeout...)."""
+        host = self._host_key(url)
+        client, slots = self._loop_state()
+        slot = slots.get(host)
+        if slot is None:
+            slot = slots[host] = asyncio.Semaphore(self.max_per_host)
+
+        async with slot:
+            probe = self._acquire(host)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except Exception as e:
+                self._release(host, started, probe, error=f"{type(e).__name__}: {e}")
+                raise
+            except BaseException:
+                # CancelledError/KeyboardInterrupt: sem isso in_flight vaza e uma sonda presa bloqueia o host
+                self._release(host, started, probe)
+                raise
+            self._release(host, started, probe, status=response.status_code)
+            return response
+
+    async def aclose(self):
+        """Fecha o AsyncClient do event loop atual (shutdown)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        state = self._loops.pop(loop, None)
+        if state:
+            await state[0].aclose()
+
+    # --- Síncrono (código que roda em threads: ações das trilhas, IA) ---
+
+    def request_sync(self, method: str, url: str, **kwargs) -> httpx.Response:
+        host = self._host_key(url)
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(limits=self._limits, timeout=self._timeout)
+            client = self._sync_client
+            slot = self._sync_slots.get(host)
+            if slot is None:
+                slot = self._sync_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+
+        with slot:
+            probe = self._acquire(host)
+            started = time.perf_counter()
+            try:
+                response = client.request(method, url, **kwargs)
+            except Exception as e:
+                self._release(host, started, probe, error=f"{type(e).__name__}: {e}")
+                raise
+            except BaseException:
+                # CancelledError/KeyboardInterrupt: sem isso in_flight vaza e uma sonda presa bloqueia o host
+                self._release(host, started, probe)
+                raise
+            self._release(host, started, probe, status=response.status_code)
+            return response
+
+    def close(self):
+        with self._lock:
+            client, self._sync_client = self._sync_client, None
+        if client:
+            client.close()
+
+http_pool = OutboundHttp(
+    max_connections=settings.HTTP_MAX_CONNECTIONS,
+    max_per_host=settings.HTTP_MAX_PER_HOST,
+    timeout=settings.HTTP_TIMEOUT,
+    connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+    breaker_threshold=settings.HTTP_BREAKER_THRESHOLD,
+    breaker_cooldown=settings.HTTP_BREAKER_COOLDOWN,
+)
@@ -0,0 +1,210 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.shared.database import SessionSys
+from app.system import models as models_system
+
+logger = logging.getLogger(__name__)
+
+# Cache das consultas de autenticação do TenantMiddleware:
+#   slug:<slug>                  -> {"id", "slug"}           (Tenant)
+#   member:<user_id>:<tenant_id> -> {"role"}                 (Membership)
+#   user_tenant:<user_id>        -> {"slug"}                 (tenant padrão do usuário)
+#   apikey:<sha256(key)>         -> {"tenant_id", "slug"}    (ApiKey ativa)
+# Resultados negativos também são guardados ({}), para não ir ao banco a cada
+# slug/chave inválidos. Os endpoints que alteram tenants/memberships chamam os
+# invalidate_*; chaves de API são invalidadas por evento do ORM (alterada/excluída,
+# após o commit). O TTL limita a defasagem entre workers quando o store é local.
+# RedisStore usa o pacote redis, opcional (fora do requirements.txt): só com TENANT_CACHE_URL.
+
+class LocalStore:
+    """Store em memória (por processo), com TTL. Também serve de fake nos testes."""
+
+    shared = False
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if time.monotonic() >= expires_at:
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value, ttl: int):
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                now = time.monotonic()
+                for k in [k for k, (exp, _) in self._data.items() if exp <= now]:
+                    del self._data[k]
+                if len(self._data) >= self.max_entries:
+                    self._data.clear()
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class RedisStore:
+    """Store compartilhado entre workers (TENANT_CACHE_URL=redis://...). Requer o pacote redis (pip install redis)."""
+
+    PREFIX = "tenant_cache:"
+    shared = True
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self._client.get(self.PREFIX + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value, ttl: int):
+        self._client.set(self.PREFIX + key, json.dumps(value), ex=ttl)
+
+    def delete(self, *keys: str):
+        if keys:
+            self._client.delete(*[self.PREFIX + k for k in keys])
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.PREFIX + "*"):
+            self._client.delete(key)
+
+class TenantCache:
+    def __init__(self, store, ttl_seconds: int = 60, session_factory: Callable = SessionSys):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.session_factory = session_factory
+
+    def _cached(self, key: str, loader: Callable) -> Dict[str, Any]:
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            logger.warning(f"[TenantCache] Store read failed ({key}): {e}")
+            value = None
+        if value is not None:
+            return value
+
+        db = self.session_factory()
+        try:
+            value = loader(db) or {}
+        finally:
+            db.close()
+
+        try:
+            self.store.set(key, value, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"[TenantCache] Store write failed ({key}): {e}")
+        return value
+
+    @staticmethod
+    def _api_key_hash(api_key: str) -> str:
+        # A chave em si não vai para o store
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    # --- Consultas ---
+
+    def tenant_by_slug(self, slug: str) -> Optional[Dict[str, Any]]:
+        def load(db):
+            tenant = db.query(models_system.Tenant).filter(models_system.Tenant.slug == slug).first()
+            return {"id": str(tenant.id), "slug": tenant.slug} if tenant else None
+        return self._cached(f"slug:{slug}", load) or None
+
+    def membership_role(self, user_id, tenant_id) -> Optional[Dict[str, Any]]:
+        """{"role": ...} se o usuário pertence ao tenant, senão None."""
+        def load(db):
+            membership = db.query(models_system.Membership).filter(
+                models_system.Membership.user_id == user_id,
+                models_system.Membership.tenant_id == tenant_id
+            ).first()
+            return {"role": membership.role} if membership else None
+        return self._cached(f"member:{user_id}:{tenant_id}", load) or None
+
+    def default_tenant_slug(self, user_id) -> Optional[str]:
+        def load(db):
+            membership = db.query(models_system.Membership).filter(
+                models_system.Membership.user_id == user_id
+            ).first()
+            return {"slug": membership.tenant.slug} if membership else None
+        return self._cached(f"user_tenant:{user_id}", load).get("slug")
+
+    def tenant_for_api_key(self, api_key: str) -> Optional[Dict[str, Any]]:
+        """{"tenant_id", "slug"} da chave ativa; {"tenant_id": ..., "slug": None} se o tenant sumiu; None se inválida."""
+        def load(db):
+            key_record = db.query(models_system.ApiKey).filter(
+                models_system.ApiKey.key == api_key,
+                models_system.ApiKey.is_active == True
+            ).first()
+            if not key_record:
+                return None
+            tenant = db.query(models_system.Tenant).filter(models_system.Tenant.id == key_record.tenant_id).first()
+            return {"tenant_id": str(key_record.tenant_id), "slug": tenant.slug if tenant else None}
+        return self._cached(f"apikey:{self._api_key_hash(api_key)}", load) or None
+
+    # --- Invalidação ---
+
+    def invalidate_tenant(self, slug: Optional[str] = None):
+        """Tenant criado/alterado (slug). Sem slug: descarta tudo (ex: tenant removido)."""
+        if slug is None:
+            self.store.clear()
+        else:
+            self.store.delete(f"slug:{slug}")
+
+    def invalidate_membership(self, user_id, tenant_id=None):
+        keys = [f"user_tenant:{user_id}"]
+        if tenant_id is not None:
+            keys.append(f"member:{user_id}:{tenant_id}")
+        self.store.delete(*keys)
+
+    def invalidate_api_key(self, api_key: str):
+        self.store.delete(f"apikey:{self._api_key_hash(api_key)}")
+
+def _build_store():
+    if settings.TENANT_CACHE_URL:
+        try:
+            return RedisStore(settings.TENANT_CACHE_URL)
+        except Exception as e:
+            logger.error(f"[TenantCache] Shared store unavailable, using local cache: {e}")
+    return LocalStore()
+
+tenant_cache = TenantCache(_build_store(), ttl_seconds=settings.TENANT_CACHE_TTL)
+
+# Chave revogada (is_active=False), trocada ou excluída: sai do cache no commit, em qualquer
+# caminho de escrita (rota, script, admin), sem esperar o TTL.
+@event.listens_for(models_system.ApiKey, "after_update")
+@event.listens_for(models_system.ApiKey, "after_delete")
+def _queue_api_key_invalidation(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    keys = {target.key, *inspect(target).attrs.key.history.deleted}
+    session.info.setdefault("changed_api_keys", set()).update(k for k in keys if k)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_api_keys(session):
+    for api_key in session.info.pop("changed_api_keys", ()):
+        try:
+            tenant_cache.invalidate_api_key(api_key)
+        except Exception as e:
+            logger.warning(f"[TenantCache] API key invalidation failed: {e}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_api_key_invalidation(session):
+    session.info.pop("changed_api_keys", None)
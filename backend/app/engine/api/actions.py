@@ -4,7 +4,7 @@ from app.shared import database
 from app.engine.metadata import models as models_meta, data_models
 from app.system import models as models_system
 from app.engine.services.workflow_service import WorkflowService
-from app.engine.services.trail_executor import TrailExecutor
+from app.engine.services.trail_executor import TrailExecutor, TrailNodeError
 from app.engine.formulas import FormulaEngine
 from typing import Dict, Any, Optional
 import logging
@@ -62,18 +62,17 @@ async def proxy_webhook(
     Proxies a webhook call to avoid CORS issues on frontend.
     Payload: { "url": "...", "data": ... }
     """
-    import httpx
+    from app.core.http_client import http_pool
     url = payload.get("url")
     data = payload.get("data")
     if not url:
         raise HTTPException(status_code=400, detail="URL obrigatoria")
 
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(url, json=data, timeout=10.0)
-            return {"status": resp.status_code, "response": resp.text}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        resp = await http_pool.request("POST", url, json=data)
+        return {"status": resp.status_code, "response": resp.text}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 def _execute_logic(action, payload, db, background_tasks, user_id: Optional[str] = None):
     tenant_id = action.tenant_id
@@ -149,19 +148,18 @@ def _execute_logic(action, payload, db, background_tasks, user_id: Optional[str]
                 data=data_to_save
             )
             db.add(record)
-            db.commit()
-            db.refresh(record)
             
-            # Trigger Workflows
-            background_tasks.add_task(
-                WorkflowService.trigger_workflows,
-                db=db,
+            # Trigger Workflows (job queue, same transaction)
+            WorkflowService.enqueue_event(
+                db,
                 entity_slug=entity_slug,
                 trigger_type="ON_CREATE",
-                payload_data=record.data,
+                payload_data=data_to_save,
                 tenant_id=tenant_id,
                 user_id=user_id
             )
+            db.commit()
+            db.refresh(record)
             return {"status": "success", "action": "CREATE_ITEM", "record_id": str(record.id)}
 
         elif action.action_type == 'EDIT_ITEM':
@@ -211,19 +209,18 @@ def _execute_logic(action, payload, db, background_tasks, user_id: Optional[str]
                     logger.error(f"Failed to calculate formula for {field.name}: {e}")
 
             record.data = calculated_data
-            db.commit()
             
-            # Trigger Workflows
-            background_tasks.add_task(
-                WorkflowService.trigger_workflows,
-                db=db,
+            # Trigger Workflows (job queue, same transaction)
+            WorkflowService.enqueue_event(
+                db,
                 entity_slug=entity_slug,
                 trigger_type="ON_UPDATE",
-                payload_data=record.data,
+                payload_data=calculated_data,
                 tenant_id=tenant_id,
                 user_id=user_id,
                 changes={"old": old_data, "new": calculated_data} # Use calculated data
             )
+            db.commit()
             return {"status": "success", "action": "EDIT_ITEM", "record_id": str(record.id)}
 
         elif action.action_type == 'DELETE_ITEM':
@@ -239,17 +236,16 @@ def _execute_logic(action, payload, db, background_tasks, user_id: Optional[str]
             
             deleted_data = record.data.copy()
             db.delete(record)
-            db.commit()
             
-            background_tasks.add_task(
-                WorkflowService.trigger_workflows,
-                db=db,
+            WorkflowService.enqueue_event(
+                db,
                 entity_slug=entity_slug,
                 trigger_type="ON_DELETE",
                 payload_data=deleted_data,
                 tenant_id=tenant_id,
                 user_id=user_id
             )
+            db.commit()
             return {"status": "success", "action": "DELETE_ITEM"}
 
         elif action.action_type == 'EMAIL':
@@ -365,8 +361,12 @@ def execute_trail(
     # Instantiate Executor
     executor = TrailExecutor(db, tenant_id, user_id=user_id)
     
-    # Run Trail
-    final_results = executor.execute_trail(str(trail.id), context_data)
+    # Run Trail (exceção em um nó desfaz a execução inteira)
+    try:
+        final_results = executor.execute_trail(str(trail.id), context_data, trigger="manual")
+    except TrailNodeError as e:
+        logger.error(f"[Trail] {trail.name} rolled back: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
     
     # Analyze Final Results for Client Instructions
     instruction = None
@@ -380,8 +380,8 @@ def execute_trail(
                     "type": "URL",
                     "config": {"url": node_res.get("url")}
                 }
-            if node_res.get("instruction"):
-                 instruction = node_res.get("instruction")
+            if node_res.get("instruction") or node_res.get("__client_instruction"):
+                 instruction = node_res.get("instruction") or node_res.get("__client_instruction")
 
     return {
         "status": "success", 
@@ -1,8 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from uuid import UUID
+from datetime import datetime, timedelta
+from sqlalchemy import func, case
 from pydantic import BaseModel
-from app.shared.database import get_crm_db
+from app.shared.database import get_crm_db, get_db
+from app.engine.metadata import data_models
+from app.engine.services.job_queue import JobQueue
+from app.engine.services.trail_run_log import trail_run_log
+from app.engine.metadata import models as models_meta
 from app.engine.automation.service import AutomationService
 from app.engine.automation.definitions import ACTION_DEFINITIONS
 
@@ -13,12 +20,12 @@ class TrailRunRequest(BaseModel):
     context: Dict[str, Any] = {}
 
 @router.post("/run")
-def run_trail(payload: TrailRunRequest, db: Session = Depends(get_crm_db)):
+def run_trail(payload: TrailRunRequest, request: Request, db: Session = Depends(get_crm_db)):
     """
     Executa uma trilha de automação.
     Requer contexto de tenant (header X-Tenant-Slug ou similar via get_crm_db).
     """
-    service = AutomationService(db)
+    service = AutomationService(db, request.state.tenant_id, user_id=request.state.user_id if hasattr(request.state, 'user_id') else None)
     try:
         result = service.run_trail(payload.trail_id, payload.context)
         return result
@@ -32,3 +39,155 @@ def run_trail(payload: TrailRunRequest, db: Session = Depends(get_crm_db)):
 @router.get("/definitions")
 def get_definitions():
     return ACTION_DEFINITIONS
+
+# --- Job Queue (workflow events, webhooks, trail runs) ---
+
+@router.get("/jobs")
+def list_jobs(
+    request: Request,
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """Jobs do tenant (mais recentes primeiro). status=dead lista a dead-letter."""
+    query = db.query(data_models.Job).filter(data_models.Job.tenant_id == request.state.tenant_id)
+    if status:
+        query = query.filter(data_models.Job.status == status)
+    if kind:
+        query = query.filter(data_models.Job.kind == kind)
+    jobs = query.order_by(data_models.Job.created_at.desc()).limit(min(max(limit, 1), 200)).all()
+    return [{
+        "id": str(job.id),
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_at": job.run_at,
+        "last_error": job.last_error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    } for job in jobs]
+
+@router.post("/jobs/{job_id}/retry")
+def retry_job(job_id: UUID, request: Request, db: Session = Depends(get_db)):
+    """Devolve um job da dead-letter para a fila."""
+    if not JobQueue.retry(db, job_id, tenant_id=request.state.tenant_id):
+        raise HTTPException(status_code=404, detail="Dead job not found.")
+    return {"status": "queued", "id": str(job_id)}
+
+# --- Trail run log (trail_runs / trail_run_steps) ---
+# O log é gravado em lotes: as consultas esvaziam antes o buffer deste processo.
+
+def _run_dict(run) -> Dict[str, Any]:
+    return {
+        "id": str(run.id),
+        "trail_id": str(run.trail_id),
+        "trail_version": run.trail_version,
+        "trigger": run.trigger,
+        "status": run.status,
+        "error": run.error,
+        "node_count": run.node_count,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "duration_ms": run.duration_ms,
+    }
+
+@router.get("/runs")
+def list_runs(
+    request: Request,
+    trail_id: Optional[UUID] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """Execuções de trilhas do tenant (mais recentes primeiro). status: success, failed, error."""
+    trail_run_log.flush()
+    query = db.query(data_models.TrailRun).filter(data_models.TrailRun.tenant_id == request.state.tenant_id)
+    if trail_id:
+        query = query.filter(data_models.TrailRun.trail_id == trail_id)
+    if status:
+        query = query.filter(data_models.TrailRun.status == status)
+    runs = query.order_by(data_models.TrailRun.started_at.desc()).limit(min(max(limit, 1), 200)).all()
+    return [_run_dict(run) for run in runs]
+
+@router.get("/runs/slowest-nodes")
+def slowest_nodes(
+    request: Request,
+    trail_id: Optional[UUID] = None,
+    hours: int = 24,
+    limit: int = 20,
+    db: Session = Depends(get_db)
+):
+    """
+    Nós mais lentos por trilha na janela (`hours`): execuções, média, p95, máximo e
+    tempo total (ms), erros e tamanho médio da config. Ordenado pelo tempo total.
+    """
+    trail_run_log.flush()
+    Step = data_models.TrailRunStep
+    since = datetime.utcnow() - timedelta(hours=min(max(hours, 1), 24 * 90))
+    total_ms = func.sum(Step.duration_ms)
+    query = db.query(
+        Step.trail_id,
+        Step.node_id,
+        Step.node_type,
+        Step.action_type,
+        func.count().label("executions"),
+        func.avg(Step.duration_ms).label("avg_ms"),
+        func.percentile_cont(0.95).within_group(Step.duration_ms).label("p95_ms"),
+        func.max(Step.duration_ms).label("max_ms"),
+        total_ms.label("total_ms"),
+        func.sum(case((Step.status == "error", 1), else_=0)).label("errors"),
+        func.avg(Step.config_size).label("avg_config_size"),
+    ).filter(
+        Step.tenant_id == request.state.tenant_id,
+        Step.started_at >= since,
+    )
+    if trail_id:
+        query = query.filter(Step.trail_id == trail_id)
+    rows = query.group_by(Step.trail_id, Step.node_id, Step.node_type, Step.action_type).order_by(
+        total_ms.desc()
+    ).limit(min(max(limit, 1), 200)).all()
+
+    names = dict(db.query(models_meta.MetaTrail.id, models_meta.MetaTrail.name).filter(
+        models_meta.MetaTrail.id.in_({row.trail_id for row in rows})
+    ).all()) if rows else {}
+    return [{
+        "trail_id": str(row.trail_id),
+        "trail_name": names.get(row.trail_id),
+        "node_id": row.node_id,
+        "node_type": row.node_type,
+        "action_type": row.action_type,
+        "executions": row.executions,
+        "avg_ms": round(float(row.avg_ms or 0), 3),
+        "p95_ms": round(float(row.p95_ms or 0), 3),
+        "max_ms": round(float(row.max_ms or 0), 3),
+        "total_ms": round(float(row.total_ms or 0), 3),
+        "errors": int(row.errors or 0),
+        "avg_config_size": round(float(row.avg_config_size)) if row.avg_config_size is not None else None,
+    } for row in rows]
+
+@router.get("/runs/{run_id}")
+def get_run(run_id: UUID, request: Request, db: Session = Depends(get_db)):
+    """Execução com os nós na ordem de início."""
+    trail_run_log.flush()
+    run = db.query(data_models.TrailRun).filter(
+        data_models.TrailRun.id == run_id,
+        data_models.TrailRun.tenant_id == request.state.tenant_id
+    ).first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found.")
+    steps = db.query(data_models.TrailRunStep).filter(
+        data_models.TrailRunStep.run_id == run.id
+    ).order_by(data_models.TrailRunStep.started_at).all()
+    return {**_run_dict(run), "steps": [{
+        "node_id": step.node_id,
+        "node_type": step.node_type,
+        "action_type": step.action_type,
+        "status": step.status,
+        "error": step.error,
+        "config_size": step.config_size,
+        "started_at": step.started_at,
+        "finished_at": step.finished_at,
+        "duration_ms": step.duration_ms,
+    } for step in steps]}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
 from sqlalchemy.orm import Session
 from app.shared import database
 from app.engine.metadata import models as models_meta, schemas as schemas_meta
@@ -6,6 +6,11 @@ from app.system.services.schema_manager import SchemaManager
 from typing import List, Optional
 import re
 from app.engine.formulas import FormulaEngine
+from app.engine.metadata.cache import metadata_cache, FieldMeta
+from app.engine.metadata.trigger_index import trigger_index
+from app.engine.services.trail_scheduler import TrailScheduler
+from app.engine.services.index_manager import IndexManager
+from app.engine.services.search_service import search_fields, reindex_entity_task, SEARCH_FIELD_TYPES
 
 router = APIRouter()
 
@@ -59,6 +64,7 @@ def create_entity(
     try:
         SchemaManager.create_table(schema, payload.slug)
         db.commit()
+        metadata_cache.invalidate(tenant_id)
         db.refresh(new_entity)
         return new_entity
     except Exception as e:
@@ -102,6 +108,7 @@ def update_entity(
         entity.layout_config = payload.layout_config
         
     db.commit()
+    metadata_cache.invalidate(entity.tenant_id)
     db.refresh(entity)
     return entity
 
@@ -109,6 +116,7 @@ def update_entity(
 def delete_entity(
     request: Request,
     entity_id: str,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(database.get_db)
 ):
     schema = get_tenant_schema(request)
@@ -121,8 +129,13 @@ def delete_entity(
         
     try:
         SchemaManager.drop_table(schema, entity.slug)
+        tenant_id = entity.tenant_id
+        field_ids = [f.id for f in entity.fields]
         db.delete(entity)
         db.commit()
+        metadata_cache.invalidate(tenant_id)
+        trigger_index.invalidate(tenant_id)
+        background_tasks.add_task(IndexManager.drop_fields, field_ids)
         return {"ok": True}
     except Exception as e:
         db.rollback()
@@ -140,6 +153,7 @@ def create_field(
     request: Request,
     entity_id: str,
     payload: schemas_meta.MetaFieldCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(database.get_db)
 ):
     schema = get_tenant_schema(request)
@@ -164,7 +178,9 @@ def create_field(
         is_required=payload.is_required,
         options=payload.options,
         formula=payload.formula,
-        is_virtual=payload.is_virtual or False
+        is_virtual=payload.is_virtual or False,
+        is_filterable=payload.is_filterable,
+        is_sortable=payload.is_sortable
     )
     db.add(new_field)
     
@@ -173,7 +189,9 @@ def create_field(
         try:
             SchemaManager.add_column(schema, entity.slug, payload.name, payload.field_type, payload.is_required)
             db.commit()
+            metadata_cache.invalidate(entity.tenant_id)
             db.refresh(new_field)
+            background_tasks.add_task(IndexManager.sync_field, FieldMeta(new_field))
             return new_field
         except Exception as e:
             db.rollback()
@@ -181,6 +199,7 @@ def create_field(
     else:
         # Virtual field only needs metadata
         db.commit()
+        metadata_cache.invalidate(entity.tenant_id)
         db.refresh(new_field)
         return new_field
 
@@ -190,6 +209,7 @@ def update_field(
     entity_id: str,
     field_id: str,
     payload: schemas_meta.MetaFieldUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(database.get_db)
 ):
     schema = get_tenant_schema(request)
@@ -205,7 +225,8 @@ def update_field(
     
     # 1. Handle Rename (Only if NOT virtual - virtuals have no physical col to rename)
     # Actually, we can rename virtuals metadata freely. 
-    if payload.name and payload.name != field.name:
+    renamed = bool(payload.name and payload.name != field.name)
+    if renamed:
         validate_slug(payload.name)
         # Check duplicate
         if db.query(models_meta.MetaField).filter(
@@ -228,9 +249,20 @@ def update_field(
     # 3. Update Formula
     if payload.formula is not None:
         field.formula = payload.formula
+
+    # 4. Index Flags
+    if payload.is_filterable is not None:
+        field.is_filterable = payload.is_filterable
+    if payload.is_sortable is not None:
+        field.is_sortable = payload.is_sortable
         
     db.commit()
+    metadata_cache.invalidate(entity.tenant_id)
     db.refresh(field)
+    # Rename changes the indexed expression: rebuild
+    background_tasks.add_task(IndexManager.sync_field, FieldMeta(field), renamed)
+    if renamed and field.field_type in SEARCH_FIELD_TYPES:
+        background_tasks.add_task(reindex_entity_task, entity.id, search_fields(metadata_cache.get(db, entity.tenant_id).fields(entity.id)))
     return field
 
 @router.delete("/entities/{entity_id}/fields/{field_id}")
@@ -238,6 +270,7 @@ def delete_field(
     request: Request,
     entity_id: str,
     field_id: str,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(database.get_db)
 ):
     schema = get_tenant_schema(request)
@@ -253,13 +286,48 @@ def delete_field(
 
     try:
         SchemaManager.drop_column(schema, entity.slug, field.name)
+        deleted_id = field.id
+        was_searchable = field.field_type in SEARCH_FIELD_TYPES
         db.delete(field)
         db.commit()
+        metadata_cache.invalidate(entity.tenant_id)
+        background_tasks.add_task(IndexManager.drop_fields, [deleted_id])
+        if was_searchable:
+            background_tasks.add_task(reindex_entity_task, entity.id, search_fields(metadata_cache.get(db, entity.tenant_id).fields(entity.id)))
         return {"ok": True}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao deletar coluna: {str(e)}")
 
+@router.get("/entities/{entity_id}/indexes")
+def get_entity_index_usage(
+    request: Request,
+    entity_id: str,
+    db: Session = Depends(database.get_db)
+):
+    """Uso dos indices gerenciados (entity_records) dos campos desta tabela."""
+    meta = metadata_cache.get(db, request.state.tenant_id)
+    entity = meta.entity_by_id(entity_id)
+    if not entity:
+        raise HTTPException(status_code=404, detail="Tabela nao encontrada.")
+    return IndexManager.usage(db, meta.fields(entity.id))
+
+@router.post("/entities/{entity_id}/indexes/sync")
+def sync_entity_indexes(
+    request: Request,
+    entity_id: str,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(database.get_db)
+):
+    """(Re)cria os indices gerenciados de todos os campos (ex: tabelas anteriores ao IndexManager)."""
+    meta = metadata_cache.get(db, request.state.tenant_id)
+    entity = meta.entity_by_id(entity_id)
+    if not entity:
+        raise HTTPException(status_code=404, detail="Tabela nao encontrada.")
+    for field in meta.fields(entity.id):
+        background_tasks.add_task(IndexManager.sync_field, field)
+    return {"ok": True}
+
 # --- Endpoints: Navigation ---
 
 @router.get("/navigation", response_model=List[schemas_meta.MetaNavigationGroupResponse])
@@ -555,6 +623,7 @@ def list_workflows(request: Request, entity_id: Optional[str] = None, db: Sessio
 
 @router.post("/workflows", response_model=schemas_meta.MetaWorkflowResponse)
 def create_workflow(
+    request: Request,
     payload: schemas_meta.MetaWorkflowCreate,
     db: Session = Depends(database.get_db)
 ):
@@ -567,6 +636,7 @@ def create_workflow(
     )
     db.add(new_flow)
     db.commit()
+    trigger_index.invalidate(request.state.tenant_id)
     db.refresh(new_flow)
     return new_flow
 
@@ -589,6 +659,7 @@ def delete_workflow(
         
     db.delete(wf)
     db.commit()
+    trigger_index.invalidate(tenant_id)
     return {"ok": True}
 
 # --- Endpoints: Actions ---
@@ -676,8 +747,13 @@ def create_trail(
         trigger_config=payload.trigger_config,
         nodes=payload.nodes or {}
     )
+    try:
+        TrailScheduler.schedule(new_trail)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Agendamento invalido: {e}")
     db.add(new_trail)
     db.commit()
+    trigger_index.invalidate(tenant_id)
     db.refresh(new_trail)
     return new_trail
 
@@ -713,14 +789,23 @@ def update_trail(
     if not trail:
         raise HTTPException(status_code=404, detail="Trilha nao encontrada.")
         
+    schedule_before = (trail.trigger_type, trail.trigger_config, trail.is_active)
     if payload.name: trail.name = payload.name
     if payload.description is not None: trail.description = payload.description
     if payload.is_active is not None: trail.is_active = payload.is_active
     if payload.trigger_type: trail.trigger_type = payload.trigger_type
     if payload.trigger_config is not None: trail.trigger_config = payload.trigger_config
     if payload.nodes is not None: trail.nodes = payload.nodes
+
+    # Só reagenda se gatilho/config/ativo mudaram (salvar só os nós não adianta nem atrasa a execução)
+    if (trail.trigger_type, trail.trigger_config, trail.is_active) != schedule_before:
+        try:
+            TrailScheduler.schedule(trail)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Agendamento invalido: {e}")
     
     db.commit()
+    trigger_index.invalidate(tenant_id)
     db.refresh(trail)
     return trail
 
@@ -741,6 +826,7 @@ def delete_trail(
         
     db.delete(trail)
     db.commit()
+    trigger_index.invalidate(tenant_id)
     return {"ok": True}
     
 @router.post("/formulas/preview")
@@ -787,6 +873,7 @@ def list_available_functions():
         {"name": "LOOKUP", "syntax": "LOOKUP(val, table, col, return)", "category": "Data"},
         {"name": "SELECT", "syntax": "SELECT(table, col, [filter])", "category": "Data"},
         {"name": "FILTER", "syntax": "FILTER(table, [filter])", "category": "Data"},
+        {"name": "SELECT_SUM", "syntax": "SELECT_SUM(table, col, [filter])", "category": "Data"},
         {"name": "ANY", "syntax": "ANY(list)", "category": "List"},
         {"name": "IN", "syntax": "IN(val, list)", "category": "List"},
         {"name": "COUNT", "syntax": "COUNT(list)", "category": "Math"},
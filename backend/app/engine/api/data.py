@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, Request
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.shared import database
 from app.engine.metadata import models as meta_models
 from app.engine.metadata import data_models
+from app.engine.metadata.cache import metadata_cache
+from app.engine.pagination import SortKey, sort_key, decode_cursor, encode_cursor, InvalidCursor, COUNT_CAP
+from app.engine.services.search_service import search_fields, apply_search, search_condition, rank_expression
 from typing import List, Dict, Any, Optional
 from uuid import UUID
 import json
-from sqlalchemy import cast, String, or_
-from fastapi import BackgroundTasks
+from sqlalchemy import cast, String, or_, text, func, literal_column, select
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from datetime import datetime
 from app.engine.services.workflow_service import WorkflowService
+from app.engine.services.record_service import RecordService, apply_snapshot_formulas_many, load_user_context
+from app.engine.services.export_service import ExportService, EXPORT_FORMATS
 
 from app.services.shadow_service import create_shadow_backup
 from app.engine.api.hardcoded_hooks import run_create_hooks, run_update_hooks
@@ -21,11 +29,7 @@ def apply_snapshot_formulas(db: Session, tenant_id: str, entity_id: str, record_
     from app.engine.formulas import FormulaEngine
     
     # 1. Fetch Snapshot Fields (formula != None AND is_virtual = False)
-    snapshot_fields = db.query(meta_models.MetaField).filter(
-        meta_models.MetaField.entity_id == entity_id,
-        meta_models.MetaField.is_virtual == False,
-        meta_models.MetaField.formula != None
-    ).all()
+    snapshot_fields = metadata_cache.get(db, tenant_id).snapshot_fields(entity_id)
     
     if not snapshot_fields:
         return record_data
@@ -46,35 +50,13 @@ def apply_snapshot_formulas(db: Session, tenant_id: str, entity_id: str, record_
     return updated_data
 
 def get_user_context(request: Request, db: Session, tenant_id: str) -> Optional[Dict[str, Any]]:
-    from app.system import models as models_system
-    user_id = getattr(request.state, "user_id", None)
-    if not user_id: return None
-    
-    user_context = {}
-    try:
-        user = db.query(models_system.GlobalUser).filter(models_system.GlobalUser.id == user_id).first()
-        if user:
-            user_context['id'] = str(user.id)
-            user_context['name'] = user.full_name
-            user_context['username'] = user.username
-            user_context['email'] = user.username 
-
-            membership = db.query(models_system.Membership).filter(
-                models_system.Membership.user_id == user.id,
-                models_system.Membership.tenant_id == tenant_id
-            ).first()
-            if membership:
-                user_context['cargo'] = membership.cargo.name if membership.cargo else membership.role
-    except Exception:
-        pass
-    return user_context
+    return load_user_context(db, tenant_id, getattr(request.state, "user_id", None))
 
 router = APIRouter()
 
 @router.post("/object/{entity_slug}")
 def create_record(
     entity_slug: str,
-    background_tasks: BackgroundTasks,
     payload: Dict[str, Any] = Body(...),
     request: Request = None,
     db: Session = Depends(database.get_db)
@@ -88,10 +70,7 @@ def create_record(
     tenant_id = request.state.tenant_id
     
     # 1. Lookup Entity
-    entity = db.query(meta_models.MetaEntity).filter(
-        meta_models.MetaEntity.slug == entity_slug,
-        meta_models.MetaEntity.tenant_id == tenant_id
-    ).first()
+    entity = metadata_cache.get(db, tenant_id).entity_by_slug(entity_slug)
     
     if not entity:
         raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
@@ -115,20 +94,20 @@ def create_record(
         entity_id=entity.id,
         data=final_data
     )
+    apply_search(record, search_fields(metadata_cache.get(db, tenant_id).fields(entity.id)))
     db.add(record)
-    db.commit()
-    db.refresh(record)
-    
-    # Trigger Workflows (Async)
-    background_tasks.add_task(
-        WorkflowService.trigger_workflows,
-        db=db,
+
+    # Trigger Workflows (job queue, same transaction as the write)
+    WorkflowService.enqueue_event(
+        db,
         entity_slug=entity_slug,
         trigger_type="ON_CREATE",
-        payload_data=record.data,
+        payload_data=final_data,
         tenant_id=tenant_id,
         user_id=request.state.user_id if hasattr(request.state, 'user_id') else None
     )
+    db.commit()
+    db.refresh(record)
     
     return {
         "id": str(record.id),
@@ -136,70 +115,215 @@ def create_record(
         "created_at": record.created_at
     }
 
-@router.get("/object/{entity_slug}")
-def list_records(
+# --- BULK ---
+# One metadata resolution, batched snapshot formulas, set-based writes
+# (RecordService) and batched workflow events. Errors are reported per row
+# ({"index": position in the payload, "error": ...}); valid rows are still written.
+
+BULK_MAX_ROWS = 50000
+
+def _hook_error(e: Exception) -> str:
+    return e.detail if isinstance(e, HTTPException) else str(e)
+
+def _check_bulk_size(rows: list):
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Too many records in one request (max {BULK_MAX_ROWS}).")
+
+def _valid_uuid(value) -> Optional[str]:
+    try:
+        return str(UUID(str(value)))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+@router.post("/object/{entity_slug}/bulk")
+def create_records_bulk(
     entity_slug: str,
-    request: Request,
+    payload: List[Dict[str, Any]] = Body(...),
+    request: Request = None,
     db: Session = Depends(database.get_db)
 ):
-    """
-    Universal List Endpoint.
-    Returns all records for this entity slug.
-    TODO: Add filtering/pagination.
-    """
+    """Bulk Create: body is a list of records (same shape as the single create)."""
     tenant_id = request.state.tenant_id
-    
-    # 1. Lookup Entity
-    entity = db.query(meta_models.MetaEntity).filter(
-        meta_models.MetaEntity.slug == entity_slug,
-        meta_models.MetaEntity.tenant_id == tenant_id
-    ).first()
-    
+    meta = metadata_cache.get(db, tenant_id)
+    entity = meta.entity_by_slug(entity_slug)
     if not entity:
         raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
+    _check_bulk_size(payload)
 
-    # 2. Build User Context (Hoisted for Filtering)
-    user_context = {}
-    user_id = getattr(request.state, "user_id", None)
-    if user_id:
+    errors = []
+    positions, rows = [], []
+    for i, row in enumerate(payload):
         try:
-            from app.system import models as models_system
-            user = db.query(models_system.GlobalUser).filter(models_system.GlobalUser.id == user_id).first()
-            if user:
-                user_context['id'] = str(user.id)
-                user_context['name'] = user.full_name
-                user_context['email'] = user.username 
-                user_context['username'] = user.username
-
-                membership = db.query(models_system.Membership).filter(
-                    models_system.Membership.user_id == user.id,
-                    models_system.Membership.tenant_id == tenant_id
-                ).first()
-                if membership:
-                    user_context['cargo'] = membership.cargo.name if membership.cargo else membership.role
-        except Exception:
-            pass
+            # Savepoint por linha: escritas de um hook que falhou são desfeitas só para ela
+            with db.begin_nested():
+                run_create_hooks(entity_slug, row, db, tenant_id)
+        except Exception as e:
+            errors.append({"index": i, "error": _hook_error(e)})
+            continue
+        positions.append(i)
+        rows.append(row)
 
-    # 3. Build Query
-    query = db.query(data_models.EntityRecord).filter(
-        data_models.EntityRecord.entity_id == entity.id,
-        data_models.EntityRecord.tenant_id == tenant_id
+    user_context = get_user_context(request, db, tenant_id)
+    final_rows = apply_snapshot_formulas_many(db, tenant_id, entity.id, rows, user_context)
+
+    new_ids, insert_errors = RecordService.bulk_insert(db, tenant_id, entity.id, final_rows, search_fields(meta.fields(entity.id)))
+
+    ids = [None] * len(payload)
+    events = []
+    for pos, (record_id, data) in enumerate(zip(new_ids, final_rows)):
+        if pos in insert_errors:
+            errors.append({"index": positions[pos], "error": insert_errors[pos]})
+            continue
+        ids[positions[pos]] = record_id
+        events.append({"id": record_id, "data": data})
+
+    WorkflowService.enqueue_batch_event(
+        db,
+        entity_slug=entity_slug,
+        trigger_type="ON_CREATE",
+        items=events,
+        tenant_id=tenant_id,
+        user_id=request.state.user_id if hasattr(request.state, 'user_id') else None
     )
-    
-    # Apply Filters from Query Params
-    reserved = ['limit', 'offset', 'sort_by', 'sort_dir', 'q', 'context_id']
-    
+    db.commit()
+
+    return {"created": len(events), "ids": ids, "errors": sorted(errors, key=lambda e: e["index"])}
+
+@router.put("/object/{entity_slug}/bulk")
+def update_records_bulk(
+    entity_slug: str,
+    payload: List[Dict[str, Any]] = Body(...),
+    request: Request = None,
+    db: Session = Depends(database.get_db)
+):
+    """Bulk Update: body is a list of {"id": ..., <fields to merge>}."""
+    tenant_id = request.state.tenant_id
+    meta = metadata_cache.get(db, tenant_id)
+    entity = meta.entity_by_slug(entity_slug)
+    if not entity:
+        raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
+    _check_bulk_size(payload)
+
+    errors = []
+    requested = {}
+    seen = set()
+    for i, row in enumerate(payload):
+        record_id = _valid_uuid(row.get("id"))
+        if not record_id:
+            errors.append({"index": i, "error": "Missing or invalid id."})
+        elif record_id in seen:
+            errors.append({"index": i, "id": record_id, "error": "Duplicate id in batch."})
+        else:
+            requested[i] = record_id
+            seen.add(record_id)
+
+    existing = RecordService.fetch_many(db, tenant_id, entity.id, list(requested.values()))
+
+    positions, merged, changes = [], [], []
+    for i, record_id in requested.items():
+        if record_id not in existing:
+            errors.append({"index": i, "id": record_id, "error": "Record not found."})
+            continue
+        old_data = existing[record_id]
+        patch = {k: v for k, v in payload[i].items() if k != "id"}
+        merged_data = {**old_data, **patch}
+        try:
+            # Savepoint por linha (hooks de pedidos escrevem em produtos/clientes); commit único no fim
+            with db.begin_nested():
+                run_update_hooks(entity_slug, record_id, merged_data, db, tenant_id, old_data)
+        except Exception as e:
+            errors.append({"index": i, "id": record_id, "error": _hook_error(e)})
+            continue
+        positions.append(i)
+        merged.append(merged_data)
+        changes.append({"old": old_data, "new": patch})
+
+    user_context = get_user_context(request, db, tenant_id)
+    final_rows = apply_snapshot_formulas_many(db, tenant_id, entity.id, merged, user_context)
+
+    updates = [(requested[i], data) for i, data in zip(positions, final_rows)]
+    update_errors = RecordService.bulk_update(db, entity.id, updates, search_fields(meta.fields(entity.id)))
+
+    events = []
+    for pos, ((record_id, data), change) in enumerate(zip(updates, changes)):
+        if pos in update_errors:
+            errors.append({"index": positions[pos], "id": record_id, "error": update_errors[pos]})
+            continue
+        events.append({"id": record_id, "data": data, "changes": change})
+
+    WorkflowService.enqueue_batch_event(
+        db,
+        entity_slug=entity_slug,
+        trigger_type="ON_UPDATE",
+        items=events,
+        tenant_id=tenant_id,
+        user_id=request.state.user_id if hasattr(request.state, 'user_id') else None
+    )
+    db.commit()
+
+    return {"updated": len(events), "errors": sorted(errors, key=lambda e: e["index"])}
+
+@router.delete("/object/{entity_slug}/bulk")
+def delete_records_bulk(
+    entity_slug: str,
+    payload: List[str] = Body(...),
+    request: Request = None,
+    db: Session = Depends(database.get_db)
+):
+    """Bulk Delete: body is a list of record ids."""
+    tenant_id = request.state.tenant_id
+    entity = metadata_cache.get(db, tenant_id).entity_by_slug(entity_slug)
+    if not entity:
+        raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
+    _check_bulk_size(payload)
+
+    errors = []
+    requested = {}
+    for i, raw_id in enumerate(payload):
+        record_id = _valid_uuid(raw_id)
+        if not record_id:
+            errors.append({"index": i, "error": "Invalid id."})
+        else:
+            requested[i] = record_id
+
+    deleted = RecordService.bulk_delete(db, tenant_id, entity.id, list(set(requested.values())))
+
+    for i, record_id in requested.items():
+        if record_id not in deleted:
+            errors.append({"index": i, "id": record_id, "error": "Record not found."})
+
+    WorkflowService.enqueue_batch_event(
+        db,
+        entity_slug=entity_slug,
+        trigger_type="ON_DELETE",
+        items=[{"id": record_id, "data": data} for record_id, data in deleted.items()],
+        tenant_id=tenant_id,
+        user_id=request.state.user_id if hasattr(request.state, 'user_id') else None
+    )
+    db.commit()
+
+    return {"deleted": len(deleted), "errors": sorted(errors, key=lambda e: e["index"])}
+
+# Query params of the list endpoint that are not JSON field filters
+LIST_RESERVED_PARAMS = ['limit', 'offset', 'sort_by', 'sort_dir', 'q', 'context_id', 'cursor', 'total']
+
+def _apply_record_filters(query, query_params, user_context: Dict[str, Any], reserved: List[str]):
+    """
+    Applies ?q= (full-text) and the strict JSON filters from the query params.
+    Returns (query, search) where search is the (condition, params) of ?q= or None.
+    """
     # Context ID from params (for dynamic filtering)
-    context_id = request.query_params.get('context_id')
+    context_id = query_params.get('context_id')
 
-    # Global Search (q)
-    q = request.query_params.get('q')
-    if q:
-        search_term = f"%{q}%"
-        query = query.filter(cast(data_models.EntityRecord.data, String).ilike(search_term))
+    # Global Search (q): full-text over the text fields (GIN on search_vector)
+    q = query_params.get('q')
+    search = search_condition(q) if q else None
+    if search:
+        condition, search_params = search
+        query = query.filter(text(condition).bindparams(**search_params))
 
     # Strict JSON Filters with Context Substitution
-    for key, value in request.query_params.items():
+    for key, value in query_params.items():
         if key not in reserved and value:
              processed_value = value
              
@@ -212,54 +336,212 @@ def list_records(
                      processed_value = value.replace("{context.id}", context_id)
              
              query = query.filter(data_models.EntityRecord.data[key].astext == processed_value)
+
+    return query, search
+
+@router.get("/object/{entity_slug}/export")
+def export_records(
+    entity_slug: str,
+    request: Request,
+    format: str = "csv",
+    db: Session = Depends(database.get_db)
+):
+    """
+    Streaming Export (csv | ndjson | xlsx) with the same filters as the list endpoint.
+    Reads through a server-side cursor and computes virtual fields per chunk.
+    """
+    tenant_id = request.state.tenant_id
+    meta = metadata_cache.get(db, tenant_id)
+    entity = meta.entity_by_slug(entity_slug)
+    if not entity:
+        raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}'. Use: {', '.join(EXPORT_FORMATS)}.")
+    if format == "xlsx":
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="XLSX export requires openpyxl.")
+
+    user_context = get_user_context(request, db, tenant_id) or {}
+    query = db.query(data_models.EntityRecord).filter(
+        data_models.EntityRecord.entity_id == entity.id,
+        data_models.EntityRecord.tenant_id == tenant_id
+    )
+    query, _ = _apply_record_filters(query, request.query_params, user_context, LIST_RESERVED_PARAMS + ['format'])
+    query = query.order_by(data_models.EntityRecord.created_at, data_models.EntityRecord.id)
+
+    fields = meta.fields(entity.id)
+    virtual_formulas = {f.name: f.formula for f in meta.virtual_fields(entity.id)}
+    columns = ['id', 'created_at'] + [f.name for f in fields if not f.is_virtual and f.field_type != 'section'] + list(virtual_formulas)
+    exporter = ExportService(tenant_id, entity.id, columns, virtual_formulas, user_context)
+
+    def stream():
+        # Own session: the request session may be closed before the body is fully sent
+        export_db = database.SessionSys()
+        try:
+            yield from exporter.stream(format, query.with_session(export_db))
+        finally:
+            export_db.close()
+
+    filename = f"{entity_slug}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/object/{entity_slug}")
+async def list_records(
+    entity_slug: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Universal List Endpoint.
+    Returns the records for this entity slug (filters via query params).
+
+    Pagination: keyset on (sort_by, created_at, id). Pass the `X-Next-Cursor`
+    response header back as `?cursor=` to get the next page (`offset` still works
+    but degrades on deep pages). `?total=estimate|count` adds `X-Total-Count`.
+
+    The page and the total are native async queries; virtual formulas (CPU-bound,
+    sync FormulaEngine) are evaluated in the threadpool.
+    """
+    tenant_id = request.state.tenant_id
+    
+    # 1. Lookup Entity + User Context (cached metadata / two small lookups)
+    meta = await db.run_sync(metadata_cache.get, tenant_id)
+    entity = meta.entity_by_slug(entity_slug)
+    
+    if not entity:
+        raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
+
+    user_context = await db.run_sync(load_user_context, tenant_id, getattr(request.state, "user_id", None)) or {}
+
+    # 2. Build Query
+    query = select(data_models.EntityRecord).where(
+        data_models.EntityRecord.entity_id == entity.id,
+        data_models.EntityRecord.tenant_id == tenant_id
+    )
+    query, search = _apply_record_filters(query, request.query_params, user_context, LIST_RESERVED_PARAMS)
+    q = request.query_params.get('q')
             
-    # Apply Pagination (Basic)
+    # Optional Total (before cursor/order/limit)
+    total_mode = request.query_params.get('total')
+    if total_mode:
+        total, kind = await _count_records(db, query, total_mode)
+        if total is not None:
+            response.headers["X-Total-Count"] = str(total)
+            response.headers["X-Total-Count-Kind"] = kind
+
+    # Apply Sorting + Pagination (Keyset)
     limit = int(request.query_params.get('limit', 100))
     offset = int(request.query_params.get('offset', 0))
-    
-    records = query.limit(limit).offset(offset).all()
+    sort_by = request.query_params.get('sort_by')
+    sort_field = meta.field(entity.id, sort_by) if sort_by else None
+
+    try:
+        if search and not sort_by:
+            # Best matches first
+            key = SortKey(rank_expression(q), "CAST({} AS real)", descending=True)
+        else:
+            key = sort_key(sort_by, request.query_params.get('sort_dir'), sort_field.field_type if sort_field else None)
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            condition, cursor_params = key.after(decode_cursor(cursor))
+            query = query.where(text(condition).bindparams(**cursor_params))
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if key.expression:
+        query = query.add_columns(literal_column(key.expression).label("sort_key"))
+    query = query.order_by(text(key.order_by()))
+    if offset and not cursor:
+        query = query.offset(offset)
+
+    # One extra row tells whether there is a next page
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    records = [row[0] for row in rows]
+
+    if has_more and rows:
+        last = rows[-1]
+        last_record = records[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            last.sort_key if key.expression else None, last_record.created_at, last_record.id
+        )
     
     # Transform for frontend (flatten id/created_at into data?)
     # Or return wrapped objects. Let's return flat objects for easier UI binding.
-    
-    # --- VIRTUAL COLUMNS CALCULATION ---
-    # 1. Identify Virtual Fields
-    from app.engine.formulas import FormulaEngine
-    
-    virtual_fields = db.query(meta_models.MetaField).filter(
-        meta_models.MetaField.entity_id == entity.id,
-        meta_models.MetaField.is_virtual == True,
-        meta_models.MetaField.formula != None
-    ).all()
-
-    formula_engine = FormulaEngine(db, str(tenant_id)) if virtual_fields else None
-
     results = []
     for r in records:
         flat = r.data.copy()
         flat['id'] = str(r.id)
         flat['created_at'] = r.created_at
-        
-        # 3. Calculate Virtuals
-        if virtual_fields and formula_engine:
-            # Context is the current row data + id
-            row_context = flat.copy()
-            for vf in virtual_fields:
-                try:
-                    val = formula_engine.evaluate(vf.formula, row_context, user_context, current_entity_id=str(entity.id))
-                    flat[vf.name] = val
-                except Exception:
-                    flat[vf.name] = None # Error fallback
-
         results.append(flat)
+
+    # --- VIRTUAL COLUMNS CALCULATION ---
+    virtual_fields = meta.virtual_fields(entity.id)
+    if virtual_fields and results:
+        formulas = {vf.name: vf.formula for vf in virtual_fields}
+        computed = await run_in_threadpool(_virtual_values, tenant_id, entity.id, formulas, results, user_context)
+        for flat, values in zip(results, computed):
+            flat.update(values)
         
     return results
 
+def _virtual_values(tenant_id, entity_id, formulas: Dict[str, str], results: List[Dict[str, Any]], user_context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Virtual fields of a page (batch: refs of the whole page resolved in one query per target)."""
+    from app.engine.formulas import FormulaEngine
+
+    db = database.SessionSys()
+    try:
+        # Context is the current row data + id
+        row_contexts = [flat.copy() for flat in results]
+        return FormulaEngine(db, str(tenant_id)).evaluate_many(formulas, row_contexts, user_context, current_entity_id=str(entity_id))
+    except Exception:
+        return [{name: None for name in formulas} for _ in results] # Error fallback
+    finally:
+        db.close()
+
+async def _count_records(db: AsyncSession, query, mode: str):
+    """
+    Total for the list endpoint.
+    - estimate: planner row estimate (EXPLAIN), no scan.
+    - count: exact count, capped at COUNT_CAP rows.
+    """
+    ids = query.with_only_columns(data_models.EntityRecord.id)
+    if mode == "estimate":
+        try:
+            compiled = ids.compile(dialect=db.bind.dialect)
+            params = compiled.params
+            if compiled.positional:
+                # asyncpg ($1, $2...) takes positional parameters
+                params = tuple(params[name] for name in compiled.positiontup)
+            connection = await db.connection()
+            plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"]), "estimate"
+        except Exception:
+            return None, None
+
+    if mode == "count":
+        capped = ids.limit(COUNT_CAP + 1).subquery()
+        total = (await db.execute(select(func.count()).select_from(capped))).scalar()
+        if total > COUNT_CAP:
+            return COUNT_CAP, "capped"
+        return total, "exact"
+
+    return None, None
+
 @router.put("/object/{entity_slug}/{record_id}")
 def update_record(
     entity_slug: str,
     record_id: str,
-    background_tasks: BackgroundTasks,
     payload: Dict[str, Any] = Body(...),
     request: Request = None,
     db: Session = Depends(database.get_db)
@@ -267,10 +549,7 @@ def update_record(
     tenant_id = request.state.tenant_id
     
     # 1. Lookup Entity
-    entity = db.query(meta_models.MetaEntity).filter(
-        meta_models.MetaEntity.slug == entity_slug,
-        meta_models.MetaEntity.tenant_id == tenant_id
-    ).first()
+    entity = metadata_cache.get(db, tenant_id).entity_by_slug(entity_slug)
     
     if not entity:
         raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
@@ -309,21 +588,20 @@ def update_record(
     final_data = apply_snapshot_formulas(db, tenant_id, entity.id, merged_data, user_context)
     
     record.data = final_data
+    apply_search(record, search_fields(metadata_cache.get(db, tenant_id).fields(entity.id)))
     
-    db.commit()
-    db.refresh(record)
-
-    # Trigger Workflows
-    background_tasks.add_task(
-        WorkflowService.trigger_workflows,
-        db=db,
+    # Trigger Workflows (job queue, same transaction as the write)
+    WorkflowService.enqueue_event(
+        db,
         entity_slug=entity_slug,
         trigger_type="ON_UPDATE",
-        payload_data=record.data,
+        payload_data=final_data,
         tenant_id=tenant_id,
         user_id=request.state.user_id if hasattr(request.state, 'user_id') else None,
         changes={"old": old_data, "new": payload}
     )
+    db.commit()
+    db.refresh(record)
 
     return {"id": str(record.id), "data": record.data, "status": "updated"}
 
@@ -331,17 +609,13 @@ def update_record(
 def delete_record(
     entity_slug: str,
     record_id: str,
-    background_tasks: BackgroundTasks,
     request: Request,
     db: Session = Depends(database.get_db)
 ):
     tenant_id = request.state.tenant_id
     
     # 1. Lookup Entity
-    entity = db.query(meta_models.MetaEntity).filter(
-        meta_models.MetaEntity.slug == entity_slug,
-        meta_models.MetaEntity.tenant_id == tenant_id
-    ).first()
+    entity = metadata_cache.get(db, tenant_id).entity_by_slug(entity_slug)
     
     if not entity:
         raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
@@ -371,17 +645,16 @@ def delete_record(
         pass
 
     db.delete(record)
-    db.commit()
 
-    # Trigger Workflows
-    background_tasks.add_task(
-        WorkflowService.trigger_workflows,
-        db=db,
+    # Trigger Workflows (job queue, same transaction as the write)
+    WorkflowService.enqueue_event(
+        db,
         entity_slug=entity_slug,
         trigger_type="ON_DELETE",
         payload_data=deleted_data,
         tenant_id=tenant_id,
         user_id=request.state.user_id if hasattr(request.state, 'user_id') else None
     )
+    db.commit()
 
     return {"status": "deleted", "id": deleted_id}
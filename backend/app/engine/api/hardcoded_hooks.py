@@ -1,5 +1,6 @@
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
 from app.engine.metadata import data_models, models as meta_models
 import datetime
 
@@ -126,6 +127,7 @@ def process_conversion(pedido_id: str, payload: dict, db: Session, tenant_id: st
                 curr_est = float(prod_rec.data.get("estoque_atual", 0))
                 new_est = max(0, curr_est - qtd)
                 prod_rec.data["estoque_atual"] = new_est
+                flag_modified(prod_rec, "data") # JSONB alterado in-place
                 db.add(prod_rec) # Queue update
                 
     # 2. Atualizar Cliente
@@ -134,6 +136,7 @@ def process_conversion(pedido_id: str, payload: dict, db: Session, tenant_id: st
         cli_rec = get_record(db, tenant_id, "clientes", cliente_id)
         if cli_rec:
             cli_rec.data["data_ultima_compra"] = datetime.date.today().isoformat()
+            flag_modified(cli_rec, "data")
             db.add(cli_rec)
-            
-    db.commit() # Commit side effects immediately (or let session handle it, but better explicit here)
+
+    # Sem commit: os efeitos entram na transação da rota (update único ou em lote), que faz o commit no fim
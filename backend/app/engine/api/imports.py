@@ -0,0 +1,132 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks, File, UploadFile, Form
+from sqlalchemy.orm import Session
+from app.shared import database
+from app.engine.metadata import data_models
+from app.engine.metadata.cache import metadata_cache
+from app.engine.services.import_service import ImportService
+from app.engine.api.data import get_user_context
+from typing import Optional
+from uuid import UUID
+import os
+import json
+import shutil
+import tempfile
+
+router = APIRouter()
+
+IMPORT_EXTENSIONS = (".csv", ".txt", ".xlsx")
+
+def _serialize(job: data_models.DataImport, with_errors: bool = True):
+    result = {
+        "id": str(job.id),
+        "entity_id": str(job.entity_id),
+        "filename": job.filename,
+        "dry_run": job.dry_run,
+        "status": job.status,
+        "processed_rows": job.processed_rows or 0,
+        "inserted_rows": job.inserted_rows or 0,
+        "error_count": job.error_count or 0,
+        "message": job.message,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+    if with_errors:
+        result["errors"] = job.errors or []
+    return result
+
+@router.post("/object/{entity_slug}/import")
+def import_records(
+    entity_slug: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    mapping: Optional[str] = Form(None),
+    dry_run: bool = Form(False),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Imports a CSV/XLSX file into the entity. Runs in the background: poll
+    `GET /imports/{id}` for progress and per-row errors.
+
+    `mapping` is a JSON object {"File column": "field_name"}; when omitted, columns
+    are matched by field name or label. `dry_run=true` validates without writing.
+    Rows are inserted in a single transaction (all or nothing, except rows that
+    failed validation, which are reported). Imports do not fire workflows.
+    """
+    tenant_id = request.state.tenant_id
+    meta = metadata_cache.get(db, tenant_id)
+    entity = meta.entity_by_slug(entity_slug)
+    if not entity:
+        raise HTTPException(status_code=404, detail=f"Entity '{entity_slug}' not found.")
+
+    filename = file.filename or "import.csv"
+    if not filename.lower().endswith(IMPORT_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Unsupported file type. Use .csv or .xlsx.")
+    if filename.lower().endswith(".xlsx"):
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=400, detail="XLSX import requires openpyxl.")
+
+    column_mapping = {}
+    if mapping:
+        try:
+            column_mapping = json.loads(mapping)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid mapping (expected a JSON object).")
+        if not isinstance(column_mapping, dict):
+            raise HTTPException(status_code=400, detail="Invalid mapping (expected a JSON object).")
+        known = {f.name for f in meta.fields(entity.id)}
+        unknown = [name for name in column_mapping.values() if name not in known]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields in mapping: {', '.join(map(str, unknown))}")
+
+    # Upload copied to disk: the background job streams it after the request ends
+    suffix = os.path.splitext(filename)[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+        path = tmp.name
+
+    job = data_models.DataImport(
+        tenant_id=tenant_id,
+        entity_id=entity.id,
+        filename=filename,
+        mapping=column_mapping,
+        dry_run=dry_run,
+        status="pending",
+        created_by=getattr(request.state, "user_id", None),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    user_context = get_user_context(request, db, tenant_id) or {}
+    service = ImportService(tenant_id, entity.id, entity_slug, meta.fields(entity.id), column_mapping, user_context, dry_run)
+    background_tasks.add_task(service.run, job.id, path, filename)
+
+    return _serialize(job)
+
+@router.get("/imports/{import_id}")
+def get_import(
+    import_id: UUID,
+    request: Request,
+    db: Session = Depends(database.get_db)
+):
+    job = db.query(data_models.DataImport).filter(
+        data_models.DataImport.id == import_id,
+        data_models.DataImport.tenant_id == request.state.tenant_id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found.")
+    return _serialize(job)
+
+@router.get("/imports")
+def list_imports(
+    request: Request,
+    limit: int = 50,
+    db: Session = Depends(database.get_db)
+):
+    jobs = db.query(data_models.DataImport).filter(
+        data_models.DataImport.tenant_id == request.state.tenant_id
+    ).order_by(data_models.DataImport.created_at.desc()).limit(min(max(limit, 1), 200)).all()
+    return [_serialize(job, with_errors=False) for job in jobs]
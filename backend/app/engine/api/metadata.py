@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any
 from app.shared import database
 from app.engine.metadata import models as models_meta, schemas as schemas_meta
@@ -7,7 +9,7 @@ from app.engine.metadata import models as models_meta, schemas as schemas_meta
 router = APIRouter()
 
 @router.get("/schema", response_model=List[schemas_meta.MetaEntityResponse])
-def get_full_schema(request: Request, db: Session = Depends(database.get_db)):
+async def get_full_schema(request: Request, db: AsyncSession = Depends(database.get_async_db)):
     """
     Returns the complete schema (Entities + Fields + Views) for the current tenant.
     Used by the Frontend Engine Main Loader to build the dynamic UI.
@@ -17,8 +19,13 @@ def get_full_schema(request: Request, db: Session = Depends(database.get_db)):
          raise HTTPException(status_code=400, detail="Tenant context required")
 
     # Fetch all entities for this tenant
-    # Relationships (fields, views) should be loaded automatically (lazy='select' default)
-    # Consider optimizing with joinedload if performance issues arise
-    entities = db.query(models_meta.MetaEntity).filter(models_meta.MetaEntity.tenant_id == tenant_id).all()
+    # Fields and views are eager-loaded (selectinload: 3 queries in total);
+    # lazy loading is not available on AsyncSession
+    result = await db.execute(
+        select(models_meta.MetaEntity)
+        .where(models_meta.MetaEntity.tenant_id == tenant_id)
+        .options(selectinload(models_meta.MetaEntity.fields), selectinload(models_meta.MetaEntity.views))
+    )
+    entities = result.scalars().all()
     
     return entities
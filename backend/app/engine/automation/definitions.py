@@ -7,10 +7,18 @@ class ActionType(str, Enum):
     DB_UPDATE = "DB_UPDATE"
     DB_DELETE = "DB_DELETE"
     DB_QUERY = "DB_QUERY"  # Future
+    DB_FETCH_FIELD = "DB_FETCH_FIELD"
 
     # Communication
     SEND_EMAIL = "SEND_EMAIL"
     WEBHOOK = "WEBHOOK"
+    SEND_NOTIFICATION = "SEND_NOTIFICATION"
+
+    # Data / Files
+    MATH_OP = "MATH_OP"
+    GENERATE_CSV = "GENERATE_CSV"
+    GENERATE_PDF = "GENERATE_PDF"
+    CREATE_TASK = "CREATE_TASK"
 
     # Logic/Flow
     CONDITION = "CONDITION" # If/Else logic inside runner
@@ -21,30 +29,38 @@ class ActionType(str, Enum):
     SHOW_TOAST = "SHOW_TOAST"
 
 # Definition of expected parameters for each action type
-# This acts as the Documentation and Validation Schema
+# This acts as the Documentation and Validation Schema (see registry: handlers are
+# registered per ActionType and the compiler checks required params).
+# DB actions take the target as entity_slug or table_id (MetaEntity id), and the
+# values as data or mapped_values. They write entity_records through RecordService
+# (snapshot formulas applied) in the trail run's transaction; for_each writes many
+# records in one statement.
 ACTION_DEFINITIONS: Dict[str, Dict[str, Any]] = {
     ActionType.DB_CREATE: {
         "label": "Criar Registro",
         "description": "Cria um novo registro em uma tabela.",
         "params": {
-            "entity_slug": {"type": "string", "required": True},
-            "data": {"type": "json", "required": True, "description": "Key-value pairs matching field slugs"}
+            "entity_slug": {"type": "string", "description": "Or table_id"},
+            "data": {"type": "json", "description": "Key-value pairs matching field slugs (or mapped_values)"},
+            "for_each": {"type": "formula", "description": "List of data objects: one record per item"}
         }
     },
     ActionType.DB_UPDATE: {
         "label": "Atualizar Registro",
         "description": "Atualiza um registro existente.",
         "params": {
-            "entity_slug": {"type": "string", "required": True},
-            "record_id": {"type": "string", "required": True, "description": "UUID or Formula"},
-            "data": {"type": "json", "required": True}
+            "entity_slug": {"type": "string", "description": "Or table_id"},
+            "record_id": {"type": "string", "description": "UUID or Formula (or for_each)"},
+            "data": {"type": "json", "description": "Or mapped_values"},
+            "for_each": {"type": "formula", "description": "List of {id, <fields to merge>}"}
         }
     },
     ActionType.DB_DELETE: {
         "label": "Excluir Registro",
         "params": {
-            "entity_slug": {"type": "string", "required": True},
-            "record_id": {"type": "string", "required": True}
+            "entity_slug": {"type": "string", "description": "Or table_id"},
+            "record_id": {"type": "string", "description": "Or for_each"},
+            "for_each": {"type": "formula", "description": "List of record ids"}
         }
     },
     ActionType.WEBHOOK: {
@@ -55,5 +71,59 @@ ACTION_DEFINITIONS: Dict[str, Dict[str, Any]] = {
             "headers": {"type": "json", "default": {}},
             "body": {"type": "json", "default": {}}
         }
+    },
+    ActionType.DB_FETCH_FIELD: {
+        "label": "Buscar Campo",
+        "params": {
+            "table_id": {"type": "string", "description": "Or entity_slug"},
+            "record_id": {"type": "string", "required": True},
+            "field_name": {"type": "string", "required": True}
+        }
+    },
+    ActionType.SEND_NOTIFICATION: {
+        "label": "Enviar Notificação",
+        "params": {
+            "message": {"type": "string", "required": True},
+            "recipient": {"type": "string", "required": True, "description": "Username or list of user IDs (formula)"}
+        }
+    },
+    ActionType.MATH_OP: {
+        "label": "Cálculo",
+        "params": {
+            "expression": {"type": "formula", "required": True}
+        }
+    },
+    ActionType.GENERATE_CSV: {
+        "label": "Gerar CSV",
+        "params": {
+            "table_id": {"type": "string", "required": True}
+        }
+    },
+    ActionType.GENERATE_PDF: {
+        "label": "Gerar PDF",
+        "params": {}
+    },
+    ActionType.CREATE_TASK: {
+        "label": "Criar Tarefa",
+        "params": {
+            "assignee_id": {"type": "string"},
+            "title": {"type": "string"},
+            "description": {"type": "string"}
+        }
+    },
+    ActionType.NAVIGATE: {
+        "label": "Navegar",
+        "description": "Client-side: returned to the caller as an instruction.",
+        "params": {
+            "page_id": {"type": "string", "required": True},
+            "record_id": {"type": "string"}
+        }
+    },
+    ActionType.SHOW_TOAST: {
+        "label": "Mostrar Aviso",
+        "description": "Client-side: returned to the caller as an instruction.",
+        "params": {
+            "message": {"type": "string", "required": True}
+        }
     }
 }
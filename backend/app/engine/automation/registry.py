@@ -0,0 +1,355 @@
+import uuid
+import logging
+from typing import Callable, Dict, List, Optional, Set
+from sqlalchemy import text
+from app.core.http_client import http_pool
+from app.engine.metadata.cache import metadata_cache, EntityMeta
+from app.engine.services.record_service import RecordService, apply_snapshot_formulas_many
+from app.engine.services.search_service import search_fields
+from app.engine.automation.definitions import ActionType, ACTION_DEFINITIONS
+
+logger = logging.getLogger(__name__)
+
+# Registro único de ações das trilhas. Handler: fn(run, config, context) -> resultado
+#   run:     TrailExecutor em execução (db, tenant_id, user_id, formula_engine)
+#   config:  config do nó já resolvida (fórmulas/templates avaliados pelo plano)
+#   context: execution_context (Payload + resultados dos nós anteriores)
+# Resultado com "error" indica falha do nó; "__client_instruction" volta ao cliente.
+# uses_db=False: o handler não toca run.db nem o formula_engine (HTTP, arquivos, instruções);
+# só ramos PARALLEL feitos desses nós rodam em threads (ver TrailExecutor._run_parallel).
+
+ACTION_HANDLERS: Dict[str, Callable] = {}
+DB_FREE_ACTIONS: Set[str] = set()
+
+def action(action_type: str, *aliases: str, uses_db: bool = True):
+    """Registra o handler de um tipo de ação (e nomes legados)."""
+    def decorator(fn):
+        for name in (action_type, *aliases):
+            key = str(name.value if isinstance(name, ActionType) else name)
+            ACTION_HANDLERS[key] = fn
+            if not uses_db:
+                DB_FREE_ACTIONS.add(key)
+        return fn
+    return decorator
+
+def get_action(action_type: Optional[str]) -> Optional[Callable]:
+    return ACTION_HANDLERS.get(action_type) if action_type else None
+
+def uses_db(action_type: Optional[str]) -> bool:
+    return action_type not in DB_FREE_ACTIONS
+
+def missing_params(action_type: str, config_keys) -> List[str]:
+    """Parâmetros obrigatórios (ACTION_DEFINITIONS) ausentes na config do nó."""
+    definition = ACTION_DEFINITIONS.get(action_type) or {}
+    return [name for name, spec in (definition.get("params") or {}).items()
+            if spec.get("required") and name not in config_keys]
+
+def _entity(run, config: Dict) -> Optional[EntityMeta]:
+    """Tabela alvo por table_id (builder de trilhas) ou entity_slug (formato de /automation/run)."""
+    meta = metadata_cache.get(run.db, run.tenant_id)
+    if config.get('table_id'):
+        return meta.entity_by_id(config['table_id'])
+    if config.get('entity_slug'):
+        return meta.entity_by_slug(config['entity_slug'])
+    return None
+
+def _values(config: Dict) -> Dict:
+    return config.get('mapped_values') or config.get('data') or {}
+
+def _valid_uuid(value) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(value)))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+def _in_savepoint(run, action_type: str, fn: Callable[[], Dict]) -> Dict:
+    """
+    Sem commit por nó: a trilha inteira é uma transação (commit no fim de execute_trail).
+    Cada ação de banco roda em um savepoint: se falhar, só ela é desfeita e a trilha segue.
+    """
+    try:
+        with run.db.begin_nested():
+            return fn()
+    except Exception as e:
+        logger.error(f"{action_type} Error: {e}")
+        return {"error": str(getattr(e, "orig", e)).strip()}
+
+def _batch_result(key: str, count: int, errors: List[Dict], **extra) -> Dict:
+    result = {key: count, "errors": errors, "status": "success", **extra}
+    if errors and not count:
+        result["error"] = errors[0]["error"]
+    return result
+
+# --- Banco de dados (entity_records via RecordService) ---
+# Trilhas não disparam eventos de workflow nas próprias escritas (evita laços trilha -> workflow -> trilha).
+
+@action(ActionType.DB_CREATE)
+def db_create(run, config: Dict, context: Dict):
+    # config: { table_id | entity_slug, mapped_values | data: { col: val } }
+    #      ou { table_id | entity_slug, for_each: [ { col: val }, ... ] } (um INSERT para todos)
+    if not config.get('table_id') and not config.get('entity_slug'): return {"error": "No table_id"}
+    entity = _entity(run, config)
+    if not entity: return {"error": "Entity not found"}
+
+    for_each = config.get('for_each')
+    if for_each is not None and not (isinstance(for_each, list) and all(isinstance(r, dict) for r in for_each)):
+        return {"error": "for_each must be a list of objects"}
+    records = for_each if for_each is not None else [_values(config)]
+
+    def write():
+        meta = metadata_cache.get(run.db, run.tenant_id)
+        rows = apply_snapshot_formulas_many(run.db, run.tenant_id, entity.id, records, run.user_context)
+        ids, errors = RecordService.bulk_insert(run.db, run.tenant_id, entity.id, rows, search_fields(meta.fields(entity.id)))
+        if for_each is None:
+            return {"error": errors[0]} if errors else {"id": ids[0], "status": "success"}
+        return _batch_result("created", len(ids) - len(errors), [{"index": i, "error": e} for i, e in sorted(errors.items())], ids=ids)
+
+    return _in_savepoint(run, "DB_CREATE", write)
+
+@action(ActionType.DB_UPDATE)
+def db_update(run, config: Dict, context: Dict):
+    # config: { table_id | entity_slug, record_id, mapped_values | data }
+    #      ou { table_id | entity_slug, for_each: [ { id, col: val }, ... ] } (um UPDATE para todos)
+    for_each = config.get('for_each')
+    if for_each is None:
+        if not (config.get('table_id') or config.get('entity_slug')) or not config.get('record_id'): return {"error": "Missing ID"}
+        patches = [{**_values(config), "id": config['record_id']}]
+    elif isinstance(for_each, list) and all(isinstance(r, dict) for r in for_each):
+        patches = for_each
+    else:
+        return {"error": "for_each must be a list of objects with id"}
+
+    entity = _entity(run, config)
+    if not entity: return {"error": "Entity not found"}
+
+    def write():
+        errors = []
+        requested = {}
+        for i, patch in enumerate(patches):
+            record_id = _valid_uuid(patch.get('id'))
+            if not record_id:
+                errors.append({"index": i, "error": "Missing or invalid id."})
+            elif record_id in requested.values():
+                errors.append({"index": i, "id": record_id, "error": "Duplicate id in batch."})
+            else:
+                requested[i] = record_id
+        existing = RecordService.fetch_many(run.db, run.tenant_id, entity.id, list(requested.values()))
+
+        positions, merged = [], []
+        for i, record_id in requested.items():
+            if record_id not in existing:
+                errors.append({"index": i, "id": record_id, "error": "Record not found."})
+                continue
+            positions.append(i)
+            merged.append({**existing[record_id], **{k: v for k, v in patches[i].items() if k != 'id'}})
+
+        meta = metadata_cache.get(run.db, run.tenant_id)
+        rows = apply_snapshot_formulas_many(run.db, run.tenant_id, entity.id, merged, run.user_context)
+        updates = [(requested[i], data) for i, data in zip(positions, rows)]
+        update_errors = RecordService.bulk_update(run.db, entity.id, updates, search_fields(meta.fields(entity.id)))
+        for pos, error in update_errors.items():
+            errors.append({"index": positions[pos], "id": updates[pos][0], "error": error})
+
+        if for_each is None:
+            return {"error": errors[0]["error"]} if errors else {"status": "success"}
+        return _batch_result("updated", len(updates) - len(update_errors), sorted(errors, key=lambda e: e["index"]))
+
+    return _in_savepoint(run, "DB_UPDATE", write)
+
+@action(ActionType.DB_DELETE)
+def db_delete(run, config: Dict, context: Dict):
+    # config: { table_id | entity_slug, record_id } ou { table_id | entity_slug, for_each: [ id, ... ] }
+    for_each = config.get('for_each')
+    if for_each is None:
+        if not (config.get('table_id') or config.get('entity_slug')) or not config.get('record_id'): return {"error": "Missing ID"}
+        raw_ids = [config['record_id']]
+    elif isinstance(for_each, list):
+        raw_ids = for_each
+    else:
+        return {"error": "for_each must be a list of ids"}
+
+    entity = _entity(run, config)
+    if not entity: return {"error": "Entity not found"}
+
+    def write():
+        ids = [_valid_uuid(r) for r in raw_ids]
+        deleted = RecordService.bulk_delete(run.db, run.tenant_id, entity.id, list({i for i in ids if i}))
+        errors = [{"index": i, "error": "Record not found."} for i, record_id in enumerate(ids) if record_id not in deleted]
+        if for_each is None:
+            return {"error": errors[0]["error"]} if errors else {"status": "success"}
+        return _batch_result("deleted", len(deleted), errors)
+
+    return _in_savepoint(run, "DB_DELETE", write)
+
+@action(ActionType.DB_FETCH_FIELD)
+def db_fetch_field(run, config: Dict, context: Dict):
+    # config: { table_id: UUID, record_id: UUID, field_name: str }
+    record_id = config.get('record_id')
+    field_name = config.get('field_name')
+    if not (config.get('table_id') or config.get('entity_slug')) or not record_id or not field_name:
+        return {"error": "Missing params for Fetch Field"}
+
+    entity = _entity(run, config)
+    if not entity: return {"error": "Entity not found"}
+
+    # Mesma transação da trilha: enxerga o que nós anteriores escreveram
+    def fetch():
+        result = run.db.execute(text("""
+            SELECT data ->> :field FROM entity_records
+            WHERE tenant_id = :tenant_id AND entity_id = :entity_id AND id = CAST(:record_id AS uuid)
+        """), {"field": field_name, "tenant_id": run.tenant_id, "entity_id": entity.id, "record_id": str(record_id)}).fetchone()
+        return {"value": result[0] if result else None, "status": "success"}
+
+    return _in_savepoint(run, "DB_FETCH_FIELD", fetch)
+
+# --- Cálculo / Arquivos ---
+
+@action(ActionType.MATH_OP)
+def math_op(run, config: Dict, context: Dict):
+    # config: { expression: "10 * 2" } (já avaliada pelo plano quando for fórmula)
+    expr = config.get('expression')
+    if expr is None or expr == "": return {"error": "No expression"}
+    if not isinstance(expr, str):
+        return {"result": expr, "status": "success"}
+    try:
+        val = run.formula_engine.evaluate(expr, context)
+        return {"result": val, "status": "success"}
+    except Exception as e:
+        return {"error": f"Math Error: {e}"}
+
+@action(ActionType.GENERATE_CSV)
+def generate_csv(run, config: Dict, context: Dict):
+    # config: { table_id: UUID, filter: str }
+    import csv
+    import os
+    from datetime import datetime
+
+    if not config.get('table_id'): return {"error": "Table ID required"}
+    entity = _entity(run, config)
+    if not entity: return {"error": "Entity not found"}
+
+    # Fetch Data (Simple Select All for now, can add filtering later)
+    rows = run.db.execute(text("""
+        SELECT data FROM entity_records WHERE tenant_id = :tenant_id AND entity_id = :entity_id
+    """), {"tenant_id": run.tenant_id, "entity_id": entity.id}).fetchall() # TODO: Apply filters
+
+    # Determine Headers (from MetaField)
+    headers = [f.name for f in metadata_cache.get(run.db, run.tenant_id).fields(entity.id)]
+
+    filename = f"export_{entity.slug}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+    filepath = os.path.join("uploads", filename)
+    # Ensure upload dir exists (in container mapped volume)
+    os.makedirs("uploads", exist_ok=True)
+
+    with open(filepath, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=headers)
+        writer.writeheader()
+        for row in rows:
+            data = row[0]
+            # Filter keys to only those in headers (schema match)
+            writer.writerow({k: data.get(k, '') for k in headers})
+
+    return {"url": f"/uploads/{filename}", "status": "success"}
+
+@action(ActionType.GENERATE_PDF, uses_db=False)
+def generate_pdf(run, config: Dict, context: Dict):
+    # config: { page_id: UUID, record_id: UUID } (Simulate Page View)
+    import os
+    from xhtml2pdf import pisa
+    from datetime import datetime
+
+    # Mock content for MVP - In real app, render a Jinja2 template
+    content = f"""
+    <html>
+    <body>
+    <h1>Relatório de Execução</h1>
+    <p>Gerado em: {datetime.now()}</p>
+    <hr/>
+    <h3>Dados do Contexto</h3>
+    <pre>{context}</pre>
+    </body>
+    </html>
+    """
+
+    filename = f"report_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
+    filepath = os.path.join("uploads", filename)
+    os.makedirs("uploads", exist_ok=True)
+
+    try:
+        with open(filepath, "w+b") as result_file:
+            pisa_status = pisa.CreatePDF(content, dest=result_file)
+        if pisa_status.err:
+            return {"error": "PDF Generation Error"}
+        return {"url": f"/uploads/{filename}", "status": "success"}
+    except Exception as e:
+        return {"error": f"PDF Error: {e}"}
+
+@action(ActionType.CREATE_TASK, uses_db=False)
+def create_task(run, config: Dict, context: Dict):
+    # config: { assignee_id: UUID, title: str, description: str }
+    # Stub for now
+    return {"status": "mock_task_created", "config": config}
+
+# --- Comunicação ---
+
+@action(ActionType.SEND_NOTIFICATION)
+def send_notification(run, config: Dict, context: Dict):
+    # config: { message: str, recipient: str (username or formula) }
+    message = config.get('message')
+    recipient_input = config.get('recipient')
+    if not message or not recipient_input: return {"error": "Missing msg/recipient"}
+
+    from app.system.models import GlobalUser
+
+    recipients = []
+    # Case 1: "pbrandon" (Username)
+    if isinstance(recipient_input, str) and not recipient_input.startswith('['):
+        user = run.db.query(GlobalUser).filter(GlobalUser.username == recipient_input).first()
+        if user: recipients.append(user.id)
+    # Case 2: List of IDs [uuid, uuid] (from formula)
+    elif isinstance(recipient_input, list):
+        recipients = recipient_input
+
+    count = 0
+    for uid in recipients:
+        # TODO: Import Notification Model
+        # For now, just Log
+        logger.info(f"NOTIFICATION to {uid}: {message}")
+        count += 1
+
+    return {"status": "success", "count": count}
+
+@action(ActionType.WEBHOOK, "WEBHOOK_OUT", uses_db=False)
+def webhook(run, config: Dict, context: Dict):
+    # config: { url: str, method: str, headers: dict, body: dict }
+    url = config.get('url')
+    if not url: return {"error": "No url"}
+    try:
+        resp = http_pool.request_sync(config.get('method', 'POST'), url, headers=config.get('headers') or {}, json=config.get('body') or {})
+        result = {"status": resp.status_code, "response": resp.text}
+        if resp.status_code >= 400:
+            result["error"] = f"HTTP {resp.status_code}"
+        return result
+    except Exception as e:
+        return {"error": str(e)}
+
+# --- Cliente (instruções devolvidas a quem disparou a trilha) ---
+
+@action(ActionType.NAVIGATE, uses_db=False)
+def navigate(run, config: Dict, context: Dict):
+    # config: { page_id: UUID, record_id: UUID/Formula }
+    return {
+        "__client_instruction": {
+            "type": "NAVIGATE",
+            "page_id": config.get('page_id'),
+            "record_id": config.get('record_id')
+        },
+        "status": "instruction_sent"
+    }
+
+@action(ActionType.SHOW_TOAST, uses_db=False)
+def show_toast(run, config: Dict, context: Dict):
+    return {
+        "__client_instruction": {"type": "SHOW_TOAST", "message": config.get('message')},
+        "status": "instruction_sent"
+    }
@@ -1,36 +1,54 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from sqlalchemy.orm import Session
-from app.engine.automation.runner import AutomationRunner
-from app.engine.automation.translator import GraphTranslator
 from app.engine.metadata.models import MetaTrail
+from app.engine.services.trail_executor import TrailExecutor, TrailNodeError
 import logging
 
 logger = logging.getLogger(__name__)
 
 class AutomationService:
-    def __init__(self, session: Session):
+    """
+    Fachada de /automation/run e do agendador sobre o TrailExecutor (runtime único de trilhas).
+    Ações: app/engine/automation/registry.py.
+    """
+
+    def __init__(self, session: Session, tenant_id, user_id: Optional[str] = None):
         self.session = session
-        self.runner = AutomationRunner(session)
+        self.executor = TrailExecutor(session, tenant_id, user_id=user_id)
 
-    def run_trail(self, trail_id: str, context: Dict[str, Any]):
+    def run_trail(self, trail_id: str, context: Dict[str, Any], trigger: str = "api"):
         """
-        Busca a trilha, traduz e executa (Síncrono).
+        Busca a trilha e executa (Síncrono).
         """
         logger.info(f"Triggering Trail: {trail_id}")
-        
+
         # Síncrono: session.get
         trail = self.session.get(MetaTrail, trail_id)
         if not trail:
             raise ValueError(f"Trail {trail_id} not found")
-            
+
         if not trail.is_active:
              logger.info(f"Trail {trail_id} is inactive. Skipping.")
              return {"success": False, "message": "Inactive trail"}
 
-        steps = GraphTranslator.translate(trail.nodes)
-        
-        if not steps:
-            logger.warning(f"Trail {trail_id} has no steps.")
-            return {"success": True, "executed": 0}
+        try:
+            execution_context = self.executor.execute_trail(trail_id, context, trigger=trigger)
+        except TrailNodeError as e:
+            # Exceção em um nó: execute_trail já desfez a transação
+            response = {"success": False, "error": str(e.error), "failed_node": e.node_id, "rolled_back": True}
+            if self.executor.trace:
+                response["run_id"] = str(self.executor.trace.run_id)
+            return response
+        if execution_context is None:
+            return {"success": False, "error": "Trail could not be compiled"}
 
-        return self.runner.run_steps(steps, context)
+        results = {nid: execution_context.get(nid) for nid in self.executor.executed}
+        response = {"success": True, "results": results}
+        if self.executor.trace:
+            response["run_id"] = str(self.executor.trace.run_id) # GET /automation/runs/{run_id}
+        # Resultado {"error"} de ação não interrompe a trilha (semântica do TrailExecutor): reporta o primeiro nó com erro
+        for nid, result in results.items():
+            if isinstance(result, dict) and result.get("error"):
+                response.update(success=False, error=result["error"], failed_node=nid)
+                break
+        return response
@@ -0,0 +1,274 @@
+import ast
+import json
+import operator
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Tradução de fórmulas (já compiladas para AST pelo FormulaEngine) em cláusulas
+# WHERE sobre entity_records.data (JSONB). Cobre o subconjunto comum usado em
+# filtros de SELECT/FILTER/SELECT_SUM; o resto cai no caminho Python.
+
+class UntranslatableFormula(Exception):
+    """A expressão usa algo que não tem equivalente SQL seguro."""
+
+NUMERIC_PATTERN = "^-?[0-9]+([.][0-9]+)?$"
+
+_SQL_OPS = {
+    ast.Eq: "=",
+    ast.NotEq: "IS DISTINCT FROM",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+}
+
+_FLIPPED_OPS = {
+    ast.Eq: ast.Eq,
+    ast.NotEq: ast.NotEq,
+    ast.Lt: ast.Gt,
+    ast.LtE: ast.GtE,
+    ast.Gt: ast.Lt,
+    ast.GtE: ast.LtE,
+}
+
+_PY_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+# Funções sem dependência da linha: podem ser avaliadas uma vez (no contexto pai)
+# e enviadas como parâmetro.
+FOLDABLE_FUNCTIONS = {
+    "TODAY", "USER", "USERNAME", "USEREMAIL", "USERCARGO",
+    "CONCATENATE", "SPLIT", "WORKDAY", "IF", "ISBLANK", "ISNOTBLANK",
+    "AND", "OR", "NOT", "int", "float", "str", "len",
+}
+
+def sql_json_key(name: str) -> str:
+    """Literal SQL para uma chave JSONB (literal, para casar com índices de expressão)."""
+    if not isinstance(name, str) or not name or "\x00" in name:
+        raise UntranslatableFormula(f"Invalid column name: {name!r}")
+    return "'" + name.replace("'", "''") + "'"
+
+def text_column(name: str) -> str:
+    if name == "id":
+        return "CAST(id AS text)"
+    return f"(data->>{sql_json_key(name)})"
+
+def numeric_column(name: str) -> str:
+    col = text_column(name)
+    return f"(CASE WHEN {col} ~ '{NUMERIC_PATTERN}' THEN CAST({col} AS numeric) END)"
+
+def aggregate_expression(agg: str, col: str) -> str:
+    """Expressão SQL de agregação (count/sum/average) sobre uma coluna JSONB."""
+    if agg == "count":
+        return "COUNT(*)"
+    if agg == "sum":
+        return f"COALESCE(SUM({numeric_column(col)}), 0)"
+    if agg == "average":
+        return f"COALESCE(AVG({numeric_column(col)}), 0)"
+    raise ValueError(f"Unknown aggregate: {agg}")
+
+def column_name(node) -> Optional[str]:
+    """Nome da coluna se o nó for variables.get('col') (exceto _THIS), senão None."""
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "get" and isinstance(node.func.value, ast.Name)
+            and node.func.value.id == "variables" and len(node.args) == 1
+            and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+        if node.args[0].value == "_THIS":
+            return None
+        return node.args[0].value
+    return None
+
+def _is_this_ref(node) -> Optional[str]:
+    # DEREF('_THIS', 'col')
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "DEREF"
+            and len(node.args) == 2 and all(isinstance(a, ast.Constant) for a in node.args)
+            and node.args[0].value == "_THIS"):
+        return node.args[1].value
+    return None
+
+def is_foldable(node) -> bool:
+    """True se o nó não depende da linha avaliada (só constantes e funções puras)."""
+    if isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return all(is_foldable(e) for e in node.elts)
+    if isinstance(node, ast.BinOp):
+        return is_foldable(node.left) and is_foldable(node.right)
+    if isinstance(node, ast.UnaryOp):
+        return is_foldable(node.operand)
+    if isinstance(node, ast.BoolOp):
+        return all(is_foldable(v) for v in node.values)
+    if isinstance(node, ast.Compare):
+        return is_foldable(node.left) and all(is_foldable(c) for c in node.comparators)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return (node.func.id in FOLDABLE_FUNCTIONS and not node.keywords
+                and all(is_foldable(a) for a in node.args))
+    return False
+
+class FormulaSQLCompiler:
+    """
+    Compila a AST de um filtro em SQL parametrizado.
+    Args:
+        this_context: contexto do registro pai ([_THIS].[col] vira parâmetro).
+        fold: callback que avalia um nó independente da linha (ex: USER(), TODAY()).
+    """
+
+    def __init__(self, this_context: Optional[Dict[str, Any]], fold: Callable[[ast.AST], Any]):
+        self.this_context = this_context or {}
+        self.fold = fold
+        self.params: Dict[str, Any] = {}
+
+    def compile_where(self, tree: ast.Expression) -> Tuple[str, Dict[str, Any]]:
+        self.params = {}
+        sql = self._condition(tree.body)
+        return sql, self.params
+
+    # --- Helpers ---
+
+    def _bind(self, value) -> str:
+        name = f"f{len(self.params)}"
+        self.params[name] = value
+        return f":{name}"
+
+    def _operand(self, node) -> Tuple[str, Any]:
+        """Retorna ('column', nome) ou ('value', valor_python)."""
+        col = column_name(node)
+        if col is not None:
+            return "column", col
+        this_col = _is_this_ref(node)
+        if this_col is not None:
+            return "value", self.this_context.get(this_col)
+        if is_foldable(node):
+            return "value", self.fold(node)
+        raise UntranslatableFormula(ast.dump(node))
+
+    # --- Condições ---
+
+    def _condition(self, node) -> str:
+        if isinstance(node, ast.BoolOp):
+            joiner = " AND " if isinstance(node.op, ast.And) else " OR "
+            return "(" + joiner.join(self._condition(v) for v in node.values) + ")"
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return f"({self._condition(node.operand)} IS NOT TRUE)"
+
+        if isinstance(node, ast.Compare):
+            parts = []
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                parts.append(self._compare(left, op, right))
+                left = right
+            return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            fname = node.func.id
+            if fname in ("AND", "OR") and node.args:
+                joiner = " AND " if fname == "AND" else " OR "
+                return "(" + joiner.join(self._condition(a) for a in node.args) + ")"
+            if fname == "NOT" and len(node.args) == 1:
+                return f"({self._condition(node.args[0])} IS NOT TRUE)"
+            if fname in ("ISBLANK", "ISNOTBLANK") and len(node.args) == 1:
+                return self._blank(node.args[0], negate=(fname == "ISNOTBLANK"))
+            if fname == "IN" and len(node.args) == 2:
+                return self._in(node.args[0], node.args[1])
+
+        if is_foldable(node):
+            return "TRUE" if self.fold(node) else "FALSE"
+
+        raise UntranslatableFormula(ast.dump(node))
+
+    def _compare(self, left_node, op, right_node) -> str:
+        op_type = type(op)
+        if op_type not in _SQL_OPS:
+            raise UntranslatableFormula(f"Operator {op_type.__name__}")
+
+        left = self._operand(left_node)
+        right = self._operand(right_node)
+
+        if left[0] == "value" and right[0] == "value":
+            try:
+                return "TRUE" if _PY_OPS[op_type](left[1], right[1]) else "FALSE"
+            except TypeError:
+                return "FALSE"
+
+        if left[0] == "value":
+            left, right = right, left
+            op_type = _FLIPPED_OPS[op_type]
+
+        col = left[1]
+        if right[0] == "column":
+            if op_type not in (ast.Eq, ast.NotEq):
+                raise UntranslatableFormula("Ordering between two columns")
+            return f"({text_column(col)} {_SQL_OPS[op_type]} {text_column(right[1])})"
+
+        value = right[1]
+        if value is None:
+            if op_type is ast.Eq:
+                return f"({text_column(col)} IS NULL)"
+            if op_type is ast.NotEq:
+                return f"({text_column(col)} IS NOT NULL)"
+            return "FALSE"
+
+        if isinstance(value, bool):
+            if op_type not in (ast.Eq, ast.NotEq) or col == "id":
+                raise UntranslatableFormula("Boolean ordering")
+            literal = "'true'::jsonb" if value else "'false'::jsonb"
+            return f"((data->{sql_json_key(col)}) {_SQL_OPS[op_type]} {literal})"
+
+        if isinstance(value, (int, float)):
+            return f"({numeric_column(col)} {_SQL_OPS[op_type]} {self._bind(value)})"
+
+        if isinstance(value, str):
+            if op_type in (ast.Eq, ast.NotEq):
+                return f"({text_column(col)} {_SQL_OPS[op_type]} {self._bind(value)})"
+            # Python compara strings por code point: COLLATE "C" reproduz isso.
+            return f"({text_column(col)} COLLATE \"C\" {_SQL_OPS[op_type]} {self._bind(value)})"
+
+        raise UntranslatableFormula(f"Unsupported value type {type(value).__name__}")
+
+    def _blank(self, node, negate: bool) -> str:
+        kind, val = self._operand(node)
+        if kind == "value":
+            blank = val is None or val == ""
+            return "TRUE" if blank != negate else "FALSE"
+        col = text_column(val)
+        if negate:
+            return f"({col} IS NOT NULL AND {col} <> '')"
+        return f"({col} IS NULL OR {col} = '')"
+
+    def _in(self, val_node, list_node) -> str:
+        val = self._operand(val_node)
+        lst = self._operand(list_node)
+
+        if val[0] == "column" and lst[0] == "value":
+            items = lst[1]
+            if not isinstance(items, list):
+                return "FALSE"
+            if not items:
+                return "FALSE"
+            if all(isinstance(i, str) for i in items):
+                return f"({text_column(val[1])} = ANY({self._bind(items)}))"
+            if all(isinstance(i, (int, float)) and not isinstance(i, bool) for i in items):
+                return f"({numeric_column(val[1])} = ANY({self._bind(items)}))"
+            raise UntranslatableFormula("Mixed IN list")
+
+        if val[0] == "value" and lst[0] == "column":
+            if lst[1] == "id":
+                raise UntranslatableFormula("IN over id")
+            # Coluna JSON array contendo o valor (usa índice GIN jsonb_path_ops se existir)
+            return f"((data->{sql_json_key(lst[1])}) @> CAST({self._bind(json.dumps([val[1]]))} AS jsonb))"
+
+        if val[0] == "value" and lst[0] == "value":
+            return "TRUE" if isinstance(lst[1], list) and val[1] in lst[1] else "FALSE"
+
+        raise UntranslatableFormula("IN between columns")
+
+def compile_filter(tree: ast.Expression, this_context: Optional[Dict[str, Any]],
+                   fold: Callable[[ast.AST], Any]) -> Tuple[str, Dict[str, Any]]:
+    """Atalho: retorna (where_sql, params) ou levanta UntranslatableFormula."""
+    return FormulaSQLCompiler(this_context, fold).compile_where(tree)
@@ -1,16 +1,304 @@
-
 import re
+import ast
+import json
 import math
 import logging
 import uuid
+from functools import lru_cache
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, FrozenSet, Set, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from app.engine.metadata.models import MetaEntity, MetaField
+from app.core.config import settings
+from app.engine.formula_sql import compile_filter, aggregate_expression, column_name, UntranslatableFormula, NUMERIC_PATTERN
+from app.engine.metadata.cache import metadata_cache, TenantMetadata, EntityMeta
 
 logger = logging.getLogger(__name__)
 
+# --- COMPILAÇÃO (Transpilação AppSheet -> Python, feita uma única vez por fórmula) ---
+
+_DEREF_PATTERN = re.compile(r'\[([^\]]+)\]\.\[([^\]]+)\]')
+_MUSTACHE_PATTERN = re.compile(r'\{\{([^\}]+)\}\}')
+_COLUMN_PATTERN = re.compile(r'\[([^\]]+)\]')
+_EQUALS_PATTERN = re.compile(r'(?<![<>!=])=(?!=)')
+
+def transpile_formula(formula: str) -> str:
+    """
+    Converte a sintaxe AppSheet para uma expressão Python avaliável.
+    Ex: [Preco] * [Qtd] -> variables.get('Preco') * variables.get('Qtd')
+    """
+    # 1. Tratamento de Dereference: [Ref].[Column]
+    # Transpila para DEREF('RefCol', 'TargetCol'); a tabela alvo é descoberta no runtime
+    # a partir dos metadados da coluna Ref do contexto atual.
+    def replace_deref(match):
+        ref_col = match.group(1)
+        target_col = match.group(2)
+        return f"DEREF('{ref_col}', '{target_col}')"
+
+    processed_formula = _DEREF_PATTERN.sub(replace_deref, formula)
+
+    # 1.5. Tratamento de Variáveis Mustache: {{variavel}} -> variables.get('variavel')
+    # Usado principalmente em Trilhas e Templates
+    def replace_mustache(match):
+        safe_var = match.group(1).replace("'", "\\'")
+        return f"variables.get('{safe_var}')"
+
+    processed_formula = _MUSTACHE_PATTERN.sub(replace_mustache, processed_formula)
+
+    # 2. Tratamento de Colunas: [Coluna] -> variables.get('Coluna')
+    # Cuidado para não quebrar strings que contem colchetes. Assumimos sintaxe valida.
+    def replace_column(match):
+        safe_col = match.group(1).replace("'", "\\'")
+        return f"variables.get('{safe_col}')"
+
+    processed_formula = _COLUMN_PATTERN.sub(replace_column, processed_formula)
+
+    # 3. Operadores AppSheet -> Python
+    processed_formula = processed_formula.replace("<>", "!=")
+    # = vira ==, mas ignora se precedido por <, >, !, =
+    processed_formula = _EQUALS_PATTERN.sub('==', processed_formula)
+    return processed_formula
+
+class CompiledFormula:
+    """
+    Resultado da compilação de uma fórmula: code object pronto para eval(),
+    colunas referenciadas (inclui colunas Ref usadas em DEREF) e funções chamadas.
+    Se a fórmula for inválida, `code` é None e `error` guarda o motivo.
+    """
+
+    def __init__(self, source: str, python_source: str, code=None, tree: Optional[ast.Expression] = None,
+                 columns: FrozenSet[str] = frozenset(), functions: FrozenSet[str] = frozenset(),
+                 error: Optional[str] = None):
+        self.source = source
+        self.python_source = python_source
+        self.code = code
+        self.tree = tree
+        self.columns = columns
+        self.functions = functions
+        self.error = error
+
+    def __repr__(self):
+        return f"<CompiledFormula {self.source!r} columns={sorted(self.columns)} functions={sorted(self.functions)}>"
+
+def _analyze(tree: ast.Expression):
+    columns = set()
+    functions = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        if isinstance(func, ast.Name):
+            functions.add(func.id)
+            if func.id == "DEREF" and node.args and isinstance(node.args[0], ast.Constant):
+                columns.add(node.args[0].value)
+        elif (isinstance(func, ast.Attribute) and func.attr == "get"
+              and isinstance(func.value, ast.Name) and func.value.id == "variables"
+              and node.args and isinstance(node.args[0], ast.Constant)):
+            columns.add(node.args[0].value)
+    return frozenset(columns), frozenset(functions)
+
+# Agregação sobre SELECT/FILTER -> função de agregação empurrada para o Postgres
+_AGGREGATE_PUSHDOWN = {"COUNT": "SELECT_COUNT", "SUM": "SELECT_SUM", "AVERAGE": "SELECT_AVERAGE"}
+
+class _AggregatePushdown(ast.NodeTransformer):
+    """
+    Reescreve COUNT(SELECT(t, c, f)) / SUM(SELECT(...)) / AVERAGE(SELECT(...)) / COUNT(FILTER(t, f))
+    em SELECT_COUNT / SELECT_SUM / SELECT_AVERAGE, que rodam como um único agregado SQL
+    em vez de materializar a lista em Python.
+    """
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if not (isinstance(func, ast.Name) and func.id in _AGGREGATE_PUSHDOWN
+                and len(node.args) == 1 and not node.keywords):
+            return node
+
+        inner = node.args[0]
+        if not (isinstance(inner, ast.Call) and isinstance(inner.func, ast.Name) and not inner.keywords):
+            return node
+
+        if inner.func.id == "SELECT" and 2 <= len(inner.args) <= 3:
+            args = list(inner.args)
+        elif inner.func.id == "FILTER" and func.id == "COUNT" and len(inner.args) == 2:
+            args = [inner.args[0], ast.Constant(value="id"), inner.args[1]]
+        else:
+            return node
+
+        rewritten = ast.Call(func=ast.Name(id=_AGGREGATE_PUSHDOWN[func.id], ctx=ast.Load()), args=args, keywords=[])
+        return ast.copy_location(rewritten, node)
+
+@lru_cache(maxsize=settings.FORMULA_CACHE_SIZE)
+def compile_formula(formula: str) -> CompiledFormula:
+    """
+    Transpila e compila uma fórmula. Cache LRU por texto da fórmula:
+    uma listagem com N linhas paga uma compilação por coluna virtual, não N.
+    Fórmulas inválidas também ficam em cache para não recompilar a cada linha.
+    """
+    python_source = transpile_formula(formula)
+    try:
+        tree = ast.parse(python_source.strip(), mode="eval")
+        tree = ast.fix_missing_locations(_AggregatePushdown().visit(tree))
+        columns, functions = _analyze(tree)
+        code = compile(tree, f"<formula {formula[:60]!r}>", "eval")
+        return CompiledFormula(formula, python_source, code, tree, columns, functions)
+    except SyntaxError as e:
+        return CompiledFormula(formula, python_source, error=str(e))
+
+# --- FUNÇÕES PURAS (não dependem do contexto de avaliação) ---
+
+# Lógica
+def app_if(cond, val_true, val_false):
+    return val_true if cond else val_false
+
+def app_ifs(*args):
+    # Pares: cond1, val1, cond2, val2 ...
+    for i in range(0, len(args), 2):
+        if i + 1 >= len(args):
+            return None # Argumentos impares sem match
+        if args[i]:
+            return args[i+1]
+    return None # Nenhuma condição verdadeira
+
+def app_isblank(val):
+    return val is None or val == ""
+
+def app_isnotblank(val):
+    return not app_isblank(val)
+
+def app_and(*args):
+    return all(args)
+
+def app_or(*args):
+    return any(args)
+
+def app_not(val):
+    return not val
+
+# Listas
+def app_any(lst):
+    if isinstance(lst, list) and len(lst) > 0:
+        return lst[0]
+    return None
+
+def app_in(val, lst):
+    if isinstance(lst, list):
+        return val in lst
+    return False
+
+# Matemática e Agregação
+def app_count(lst):
+    if isinstance(lst, list):
+        return len(lst)
+    return 0
+
+def app_sum(lst):
+    if isinstance(lst, list):
+        # Filtrar nulos e somar
+        return sum(float(x) for x in lst if x is not None and str(x).replace('.','',1).isdigit())
+    return 0
+
+def app_average(lst):
+    if isinstance(lst, list) and len(lst) > 0:
+        clean = [float(x) for x in lst if x is not None and str(x).replace('.','',1).isdigit()]
+        if not clean: return 0
+        return sum(clean) / len(clean)
+    return 0
+
+_NUMBER_PATTERN = re.compile(NUMERIC_PATTERN)
+
+def numeric_values(lst) -> List[float]:
+    """Mesma regra de conversão usada nos agregados SQL (numeric_column)."""
+    return [float(x) for x in lst if x is not None and not isinstance(x, bool) and _NUMBER_PATTERN.match(str(x))]
+
+def app_uniqueid():
+    return str(uuid.uuid4())[:8] # AppSheet style short UUID or Full? Usando short por enquanto.
+
+# Data e Hora
+def app_today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+def app_now():
+    return datetime.now() # retorna datetime object
+
+def app_timenow():
+    return datetime.now().time()
+
+def app_workday(start_date, days):
+    # Simplificado: não considera feriados, só fds
+    if isinstance(start_date, str):
+        try: start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        except: return None
+    if not isinstance(start_date, (date, datetime)):
+        return None
+
+    current = start_date
+    added = 0
+    direction = 1 if int(days) > 0 else -1
+    days = abs(int(days))
+
+    while added < days:
+        current += timedelta(days=direction)
+        if current.weekday() < 5: # 0-4 é Seg-Sex
+            added += 1
+    return current.strftime("%Y-%m-%d")
+
+# Texto
+def app_concatenate(*args):
+    return "".join([str(a) if a is not None else "" for a in args])
+
+def app_split(text_val, separator):
+    if not text_val: return []
+    return str(text_val).split(separator)
+
+STATIC_GLOBALS = {
+    "__builtins__": None,
+    # Python basics
+    "math": math,
+    "int": int, "float": float, "str": str, "len": len, "list": list,
+    # Logic
+    "IF": app_if, "IFS": app_ifs,
+    "ISBLANK": app_isblank, "ISNOTBLANK": app_isnotblank,
+    "AND": app_and, "OR": app_or, "NOT": app_not,
+    # List
+    "ANY": app_any, "IN": app_in,
+    # Math
+    "COUNT": app_count, "SUM": app_sum, "AVERAGE": app_average, "UNIQUEID": app_uniqueid,
+    # Date
+    "TODAY": app_today, "NOW": app_now, "TIMENOW": app_timenow, "WORKDAY": app_workday,
+    # Text
+    "CONCATENATE": app_concatenate, "SPLIT": app_split,
+}
+
+def sanitize_value(v):
+    """Strings numéricas viram int/float (mesma regra aplicada ao contexto da fórmula)."""
+    if isinstance(v, str):
+        try:
+            if v.isdigit(): return int(v)
+            elif v.replace('.','',1).isdigit(): return float(v)
+        except: pass
+    return v
+
+def _json_text(v):
+    """Equivalente Python de data->>'col' (valor JSON como texto)."""
+    if v is None or isinstance(v, str):
+        return v
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, (dict, list)):
+        return json.dumps(v)
+    return str(v)
+
+class _EvalFrame:
+    """Estado de uma chamada de evaluate() (empilhado para suportar recursão via SELECT)."""
+
+    def __init__(self, context, safe_context, user_context, current_entity_id):
+        self.context = context
+        self.safe_context = safe_context
+        self.user_context = user_context
+        self.current_entity_id = current_entity_id
+
 class FormulaEngine:
     """
     Motor de processamento de expressões estilo AppSheet.
@@ -21,6 +309,29 @@ class FormulaEngine:
         self.db = db
         self.tenant_id = tenant_id
         self._geocode_cache = {} # Cache local para esta instância
+        self._frames: List[_EvalFrame] = []
+        # Refs pré-carregadas em lote: (slug, coluna_chave) -> (chaves buscadas, {chave: data}).
+        # Válidas só dentro de batch() (evaluate_many): limpas ao sair, não crescem nem envelhecem.
+        self._prefetched: Dict[Tuple[str, str], Tuple[Set[str], Dict[str, Dict[str, Any]]]] = {}
+
+        # Globals montados uma única vez por instância.
+        # Funções dependentes de contexto leem o frame atual (topo da pilha).
+        self._globals = {
+            **STATIC_GLOBALS,
+            # User
+            "USER": self._fn_user, "USERNAME": self._fn_username,
+            "USEREMAIL": self._fn_useremail, "USERCARGO": self._fn_usercargo,
+            # List/Search
+            "LOOKUP": self._fn_lookup, "SELECT": self._fn_select, "FILTER": self._fn_filter,
+            "SELECT_SUM": self._fn_select_sum, "SELECT_COUNT": self._fn_select_count,
+            "SELECT_AVERAGE": self._fn_select_average, "DEREF": self._fn_deref,
+            # Geo
+            "LATLONG": self._fn_latlong
+        }
+
+    @staticmethod
+    def compile(formula: str) -> CompiledFormula:
+        return compile_formula(formula)
 
     def evaluate(self, formula: str, context: Dict[str, Any], user_context: Optional[Dict[str, Any]] = None, current_entity_id: Optional[str] = None) -> Any:
         """
@@ -33,318 +344,316 @@ class FormulaEngine:
         """
         if not formula:
             return None
-            
         try:
-            # --- PRE-PROCESSAMENTO (REGEX Transpilation) ---
-            
-            processed_formula = formula
-            
-            # 1. Tratamento de Dereference: [Ref].[Column]
-            # Converte [RefField].[TargetCol] -> LOOKUP([RefField], 'TargetTableDeterminedByMeta', 'id', 'TargetCol')
-            # OBS: Resolver a tabela alvo requer consulta de metadados se não for explicito.
-            # Para MVP Agil: Se conseguirmos identificar o campo Ref, injetamos.
-            # Caso contrário, teremos que usar uma função DEREF dinamica.
-            
-            # Regex para [Ref].[Col] - suporta nomes com espaço dentro dos colchetes
-            deref_pattern = r'\[([^\]]+)\]\.\[([^\]]+)\]'
-            
-            def replace_deref(match):
-                ref_col = match.group(1)
-                target_col = match.group(2)
-                # Tentativa de inferir tabela é custosa aqui sem cache. 
-                # Vamos usar uma função helper DEREF que faz a busca no runtime.
-                # Transpila para: DEREF(context['RefCol'], 'TargetCol')
-                # A função DEREF precisará descobrir a tabela alvo baseada no nome da coluna Ref do contexto atual.
-                return f"DEREF('{ref_col}', '{target_col}')"
-            
-            processed_formula = re.sub(deref_pattern, replace_deref, processed_formula)
-
-            # 1.5. Tratamento de Variáveis Mustache: {{variavel}} -> variables.get('variavel')
-            # Usado principalmente em Trilhas e Templates
-            def replace_mustache(match):
-                var_name = match.group(1)
-                safe_var = var_name.replace("'", "\\'")
-                return f"variables.get('{safe_var}')"
-            
-            processed_formula = re.sub(r'\{\{([^\}]+)\}\}', replace_mustache, processed_formula)
-
-            # 2. Tratamento de Colunas: [Coluna] -> variables.get('Coluna')
-            # Cuidado para não quebrar strings que contem colchetes. Assumimos sintaxe valida.
-            def replace_column(match):
-                col_name = match.group(1)
-                # Escape single quotes in column name just in case
-                safe_col = col_name.replace("'", "\\'")
-                return f"variables.get('{safe_col}')"
-            
-            processed_formula = re.sub(r'\[([^\]]+)\]', replace_column, processed_formula)
-            
-            # 3. Operadores AppSheet -> Python
-            processed_formula = processed_formula.replace("<>", "!=")
-            # = vira ==, mas ignora se precedido por <, >, !, = 
-            processed_formula = re.sub(r'(?<![<>!=])=(?!=)', '==', processed_formula) 
-            
-            # --- DEFINIÇÃO DE FUNÇÕES (GLOBALS) ---
+            compiled = compile_formula(formula)
+        except Exception as e:
+            logger.error(f"Formula Error '{formula}': {e}")
+            return None
+        return self.evaluate_compiled(compiled, context, user_context, current_entity_id)
 
-            # Lógica
-            def app_if(cond, val_true, val_false):
-                return val_true if cond else val_false
-            
-            def app_ifs(*args):
-                # Pares: cond1, val1, cond2, val2 ...
-                for i in range(0, len(args), 2):
-                    if i + 1 >= len(args): 
-                        return None # Argumentos impares sem match
-                    if args[i]:
-                        return args[i+1]
-                return None # Nenhuma condição verdadeira
-
-            def app_isblank(val):
-                return val is None or val == ""
-            
-            def app_isnotblank(val):
-                return not app_isblank(val)
-            
-            def app_and(*args):
-                return all(args)
-            
-            def app_or(*args):
-                return any(args)
+    def evaluate_compiled(self, compiled: CompiledFormula, context: Dict[str, Any], user_context: Optional[Dict[str, Any]] = None, current_entity_id: Optional[str] = None) -> Any:
+        """Avalia uma fórmula já compilada (ex.: slots de um plano de trilha), sem lookup no cache."""
+        formula = compiled.source
+        try:
+            if compiled.code is None:
+                logger.error(f"Formula Error '{formula}': {compiled.error}")
+                return None
+
+            # Sanitização do Contexto
+            safe_context = {k: sanitize_value(v) for k, v in context.items()}
             
-            def app_not(val):
-                return not val
+            # Adiciona _THIS ao contexto (cópia do contexto original)
+            if '_THIS' not in safe_context:
+                safe_context['_THIS'] = safe_context.copy()
 
+            self._frames.append(_EvalFrame(context, safe_context, user_context, current_entity_id))
+            try:
+                return eval(compiled.code, self._globals, {"variables": safe_context})
+            finally:
+                self._frames.pop()
 
-            # Usuário
-            def app_user():
-                # Retorna o NOME do usuário (Full Name)
-                return user_context.get('name') if user_context else None
-            
-            def app_username():
-                # Retorna o USERNAME/LOGIN do usuário
-                return user_context.get('username') if user_context else None
+        except Exception as e:
+            logger.error(f"Formula Error '{formula}': {e}")
+            return None
 
-            def app_useremail():
-                return user_context.get('email') if user_context else None
-            
-            def app_usercargo():
-                return user_context.get('cargo') if user_context else None
+    def evaluate_many(self, formulas: Dict[str, str], rows: List[Dict[str, Any]], user_context: Optional[Dict[str, Any]] = None, current_entity_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Avalia várias fórmulas ({nome: fórmula}) para várias linhas (modo lote).
+        Antes de avaliar, resolve todas as referências [Ref].[Col] / LOOKUP da página
+        com uma query por entidade alvo, em vez de uma query por linha.
+        """
+        if not formulas or not rows:
+            return [{} for _ in rows]
 
-            # Buscas e Listas
-            def app_lookup(lookup_val, table_slug, lookup_col, return_col):
-                return self._lookup(lookup_val, table_slug, lookup_col, return_col)
-            
-            def app_deref(ref_col_name, target_col_name):
-                # Função mágica para [Ref].[Col] ou [Table].[Col]
-                
-                # 1. Tentar resolver como Referência do Contexto (Dereference)
-                ref_val = context.get(ref_col_name)
-                
-                if ref_val:
-                    # É um campo do registro atual. Descobrir tabela alvo.
-                    if not current_entity_id: return None
-                    
-                    field_meta = self.db.execute(text("""
-                        SELECT f.options 
-                        FROM meta_fields f
-                        WHERE f.entity_id = :ent_id AND f.name = :fname
-                    """), {"ent_id": current_entity_id, "fname": ref_col_name}).fetchone()
-                    
-                    if field_meta and field_meta[0]:
-                        options = field_meta[0]
-                        target_table = options.get('target')
-                        if target_table:
-                            return self._lookup(ref_val, target_table, 'id', target_col_name)
-
-                # 2. Tentar resolver como Tabela Global (List Select)
-                # Se [Nome] não está no contexto, pode ser o nome de uma Tabela.
-                # Ex: [StatusConfig].[ValidStatus] -> Retorna Lista de valores
-                
-                # Tenta buscar entidade por slug OU display_name
-                target_entity = self.db.query(MetaEntity).filter(
-                    (MetaEntity.slug == ref_col_name) | (MetaEntity.display_name == ref_col_name),
-                    MetaEntity.tenant_id == self.tenant_id
-                ).first()
-                
-                if target_entity:
-                    # Retorna lista de valores da coluna
-                    return self._select(target_entity.slug, target_col_name, None, user_context)
+        with self.batch(formulas.values(), rows, current_entity_id):
+            results = []
+            for row in rows:
+                results.append({
+                    name: self.evaluate(formula, row, user_context, current_entity_id=current_entity_id)
+                    for name, formula in formulas.items()
+                })
+        return results
+
+    @contextmanager
+    def batch(self, formulas: Iterable[str], rows: List[Dict[str, Any]], current_entity_id: Optional[str] = None):
+        """
+        Escopo do modo lote: pré-carrega as referências das linhas e as descarta ao sair.
+        Engines de vida longa (TrailExecutor) não guardam registros de lotes anteriores.
+        """
+        self.prefetch_references(formulas, rows, current_entity_id)
+        try:
+            yield self
+        finally:
+            self._prefetched.clear()
 
-                return None
+    def prefetch_references(self, formulas: Iterable[str], rows: List[Dict[str, Any]], current_entity_id: Optional[str] = None):
+        """
+        Coleta as chaves de referência usadas pelas fórmulas em todas as linhas e
+        carrega os registros alvo com `WHERE id = ANY(:ids)` (ou `data->>col = ANY(:vals)`).
+        Use via batch(), que limita o mapa ao lote.
+        """
+        meta = self._meta()
+        wanted: Dict[Tuple[str, str], Set[str]] = {}
+
+        for formula in formulas:
+            compiled = compile_formula(formula) if formula else None
+            if not compiled or compiled.tree is None:
+                continue
+            for node in ast.walk(compiled.tree):
+                if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)):
+                    continue
+                args = node.args
+
+                # [Ref].[Col] -> DEREF('Ref', 'Col'): alvo vem de options.target
+                if node.func.id == "DEREF" and len(args) == 2 and isinstance(args[0], ast.Constant):
+                    ref_col = args[0].value
+                    target = meta.ref_target(current_entity_id, ref_col) if current_entity_id else None
+                    if not target:
+                        continue
+                    keys = wanted.setdefault((target, "id"), set())
+                    for row in rows:
+                        if row.get(ref_col):
+                            keys.add(str(row.get(ref_col)))
+
+                # LOOKUP([Col], 'tabela', 'coluna', 'retorno') com tabela/coluna constantes
+                elif node.func.id == "LOOKUP" and len(args) == 4 \
+                        and isinstance(args[1], ast.Constant) and isinstance(args[2], ast.Constant):
+                    keys = wanted.setdefault((args[1].value, args[2].value), set())
+                    if isinstance(args[0], ast.Constant):
+                        keys.add(str(args[0].value))
+                        continue
+                    col = column_name(args[0])
+                    if col is None:
+                        continue
+                    for row in rows:
+                        keys.add(str(sanitize_value(row.get(col))))
+
+        for (slug, key_col), keys in wanted.items():
+            known = self._prefetched.get((slug, key_col))
+            missing = keys - known[0] if known else keys
+            if missing:
+                self._prefetch(slug, key_col, missing)
+
+    def _prefetch(self, target_table_slug: str, key_col: str, keys: Set[str]):
+        target_entity = self._get_entity(target_table_slug)
+        if not target_entity:
+            return
+
+        fetched: Dict[str, Dict[str, Any]] = {}
+        try:
+            if key_col == "id":
+                # Só UUIDs válidos; o resto não casa com nenhum registro
+                ids = []
+                for k in keys:
+                    try: ids.append(str(uuid.UUID(k)))
+                    except ValueError: pass
+                if ids:
+                    sql = text("SELECT id, data FROM entity_records WHERE entity_id = :eid AND id = ANY(CAST(:ids AS uuid[]))")
+                    for r in self.db.execute(sql, {"eid": target_entity.id, "ids": ids}).fetchall():
+                        fetched[str(r.id)] = r.data or {}
+            else:
+                sql = text("SELECT id, data FROM entity_records WHERE entity_id = :eid AND data->>:key_col = ANY(:vals)")
+                rows = self.db.execute(sql, {"eid": target_entity.id, "key_col": key_col, "vals": list(keys)}).fetchall()
+                for r in rows:
+                    k = _json_text((r.data or {}).get(key_col))
+                    fetched.setdefault(k, r.data or {}) # LIMIT 1: primeiro encontrado
+        except Exception as e:
+            logger.error(f"Prefetch DB Error ({target_table_slug}.{key_col}): {e}")
+            return
 
-            def app_select(table_slug, return_col, filter_expr=None):
-                return self._select(table_slug, return_col, filter_expr, user_context, parent_context=safe_context)
+        known_keys, known_rows = self._prefetched.setdefault((target_table_slug, key_col), (set(), {}))
+        known_keys.update(keys)
+        known_rows.update(fetched)
 
-            def app_filter(table_slug, filter_expr):
-                return self._select(table_slug, "id", filter_expr, user_context, parent_context=safe_context)
+    # --- FUNÇÕES DEPENDENTES DE CONTEXTO ---
 
-            def app_any(lst):
-                if isinstance(lst, list) and len(lst) > 0:
-                    return lst[0]
-                return None
-            
-            def app_in(val, lst):
-                if isinstance(lst, list):
-                    return val in lst
-                return False
-
-            # Matemática e Agregação
-            def app_count(lst):
-                if isinstance(lst, list):
-                    return len(lst)
-                return 0
-            
-            def app_sum(lst):
-                if isinstance(lst, list):
-                    # Filtrar nulos e somar
-                    return sum(float(x) for x in lst if x is not None and str(x).replace('.','',1).isdigit())
-                return 0
-            
-            def app_average(lst):
-                if isinstance(lst, list) and len(lst) > 0:
-                    clean = [float(x) for x in lst if x is not None and str(x).replace('.','',1).isdigit()]
-                    if not clean: return 0
-                    return sum(clean) / len(clean)
-                return 0
-            
-            def app_uniqueid():
-                return str(uuid.uuid4())[:8] # AppSheet style short UUID or Full? Usando short por enquanto.
+    @property
+    def _frame(self) -> _EvalFrame:
+        return self._frames[-1]
 
-            # Data e Hora
-            def app_today():
-                return datetime.now().strftime("%Y-%m-%d")
-            
-            def app_now():
-                return datetime.now() # retorna datetime object
-            
-            def app_timenow():
-                return datetime.now().time()
-            
-            def app_workday(start_date, days):
-                # Simplificado: não considera feriados, só fds
-                if isinstance(start_date, str):
-                    try: start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
-                    except: return None
-                if not isinstance(start_date, (date, datetime)):
-                    return None
-                
-                current = start_date
-                added = 0
-                direction = 1 if int(days) > 0 else -1
-                days = abs(int(days))
-                
-                while added < days:
-                    current += timedelta(days=direction)
-                    if current.weekday() < 5: # 0-4 é Seg-Sex
-                        added += 1
-                return current.strftime("%Y-%m-%d")
-
-            # Texto
-            def app_concatenate(*args):
-                return "".join([str(a) if a is not None else "" for a in args])
-            
-            def app_split(text_val, separator):
-                if not text_val: return []
-                return str(text_val).split(separator)
-
-            # Geocodificação
-            def app_latlong(address):
-                if not address: return None
-                if address in self._geocode_cache:
-                    return self._geocode_cache[address]
-                
-                try:
-                    import httpx
-                    with httpx.Client(timeout=10.0) as client:
-                        resp = client.get(
-                            "https://nominatim.openstreetmap.org/search",
-                            params={"q": address, "format": "json", "limit": 1},
-                            headers={"User-Agent": "RepforceCRM/1.0"}
-                        )
-                        if resp.status_code == 200:
-                            data = resp.json()
-                            if data:
-                                lat = data[0].get("lat")
-                                lon = data[0].get("lon")
-                                res = f"{lat},{lon}"
-                                self._geocode_cache[address] = res
-                                return res
-                except Exception as e:
-                    logger.error(f"Geocoding error for '{address}': {e}")
-                return None
-            
-            def app_select_sum(table_slug, sum_col, filter_expr=None):
-                # Otimização para somar direto do banco ou iterar somando
-                # Como _select já itera, podemos reusar mas evitar criar lista gigante
-                rows = self._select(table_slug, None, filter_expr, user_context, return_full_row=True, parent_context=safe_context)
-                total = 0.0
-                for r in rows:
-                     val = r.get(sum_col)
-                     if val is not None and str(val).replace('.','',1).isdigit():
-                         total += float(val)
-                return total
-
-            # Globals para eval
-            eval_globals = {
-                "__builtins__": None,
-                # Python basics
-                "math": math,
-                "int": int, "float": float, "str": str, "len": len, "list": list,
-                # Logic
-                "IF": app_if, "IFS": app_ifs, 
-                "ISBLANK": app_isblank, "ISNOTBLANK": app_isnotblank,
-                "AND": app_and, "OR": app_or, "NOT": app_not,
-                # User
-                "USER": app_user, "USERNAME": app_username, "USEREMAIL": app_useremail, "USERCARGO": app_usercargo,
-                # List/Search
-                "LOOKUP": app_lookup, "SELECT": app_select, "FILTER": app_filter, 
-                "SELECT_SUM": app_select_sum,
-                "ANY": app_any, "IN": app_in, "DEREF": app_deref,
-                # Math
-                "COUNT": app_count, "SUM": app_sum, "AVERAGE": app_average, "UNIQUEID": app_uniqueid,
-                # Date
-                "TODAY": app_today, "NOW": app_now, "TIMENOW": app_timenow, "WORKDAY": app_workday,
-                # Text
-                "CONCATENATE": app_concatenate, "SPLIT": app_split,
-                # Geo
-                "LATLONG": app_latlong
-            }
+    # Usuário
+    def _fn_user(self):
+        # Retorna o NOME do usuário (Full Name)
+        user_context = self._frame.user_context
+        return user_context.get('name') if user_context else None
 
-            # Sanitização do Contexto
-            safe_context = {}
-            for k, v in context.items():
-                if isinstance(v, str):
-                    try:
-                        if v.isdigit(): safe_context[k] = int(v)
-                        elif v.replace('.','',1).isdigit(): safe_context[k] = float(v)
-                        else: safe_context[k] = v
-                    except: safe_context[k] = v
-                else:
-                    safe_context[k] = v
-            
-            # Adiciona _THIS ao contexto (cópia do contexto original)
-            if '_THIS' not in safe_context:
-                safe_context['_THIS'] = safe_context.copy()
+    def _fn_username(self):
+        # Retorna o USERNAME/LOGIN do usuário
+        user_context = self._frame.user_context
+        return user_context.get('username') if user_context else None
+
+    def _fn_useremail(self):
+        user_context = self._frame.user_context
+        return user_context.get('email') if user_context else None
+
+    def _fn_usercargo(self):
+        user_context = self._frame.user_context
+        return user_context.get('cargo') if user_context else None
+
+    # Buscas e Listas
+    def _fn_lookup(self, lookup_val, table_slug, lookup_col, return_col):
+        return self._lookup(lookup_val, table_slug, lookup_col, return_col)
+
+    def _fn_deref(self, ref_col_name, target_col_name):
+        # Função mágica para [Ref].[Col] ou [Table].[Col]
+        frame = self._frame
+
+        # 0. [_THIS].[Col]: _THIS é o registro pai (dict), não uma Ref
+        if ref_col_name == '_THIS':
+            this_val = frame.safe_context.get('_THIS')
+            if isinstance(this_val, dict):
+                return this_val.get(target_col_name)
+
+        # 1. Tentar resolver como Referência do Contexto (Dereference)
+        ref_val = frame.context.get(ref_col_name)
+
+        if ref_val:
+            # É um campo do registro atual. Descobrir tabela alvo.
+            if not frame.current_entity_id: return None
+
+            target_table = self._meta().ref_target(frame.current_entity_id, ref_col_name)
+            if target_table:
+                return self._lookup(ref_val, target_table, 'id', target_col_name)
+
+        # 2. Tentar resolver como Tabela Global (List Select)
+        # Se [Nome] não está no contexto, pode ser o nome de uma Tabela.
+        # Ex: [StatusConfig].[ValidStatus] -> Retorna Lista de valores
+
+        # Tenta buscar entidade por slug OU display_name
+        target_entity = self._meta().entity_by_name(ref_col_name)
+
+        if target_entity:
+            # Retorna lista de valores da coluna
+            return self._select(target_entity.slug, target_col_name, None, frame.user_context)
+
+        return None
+
+    def _fn_select(self, table_slug, return_col, filter_expr=None):
+        frame = self._frame
+        return self._select(table_slug, return_col, filter_expr, frame.user_context, parent_context=frame.safe_context)
+
+    def _fn_filter(self, table_slug, filter_expr):
+        frame = self._frame
+        return self._select(table_slug, "id", filter_expr, frame.user_context, parent_context=frame.safe_context)
+
+    def _fn_select_sum(self, table_slug, sum_col, filter_expr=None):
+        return self._aggregate("sum", table_slug, sum_col, filter_expr)
+
+    def _fn_select_count(self, table_slug, col="id", filter_expr=None):
+        return self._aggregate("count", table_slug, col, filter_expr)
 
-            logger.debug(f"Eval: {processed_formula} | Ctx: {safe_context.keys()}")
-            return eval(processed_formula, eval_globals, {"variables": safe_context})
+    def _fn_select_average(self, table_slug, avg_col, filter_expr=None):
+        return self._aggregate("average", table_slug, avg_col, filter_expr)
 
+    # Geocodificação
+    def _fn_latlong(self, address):
+        if not address: return None
+        if address in self._geocode_cache:
+            return self._geocode_cache[address]
+
+        try:
+            from app.core.http_client import http_pool
+            resp = http_pool.request_sync(
+                "GET",
+                "https://nominatim.openstreetmap.org/search",
+                params={"q": address, "format": "json", "limit": 1},
+                headers={"User-Agent": "RepforceCRM/1.0"}
+            )
+            if resp.status_code == 200:
+                data = resp.json()
+                if data:
+                    lat = data[0].get("lat")
+                    lon = data[0].get("lon")
+                    res = f"{lat},{lon}"
+                    self._geocode_cache[address] = res
+                    return res
         except Exception as e:
-            logger.error(f"Formula Error '{formula}': {e}")
-            return None
+            logger.error(f"Geocoding error for '{address}': {e}")
+        return None
+
+    def _meta(self) -> TenantMetadata:
+        return metadata_cache.get(self.db, self.tenant_id)
+
+    def _get_entity(self, table_slug) -> Optional[EntityMeta]:
+        return self._meta().entity_by_slug(table_slug)
+
+    def _aggregate(self, agg, table_slug, col, filter_expr_raw):
+        """
+        SELECT_SUM / SELECT_COUNT / SELECT_AVERAGE.
+        Com filtro traduzível (ou sem filtro) vira um único SUM/COUNT/AVG no Postgres;
+        caso contrário agrega em Python sobre o resultado de _select.
+        """
+        frame = self._frame
+        try:
+            target_entity = self._get_entity(table_slug)
+            if not target_entity: return 0
+
+            has_filter = bool(filter_expr_raw) and filter_expr_raw != "TRUE"
+            translated = self._compile_filter_sql(filter_expr_raw, frame.safe_context) if has_filter else None
+
+            if not has_filter or translated:
+                params = {"eid": target_entity.id}
+                where_sql = ""
+                if translated:
+                    where_sql, filter_params = translated
+                    where_sql = f" AND {where_sql}"
+                    params.update(filter_params)
+
+                sql = text(f"SELECT {aggregate_expression(agg, col)} FROM entity_records WHERE entity_id = :eid{where_sql}")
+                val = self.db.execute(sql, params).scalar()
+                if agg == "count":
+                    return int(val or 0)
+                return float(val or 0)
+        except Exception as e:
+            logger.error(f"Aggregate DB Error: {e}")
+            return 0
+
+        values = self._select(table_slug, col, filter_expr_raw, frame.user_context, parent_context=frame.safe_context)
+        if agg == "count":
+            return len(values)
+        nums = numeric_values(values)
+        if agg == "sum":
+            return sum(nums)
+        return sum(nums) / len(nums) if nums else 0
 
     def _lookup(self, lookup_val, target_table_slug, lookup_col, return_col):
+        # Modo lote: resposta vem do mapa pré-carregado (inclusive "não existe")
+        prefetched = self._prefetched.get((target_table_slug, lookup_col))
+        if prefetched is not None and str(lookup_val) in prefetched[0]:
+            data = prefetched[1].get(str(lookup_val))
+            return _json_text(data.get(return_col)) if data else None
+
         try:
-            target_entity = self.db.query(MetaEntity).filter(
-                MetaEntity.slug == target_table_slug, 
-                MetaEntity.tenant_id == self.tenant_id
-            ).first()
+            target_entity = self._get_entity(target_table_slug)
             if not target_entity: return None
 
+            # Refs guardam o id do registro alvo (coluna, não chave do JSON)
+            key_expr = "CAST(id AS text)" if lookup_col == "id" else "data->>:key_col"
             sql = text(f"""
                 SELECT data->>:return_col 
                 FROM entity_records 
                 WHERE entity_id = :entity_id 
-                AND data->>:key_col = :val
+                AND {key_expr} = :val
                 LIMIT 1
             """)
             row = self.db.execute(sql, {
@@ -358,43 +667,80 @@ class FormulaEngine:
             logger.error(f"Lookup DB Error: {e}")
             return None
 
+    def _fold_constant(self, node: ast.AST) -> Any:
+        """Avalia um nó que não depende da linha (ex: USER(), TODAY()) no frame atual."""
+        expr = ast.fix_missing_locations(ast.Expression(body=node))
+        return eval(compile(expr, "<formula-fold>", "eval"), self._globals, {"variables": {}})
+
+    def _compile_filter_sql(self, filter_expr_raw, parent_context):
+        """
+        Tenta traduzir o filtro para SQL WHERE. Retorna (where, params) ou None
+        quando a expressão precisa ser avaliada em Python linha a linha.
+        """
+        if not isinstance(filter_expr_raw, str):
+            return None
+        compiled = compile_formula(filter_expr_raw)
+        if compiled.tree is None:
+            return None
+        try:
+            return compile_filter(compiled.tree, parent_context, self._fold_constant)
+        except UntranslatableFormula as e:
+            logger.debug(f"Filter '{filter_expr_raw}' not translatable to SQL ({e}). Using Python path.")
+            return None
+
     def _select(self, table_slug, return_col, filter_expr_raw, user_context, return_full_row=False, parent_context=None):
         """
-        Implementação básica de SELECT. 
-        Warning: Performance crítica. Itera sobre registros para filtrar via Python se expression complexa.
+        Implementação de SELECT.
+        Filtros do subconjunto comum (comparações, AND/OR/NOT, IN, ISBLANK, [_THIS].[col])
+        são transpilados para SQL WHERE e executados no Postgres. Expressões não traduzíveis
+        caem no caminho Python, que itera sobre os registros avaliando o filtro linha a linha.
         Se filter_expr_raw for None, retorna tudo.
         """
         try:
-            target_entity = self.db.query(MetaEntity).filter(
-                MetaEntity.slug == table_slug, 
-                MetaEntity.tenant_id == self.tenant_id
-            ).first()
+            target_entity = self._get_entity(table_slug)
             if not target_entity: return []
 
-            # Buscar TODOS os registros da entidade alvo
-            # TODO: Em produção, isso deve ser otimizado para não carregar tudo na memória
-            # Ou implementar transpilação de formula para SQL WHERE.
-            
-            sql = text("SELECT id, data FROM entity_records WHERE entity_id = :eid")
-            rows = self.db.execute(sql, {"eid": target_entity.id}).fetchall()
-            
-            results = []
-            
-            # Se não tiver filtro, retorna direto
-            if not filter_expr_raw or filter_expr_raw == "TRUE":
+            params = {"eid": target_entity.id}
+            if return_full_row:
+                projection = "id, data"
+            elif return_col == "id":
+                projection = "id"
+            else:
+                projection = "id, data->:return_col AS value"
+                params["return_col"] = return_col
+
+            has_filter = bool(filter_expr_raw) and filter_expr_raw != "TRUE"
+            translated = self._compile_filter_sql(filter_expr_raw, parent_context) if has_filter else None
+
+            # Se não tiver filtro (ou se o filtro virou SQL), o banco já entrega o resultado final
+            if not has_filter or translated:
+                where_sql = ""
+                if translated:
+                    where_sql, filter_params = translated
+                    where_sql = f" AND {where_sql}"
+                    params.update(filter_params)
+
+                sql = text(f"SELECT {projection} FROM entity_records WHERE entity_id = :eid{where_sql}")
+                rows = self.db.execute(sql, params).fetchall()
+
+                results = []
                 for r in rows:
                     if return_full_row:
                         full = r.data
                         full['id'] = str(r.id)
                         results.append(full)
+                    elif return_col == "id":
+                        results.append(str(r.id))
                     else:
-                        data = r.data
-                        if return_col == "id": results.append(str(r.id))
-                        else: results.append(data.get(return_col))
+                        results.append(r.value)
                 return results
 
-            # Se tiver filtro, avalia para cada linha
+            # Caminho Python: filtro não traduzível, avalia para cada linha
             # Recursão do evaluate!
+            sql = text("SELECT id, data FROM entity_records WHERE entity_id = :eid")
+            rows = self.db.execute(sql, {"eid": target_entity.id}).fetchall()
+            
+            results = []
             for r in rows:
                 row_ctx = r.data
                 row_ctx['id'] = str(r.id) # Ensure ID is available
@@ -420,4 +766,3 @@ class FormulaEngine:
         except Exception as e:
             logger.error(f"Select DB Error: {e}")
             return []
-
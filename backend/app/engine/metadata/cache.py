@@ -0,0 +1,183 @@
+import time
+import uuid
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.tenant_cache import tenant_cache
+from app.engine.metadata import models as models_meta
+
+logger = logging.getLogger(__name__)
+
+class EntityMeta:
+    """Snapshot imutável (desacoplado da sessão) de um MetaEntity."""
+
+    def __init__(self, entity: models_meta.MetaEntity):
+        self.id = entity.id
+        self.tenant_id = entity.tenant_id
+        self.slug = entity.slug
+        self.display_name = entity.display_name
+        self.is_system = entity.is_system
+        self.icon = entity.icon
+        self.layout_config = entity.layout_config
+
+class FieldMeta:
+    """Snapshot imutável (desacoplado da sessão) de um MetaField."""
+
+    def __init__(self, field: models_meta.MetaField):
+        self.id = field.id
+        self.entity_id = field.entity_id
+        self.name = field.name
+        self.label = field.label
+        self.field_type = field.field_type
+        self.is_required = field.is_required
+        self.options = field.options
+        self.formula = field.formula
+        self.is_virtual = field.is_virtual
+        self.is_filterable = bool(field.is_filterable)
+        self.is_sortable = bool(field.is_sortable)
+
+    @property
+    def ref_target(self) -> Optional[str]:
+        if isinstance(self.options, dict):
+            return self.options.get("target")
+        return None
+
+class TenantMetadata:
+    """
+    Metadados de um tenant carregados de uma vez (2 queries):
+    entidades por slug/id e campos por entidade, já separados em snapshot e virtual.
+    """
+
+    def __init__(self, version: int, entities: List[models_meta.MetaEntity], fields: List[models_meta.MetaField], source_version: Any = None):
+        self.version = version
+        self.source_version = source_version
+        self.loaded_at = time.monotonic()
+
+        self._by_slug: Dict[str, EntityMeta] = {}
+        self._by_id: Dict[str, EntityMeta] = {}
+        self._by_display_name: Dict[str, EntityMeta] = {}
+        for e in entities:
+            meta = EntityMeta(e)
+            self._by_slug[meta.slug] = meta
+            self._by_id[str(meta.id)] = meta
+            self._by_display_name.setdefault(meta.display_name, meta)
+
+        self._fields: Dict[str, List[FieldMeta]] = {}
+        for f in fields:
+            self._fields.setdefault(str(f.entity_id), []).append(FieldMeta(f))
+
+        self._snapshot: Dict[str, List[FieldMeta]] = {}
+        self._virtual: Dict[str, List[FieldMeta]] = {}
+        self._by_name: Dict[str, Dict[str, FieldMeta]] = {}
+        for entity_id, entity_fields in self._fields.items():
+            self._snapshot[entity_id] = [f for f in entity_fields if f.formula is not None and f.is_virtual is False]
+            self._virtual[entity_id] = [f for f in entity_fields if f.formula is not None and f.is_virtual is True]
+            self._by_name[entity_id] = {f.name: f for f in entity_fields}
+
+    # --- Entidades ---
+
+    def entity_by_slug(self, slug: str) -> Optional[EntityMeta]:
+        return self._by_slug.get(slug)
+
+    def entity_by_id(self, entity_id) -> Optional[EntityMeta]:
+        return self._by_id.get(str(entity_id))
+
+    def entity_by_name(self, name: str) -> Optional[EntityMeta]:
+        """Resolve por slug OU display_name (usado por [Tabela].[Coluna])."""
+        return self._by_slug.get(name) or self._by_display_name.get(name)
+
+    # --- Campos ---
+
+    def fields(self, entity_id) -> List[FieldMeta]:
+        return self._fields.get(str(entity_id), [])
+
+    def field(self, entity_id, name: str) -> Optional[FieldMeta]:
+        return self._by_name.get(str(entity_id), {}).get(name)
+
+    def snapshot_fields(self, entity_id) -> List[FieldMeta]:
+        return self._snapshot.get(str(entity_id), [])
+
+    def virtual_fields(self, entity_id) -> List[FieldMeta]:
+        return self._virtual.get(str(entity_id), [])
+
+    def ref_target(self, entity_id, field_name: str) -> Optional[str]:
+        field = self.field(entity_id, field_name)
+        return field.ref_target if field else None
+
+class MetadataCache:
+    """
+    Cache de metadados por tenant, por processo.
+    - Versionado: invalidate() incrementa a versão do tenant e descarta o snapshot.
+      Um snapshot montado durante uma invalidação concorrente não é publicado.
+    - Invalidação entre workers:
+      * store compartilhado (tenant_cache no Redis): invalidate() grava um token novo em
+        metadata_version:<tenant>; get() confere o token (um GET no Redis), como o TriggerIndex.
+      * store local: a invalidação só alcança o processo que salvou. Os demais workers
+        servem entidades/campos antigos por até METADATA_CACHE_TTL segundos (o TTL é o
+        único limite). Em produção com vários workers, configure TENANT_CACHE_URL.
+    - TTL: recarga periódica de segurança.
+    """
+
+    VERSION_PREFIX = "metadata_version:"
+    VERSION_TTL = 86400 # Token expirado também força recarga (versão diferente)
+
+    def __init__(self, ttl_seconds: int = 60, store=None):
+        self.ttl_seconds = ttl_seconds
+        self.store = store if store is not None and getattr(store, "shared", False) else None
+        self._entries: Dict[str, TenantMetadata] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _shared_version(self, key: str) -> Optional[str]:
+        if self.store is None:
+            return None
+        try:
+            return self.store.get(self.VERSION_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"[MetadataCache] Shared version read failed ({key}): {e}")
+            return None
+
+    def get(self, db: Session, tenant_id) -> TenantMetadata:
+        key = str(tenant_id)
+        entry = self._entries.get(key)
+        source_version = self._shared_version(key)
+        if entry and entry.version == self._versions.get(key, 0) and \
+           entry.source_version == source_version and \
+           (time.monotonic() - entry.loaded_at) < self.ttl_seconds:
+            return entry
+
+        version = self._versions.get(key, 0)
+        entities = db.query(models_meta.MetaEntity).filter(
+            models_meta.MetaEntity.tenant_id == tenant_id
+        ).all()
+        fields = db.query(models_meta.MetaField).join(models_meta.MetaEntity).filter(
+            models_meta.MetaEntity.tenant_id == tenant_id
+        ).all()
+        entry = TenantMetadata(version, entities, fields, source_version)
+
+        with self._lock:
+            if self._versions.get(key, 0) == version:
+                self._entries[key] = entry
+        return entry
+
+    def version(self, tenant_id) -> int:
+        return self._versions.get(str(tenant_id), 0)
+
+    def invalidate(self, tenant_id=None):
+        """Descarta os metadados do tenant (ou de todos, se tenant_id for None)."""
+        with self._lock:
+            keys = [str(tenant_id)] if tenant_id is not None else list(set(self._versions) | set(self._entries))
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._entries.pop(key, None)
+        if self.store is not None:
+            for key in keys:
+                try:
+                    self.store.set(self.VERSION_PREFIX + key, uuid.uuid4().hex, self.VERSION_TTL)
+                except Exception as e:
+                    logger.warning(f"[MetadataCache] Shared version write failed ({key}): {e}")
+        logger.debug(f"[MetadataCache] Invalidated tenant(s): {keys}")
+
+metadata_cache = MetadataCache(ttl_seconds=settings.METADATA_CACHE_TTL, store=tenant_cache.store)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, JSON, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, Integer, Float, JSON, DateTime, ForeignKey, Index, Text, Boolean, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -13,7 +13,12 @@ class EntityRecord(Base):
     Physical tables can still be used for high-performance entities if needed.
     """
     __tablename__ = "entity_records"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        # Default keyset order of the list endpoint. Per-field indexes are managed by IndexManager.
+        Index("ix_entity_records_entity_created", "entity_id", "created_at", "id"),
+        Index("ix_entity_records_search", "search_vector", postgresql_using="gin"),
+        {"schema": "public"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     tenant_id = Column(UUID(as_uuid=True), ForeignKey("public.tenants.id", ondelete="CASCADE"), nullable=False)
@@ -23,9 +28,129 @@ class EntityRecord(Base):
     
     # The dynamic data payload
     data = Column(JSONB, default={})
+
+    # Global search (?q=): text of the text-typed fields + its tsvector (see search_service)
+    search_text = Column(Text, nullable=True)
+    search_vector = Column(TSVECTOR, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     entity_definition = relationship("app.engine.metadata.models.MetaEntity")
+
+
+class DataImport(Base):
+    """
+    Import job (CSV/XLSX -> entity_records). Progress and per-row errors are
+    updated while the file streams through the pipeline (see ImportService).
+    """
+    __tablename__ = "data_imports"
+    __table_args__ = {"schema": "public"}
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("public.tenants.id", ondelete="CASCADE"), nullable=False)
+    entity_id = Column(UUID(as_uuid=True), ForeignKey("public.meta_entities.id", ondelete="CASCADE"), nullable=False)
+
+    filename = Column(String, nullable=True)
+    mapping = Column(JSONB, default={}) # { "Coluna do Arquivo": "nome_campo" }
+    dry_run = Column(Boolean, default=False)
+
+    status = Column(String, default="pending") # pending, running, completed, failed
+    processed_rows = Column(Integer, default=0)
+    inserted_rows = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    errors = Column(JSONB, default=[]) # [{ "row": 12, "field": "preco", "error": "..." }] (capped)
+    message = Column(Text, nullable=True)
+
+    created_by = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class Job(Base):
+    """
+    Durable background job (workflow events, webhooks, trail runs). Workers claim
+    due rows with SELECT ... FOR UPDATE SKIP LOCKED (see job_queue); failures are
+    retried with exponential backoff until max_attempts, then parked as 'dead'.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Claim query: status = 'queued' AND run_at <= now() ORDER BY run_at
+        Index("ix_jobs_queued_run_at", "run_at", postgresql_where=text("status = 'queued'")),
+        Index("ix_jobs_tenant_status", "tenant_id", "status"),
+        # Coalescing (claim_group): jobs na fila com o mesmo kind + group_key
+        Index("ix_jobs_queued_group", "kind", "group_key", postgresql_where=text("status = 'queued'")),
+        {"schema": "public"},
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("public.tenants.id", ondelete="CASCADE"), nullable=True)
+
+    kind = Column(String, nullable=False) # workflow.event, workflow.webhook, trail.execute, ...
+    payload = Column(JSONB, default={})
+    group_key = Column(String, nullable=True) # Jobs do mesmo grupo podem ser processados juntos (ex.: webhook por destino)
+
+    status = Column(String, default="queued", nullable=False) # queued, running, done, dead
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    run_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = Column(DateTime, nullable=True)
+    locked_by = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class TrailRun(Base):
+    """
+    One trail execution (see trail_run_log). Rows are buffered in memory and
+    written in batches together with their steps, outside the trail's own
+    transaction, so failed runs are logged too.
+    """
+    __tablename__ = "trail_runs"
+    __table_args__ = (
+        Index("ix_trail_runs_tenant_trail_started", "tenant_id", "trail_id", "started_at"),
+        {"schema": "public"},
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("public.tenants.id", ondelete="CASCADE"), nullable=False)
+    trail_id = Column(UUID(as_uuid=True), ForeignKey("public.meta_trails.id", ondelete="CASCADE"), nullable=False)
+    trail_version = Column(DateTime, nullable=True) # MetaTrail.updated_at of the compiled plan that ran
+
+    trigger = Column(String, nullable=True) # workflow, manual, api, scheduler
+    status = Column(String, nullable=False) # success, failed (a node returned an error), error (run aborted)
+    error = Column(Text, nullable=True)
+    node_count = Column(Integer, default=0)
+
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Float, nullable=True)
+
+
+class TrailRunStep(Base):
+    """Per-node timing of a TrailRun. trail_id is denormalized for the slowest-nodes aggregate."""
+    __tablename__ = "trail_run_steps"
+    __table_args__ = (
+        Index("ix_trail_run_steps_run", "run_id"),
+        Index("ix_trail_run_steps_tenant_started", "tenant_id", "started_at"),
+        {"schema": "public"},
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    run_id = Column(UUID(as_uuid=True), ForeignKey("public.trail_runs.id", ondelete="CASCADE"), nullable=False)
+    tenant_id = Column(UUID(as_uuid=True), nullable=False)
+    trail_id = Column(UUID(as_uuid=True), nullable=False)
+
+    node_id = Column(String, nullable=False)
+    node_type = Column(String, nullable=True)
+    action_type = Column(String, nullable=True)
+    status = Column(String, nullable=False) # success, error
+    error = Column(Text, nullable=True)
+    config_size = Column(Integer, nullable=True) # Bytes of the resolved config (JSON)
+
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Float, nullable=False)
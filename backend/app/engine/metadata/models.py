@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, ForeignKey, Integer, JSON, DateTime
+from sqlalchemy import Column, String, Boolean, ForeignKey, Integer, JSON, DateTime, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -41,6 +41,10 @@ class MetaField(Base):
     # Formula Engine
     formula = Column(String, nullable=True) # Expressão: [Preco] * [Qtd]
     is_virtual = Column(Boolean, default=False) # Se True, não persiste (On-Read). Se False, persiste (Snapshot).
+
+    # Índices gerenciados em entity_records (ver IndexManager)
+    is_filterable = Column(Boolean, default=False, server_default="false")
+    is_sortable = Column(Boolean, default=False, server_default="false")
     
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -165,7 +169,11 @@ class MetaAction(Base):
 
 class MetaTrail(Base):
     __tablename__ = "meta_trails"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        # Agendador: trilhas SCHEDULER ativas por next_run_at (ver trail_scheduler)
+        Index("ix_meta_trails_next_run_at", "next_run_at", postgresql_where=text("trigger_type = 'SCHEDULER' AND is_active")),
+        {"schema": "public"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     tenant_id = Column(UUID(as_uuid=True), ForeignKey("public.tenants.id", ondelete="CASCADE"), nullable=False)
@@ -180,7 +188,8 @@ class MetaTrail(Base):
     
     # Quick Access Metadata
     trigger_type = Column(String, nullable=False) # 'MANUAL', 'DB_EVENT', 'WEBHOOK', 'SCHEDULE'
-    trigger_config = Column(JSON, default={}) # { "entity_id": "...", "event": "ON_CREATE" }
+    trigger_config = Column(JSON, default={}) # { "entity_id": "...", "event": "ON_CREATE" } | { "cron": "0 8 * * 1-5" } | { "interval": 60 }
+    next_run_at = Column(DateTime, nullable=True) # SCHEDULER: próxima execução (UTC)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
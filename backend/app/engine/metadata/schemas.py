@@ -11,6 +11,8 @@ class MetaFieldBase(BaseModel):
     options: Optional[Any] = None
     formula: Optional[str] = None
     is_virtual: bool = False
+    is_filterable: bool = False
+    is_sortable: bool = False
 
 class MetaFieldCreate(MetaFieldBase):
     pass
@@ -22,6 +24,8 @@ class MetaFieldUpdate(BaseModel):
     # Changing types is dangerous, but we might allow it later. For now, just label/name.
     formula: Optional[str] = None
     is_virtual: Optional[bool] = None
+    is_filterable: Optional[bool] = None
+    is_sortable: Optional[bool] = None
 
 class MetaFieldResponse(MetaFieldBase):
     id: UUID
@@ -216,6 +220,7 @@ class MetaTrailUpdate(BaseModel):
 class MetaTrailResponse(MetaTrailBase):
     id: UUID
     tenant_id: UUID
+    next_run_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
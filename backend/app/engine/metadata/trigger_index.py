@@ -0,0 +1,156 @@
+import time
+import uuid
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.tenant_cache import tenant_cache
+from app.engine.metadata import models as models_meta
+
+logger = logging.getLogger(__name__)
+
+# Eventos de registro disparados pelas rotas de dados
+RECORD_EVENTS = ("ON_CREATE", "ON_UPDATE", "ON_DELETE")
+
+class TriggerRoutes:
+    """Alvos de um evento: ids das trilhas DB_EVENT e dos workflows (webhooks) ativos."""
+
+    __slots__ = ("trail_ids", "workflow_ids")
+
+    def __init__(self, trail_ids: List[str] = None, workflow_ids: List[str] = None):
+        self.trail_ids = trail_ids or []
+        self.workflow_ids = workflow_ids or []
+
+    def __bool__(self):
+        return bool(self.trail_ids or self.workflow_ids)
+
+EMPTY_ROUTES = TriggerRoutes()
+
+class TenantTriggers:
+    """
+    Mapa (entity_id, evento) -> TriggerRoutes de um tenant, montado com 2 queries.
+    Trilhas com event 'ALL' entram nos três eventos.
+    """
+
+    def __init__(self, version: int, trails: List[models_meta.MetaTrail], workflows: List[models_meta.MetaWorkflow], source_version: Any = None):
+        self.version = version
+        self.source_version = source_version
+        self.loaded_at = time.monotonic()
+        self._routes: Dict[Tuple[str, str], TriggerRoutes] = {}
+
+        for t in trails:
+            cfg = t.trigger_config or {}
+            entity_id = cfg.get("entity_id")
+            if not entity_id:
+                continue
+            evt = cfg.get("event", "ALL")
+            for event in (RECORD_EVENTS if evt == "ALL" else (evt,)):
+                self._route(entity_id, event).trail_ids.append(str(t.id))
+
+        for wf in workflows:
+            self._route(wf.entity_id, wf.trigger_type).workflow_ids.append(str(wf.id))
+
+    def _route(self, entity_id, event: str) -> TriggerRoutes:
+        return self._routes.setdefault((str(entity_id), event), TriggerRoutes())
+
+    def routes(self, entity_id, event: str) -> TriggerRoutes:
+        return self._routes.get((str(entity_id), event), EMPTY_ROUTES)
+
+    def has_routes(self) -> bool:
+        return bool(self._routes)
+
+class TriggerIndex:
+    """
+    Índice de roteamento de gatilhos por tenant, por processo (mesmo esquema do MetadataCache):
+    - Versionado: invalidate() (builder ao salvar trilhas/workflows) descarta o mapa do tenant.
+    - Versão de origem, conferida a cada get() para que um índice vazio seja confiável
+      (evento sem alvo não é enfileirado) mesmo quando a trilha foi salva em outro processo:
+      * store compartilhado (tenant_cache no Redis): invalidate() grava um token novo em
+        trigger_version:<tenant>; get() lê o token (um GET no Redis).
+      * store local: impressão digital das tabelas no banco (contagem e max(updated_at) das
+        trilhas, contagem e max(created_at) dos workflows), uma query agregada sem carregar linhas.
+    - TTL: recarga periódica de segurança.
+    Entidades sem automação resolvem para EMPTY_ROUTES sem carregar trilhas/workflows.
+    """
+
+    VERSION_PREFIX = "trigger_version:"
+    VERSION_TTL = 86400 # Token expirado também força recarga (versão diferente)
+
+    def __init__(self, ttl_seconds: int = 30, store=None):
+        self.ttl_seconds = ttl_seconds
+        self.store = store if store is not None and getattr(store, "shared", False) else None
+        self._entries: Dict[str, TenantTriggers] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _shared_version(self, key: str) -> Optional[str]:
+        try:
+            return self.store.get(self.VERSION_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"[TriggerIndex] Shared version read failed ({key}): {e}")
+            return None
+
+    @staticmethod
+    def _db_version(db: Session, tenant_id) -> Tuple:
+        """
+        Impressão digital das trilhas/workflows do tenant. Salvar uma trilha muda updated_at;
+        criar/excluir muda a contagem (workflows só são criados ou excluídos).
+        """
+        Trail, Workflow, Entity = models_meta.MetaTrail, models_meta.MetaWorkflow, models_meta.MetaEntity
+        trails = select(func.count(Trail.id), func.max(Trail.updated_at)).where(Trail.tenant_id == tenant_id).subquery()
+        workflows = select(func.count(Workflow.id), func.max(Workflow.created_at)).join(Entity, Workflow.entity_id == Entity.id) \
+            .where(Entity.tenant_id == tenant_id).subquery()
+        return tuple(db.execute(select(trails, workflows)).one())
+
+    def _source_version(self, db: Session, tenant_id):
+        if self.store is not None:
+            return self._shared_version(str(tenant_id))
+        return self._db_version(db, tenant_id)
+
+    def get(self, db: Session, tenant_id, refresh: bool = False) -> TenantTriggers:
+        key = str(tenant_id)
+        entry = self._entries.get(key)
+        source_version = self._source_version(db, tenant_id)
+        if not refresh and entry and entry.version == self._versions.get(key, 0) and \
+           entry.source_version == source_version and \
+           (time.monotonic() - entry.loaded_at) < self.ttl_seconds:
+            return entry
+
+        version = self._versions.get(key, 0)
+        trails = db.query(models_meta.MetaTrail).filter(
+            models_meta.MetaTrail.tenant_id == tenant_id,
+            models_meta.MetaTrail.trigger_type == 'DB_EVENT',
+            models_meta.MetaTrail.is_active == True
+        ).all()
+        workflows = db.query(models_meta.MetaWorkflow).join(models_meta.MetaEntity).filter(
+            models_meta.MetaEntity.tenant_id == tenant_id,
+            models_meta.MetaWorkflow.is_active == True
+        ).all()
+        entry = TenantTriggers(version, trails, workflows, source_version)
+
+        with self._lock:
+            if self._versions.get(key, 0) == version:
+                self._entries[key] = entry
+        return entry
+
+    def routes(self, db: Session, tenant_id, entity_id, event: str, refresh: bool = False) -> TriggerRoutes:
+        return self.get(db, tenant_id, refresh=refresh).routes(entity_id, event)
+
+    def invalidate(self, tenant_id=None):
+        """Descarta o índice do tenant (ou de todos, se tenant_id for None)."""
+        with self._lock:
+            keys = [str(tenant_id)] if tenant_id is not None else list(set(self._versions) | set(self._entries))
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._entries.pop(key, None)
+        if self.store is not None:
+            for key in keys:
+                try:
+                    self.store.set(self.VERSION_PREFIX + key, uuid.uuid4().hex, self.VERSION_TTL)
+                except Exception as e:
+                    logger.warning(f"[TriggerIndex] Shared version write failed ({key}): {e}")
+        logger.debug(f"[TriggerIndex] Invalidated tenant(s): {keys}")
+
+trigger_index = TriggerIndex(ttl_seconds=settings.TRIGGER_INDEX_TTL, store=tenant_cache.store)
@@ -0,0 +1,115 @@
+import json
+import base64
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+from app.engine.formula_sql import text_column, numeric_column, UntranslatableFormula
+
+# Paginação keyset (cursor) sobre entity_records.
+# Ordem estável: (chave_de_ordenação, created_at, id). O cursor é opaco para o
+# cliente: base64 de [valor_da_chave, created_at, id] do último item da página.
+
+NUMERIC_FIELD_TYPES = {"number", "integer", "currency"}
+
+# Contagem exata é limitada: acima disso devolvemos o teto (kind=capped)
+COUNT_CAP = 10000
+
+class InvalidCursor(Exception):
+    pass
+
+# asyncpg exige o tipo Python do CAST do parâmetro (str em CAST(... AS timestamp) é rejeitado)
+PARAM_TYPES = {
+    "CAST({} AS timestamp)": datetime.fromisoformat,
+    "CAST({} AS uuid)": UUID,
+    "CAST({} AS numeric)": lambda v: Decimal(str(v)),
+    "CAST({} AS real)": float,
+    "{}": str,
+}
+
+class SortKey:
+    """
+    Expressão SQL de ordenação + cast do parâmetro do cursor.
+    expression=None significa ordenar só por (created_at, id).
+    """
+
+    def __init__(self, expression: Optional[str], param_cast: str = "{}", descending: bool = False):
+        self.expression = expression
+        self.param_cast = param_cast
+        self.descending = descending
+
+    @property
+    def direction(self) -> str:
+        return "DESC" if self.descending else "ASC"
+
+    def order_by(self) -> str:
+        cols = ["entity_records.created_at", "entity_records.id"]
+        if self.expression:
+            cols.insert(0, self.expression)
+        return ", ".join(f"{c} {self.direction}" for c in cols)
+
+    def bind(self, key: Any) -> Any:
+        """Converte a chave do cursor (JSON) para o tipo Python do param_cast."""
+        try:
+            return PARAM_TYPES.get(self.param_cast, lambda v: v)(key)
+        except Exception:
+            raise InvalidCursor("Invalid cursor")
+
+    def after(self, cursor: Tuple[Any, datetime, UUID]) -> Tuple[str, Dict[str, Any]]:
+        """Condição WHERE para 'depois do cursor' respeitando a direção e NULLs."""
+        key, created_at, record_id = cursor
+        op = "<" if self.descending else ">"
+        params = {"cursor_created_at": created_at, "cursor_id": record_id}
+        tie = f"((entity_records.created_at, entity_records.id) {op} (CAST(:cursor_created_at AS timestamp), CAST(:cursor_id AS uuid)))"
+        if not self.expression:
+            return tie, params
+
+        expr = self.expression
+        # Postgres: NULLs vêm por último em ASC e primeiro em DESC
+        if key is None:
+            if self.descending:
+                return f"(({expr} IS NULL AND {tie}) OR {expr} IS NOT NULL)", params
+            return f"({expr} IS NULL AND {tie})", params
+
+        params["cursor_key"] = self.bind(key)
+        bound = self.param_cast.format(":cursor_key")
+        cond = f"({expr} {op} {bound} OR ({expr} = {bound} AND {tie})"
+        if not self.descending:
+            cond += f" OR {expr} IS NULL"
+        return cond + ")", params
+
+def sort_key(sort_by: Optional[str], sort_dir: Optional[str], field_type: Optional[str] = None) -> SortKey:
+    """Mapeia sort_by/sort_dir da query string para uma SortKey."""
+    descending = (sort_dir or "asc").lower() == "desc"
+    if not sort_by or sort_by == "created_at":
+        return SortKey(None, descending=descending)
+    if sort_by == "updated_at":
+        return SortKey("entity_records.updated_at", "CAST({} AS timestamp)", descending)
+    if sort_by == "id":
+        return SortKey("entity_records.id", "CAST({} AS uuid)", descending)
+    try:
+        if field_type in NUMERIC_FIELD_TYPES:
+            return SortKey(numeric_column(sort_by), "CAST({} AS numeric)", descending)
+        return SortKey(text_column(sort_by), "{}", descending)
+    except UntranslatableFormula:
+        raise InvalidCursor(f"Invalid sort_by: {sort_by!r}")
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+def encode_cursor(key, created_at, record_id) -> str:
+    raw = json.dumps([_jsonable(key), _jsonable(created_at), str(record_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, datetime, UUID]:
+    """(chave, created_at, id) do cursor. A chave segue em JSON: SortKey.after converte."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, created_at, record_id = json.loads(raw)
+        return key, datetime.fromisoformat(created_at), UUID(record_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
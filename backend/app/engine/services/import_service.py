@@ -0,0 +1,299 @@
+import io
+import os
+import csv
+import json
+import math
+import uuid
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import text
+from app.shared import database
+from app.engine.metadata import data_models
+from app.engine.services.record_service import apply_snapshot_formulas_many
+from app.engine.services.search_service import search_fields, search_document, ts_config
+
+logger = logging.getLogger(__name__)
+
+# Pipeline de importação (CSV/XLSX -> entity_records), em streaming:
+#   leitura linha a linha -> mapeamento de colunas -> coerção de tipos + obrigatórios
+#   -> hooks -> fórmulas snapshot por bloco -> COPY para tabela temporária
+#   -> INSERT ... SELECT único em entity_records (uma transação).
+# Só um bloco (IMPORT_BATCH_SIZE linhas) fica em memória por vez.
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+TRUE_VALUES = {"true", "1", "sim", "s", "yes", "y", "x", "verdadeiro"}
+FALSE_VALUES = {"false", "0", "nao", "não", "n", "no", "falso"}
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S")
+
+class RowError(Exception):
+    def __init__(self, message: str, field: Optional[str] = None):
+        super().__init__(message)
+        self.field = field
+
+# --- Leitura ---
+
+def read_rows(path: str, filename: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    (número da linha no arquivo, {cabeçalho: valor}), sem carregar o arquivo inteiro.
+    Linhas vazias são puladas sem deslocar a numeração (o cabeçalho é a linha 1).
+    """
+    if filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+            for line_no, values in enumerate(rows, start=2):
+                if values is None or all(v is None or v == "" for v in values):
+                    continue
+                yield line_no, dict(zip(header, values))
+        finally:
+            wb.close()
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(f, dialect=dialect)
+        reader.fieldnames = [h.strip() for h in (reader.fieldnames or [])]
+        for row in reader:
+            if not any(v not in (None, "") for v in row.values()):
+                continue
+            # line_num: última linha física lida (campos com quebra de linha ocupam várias)
+            yield reader.line_num, row
+
+# --- Coerção ---
+
+def _parse_number(value) -> float:
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    number = value if isinstance(value, float) else float(_normalize_number(value))
+    # float() aceita "nan"/"inf"/"1e400": json.dumps gravaria NaN/Infinity e o jsonb recusaria o COPY inteiro
+    if not math.isfinite(number):
+        raise ValueError
+    return number
+
+def _normalize_number(value) -> str:
+    s = str(value).strip().replace("R$", "").replace(" ", "")
+    if "," in s and "." in s:
+        # 1.234,56 (pt-BR) ou 1,234.56
+        if s.rfind(",") > s.rfind("."):
+            s = s.replace(".", "").replace(",", ".")
+        else:
+            s = s.replace(",", "")
+    elif "," in s:
+        s = s.replace(",", ".")
+    return s
+
+def coerce_value(field, value):
+    """Converte o valor bruto conforme MetaField.field_type. Levanta RowError."""
+    ftype = field.field_type
+    try:
+        if ftype in ("number", "currency"):
+            return _parse_number(value)
+        if ftype == "integer":
+            number = _parse_number(value)
+            if int(number) != number:
+                raise ValueError
+            return int(number)
+        if ftype == "boolean":
+            if isinstance(value, bool):
+                return value
+            s = str(value).strip().lower()
+            if s in TRUE_VALUES:
+                return True
+            if s in FALSE_VALUES:
+                return False
+            raise ValueError
+        if ftype == "date":
+            if isinstance(value, datetime):
+                return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+            if isinstance(value, date):
+                return value.isoformat()
+            s = str(value).strip()
+            try:
+                return date.fromisoformat(s).isoformat()
+            except ValueError:
+                pass
+            for fmt in DATE_FORMATS:
+                try:
+                    parsed = datetime.strptime(s, fmt)
+                    return parsed.date().isoformat() if fmt == "%d/%m/%Y" else parsed.isoformat()
+                except ValueError:
+                    continue
+            raise ValueError
+        if ftype == "list_ref":
+            if isinstance(value, list):
+                return value
+            s = str(value).strip()
+            if s.startswith("["):
+                return json.loads(s)
+            return [p.strip() for p in s.replace(";", ",").split(",") if p.strip()]
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise RowError(f"Invalid value for {ftype}: {value!r}", field.name)
+
+    # Texto (text, long_text, select, email, ref, ...)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value).strip()
+
+# --- Pipeline ---
+
+class ImportService:
+    """
+    Args:
+        tenant_id / entity_id / entity_slug: destino.
+        fields: FieldMeta da entidade (metadata_cache).
+        mapping: {cabeçalho do arquivo: nome do campo}. Vazio = automático (nome ou label).
+        user_context: contexto de USER() nas fórmulas snapshot.
+        dry_run: só valida (nada é gravado).
+    """
+
+    def __init__(self, tenant_id, entity_id, entity_slug: str, fields, mapping: Optional[Dict[str, str]], user_context: Optional[Dict[str, Any]], dry_run: bool = False):
+        self.tenant_id = tenant_id
+        self.entity_id = entity_id
+        self.entity_slug = entity_slug
+        self.fields = {f.name: f for f in fields if not f.is_virtual and f.field_type != "section"}
+        self.mapping = mapping or {}
+        self.user_context = user_context
+        self.dry_run = dry_run
+        self.search_field_names = search_fields(fields)
+        self.required = [f for f in self.fields.values() if f.is_required and not f.formula]
+
+    def resolve_mapping(self, headers: List[str]) -> Dict[str, str]:
+        """{cabeçalho: campo}. Cabeçalhos sem campo correspondente são ignorados."""
+        if self.mapping:
+            return {h: f for h, f in self.mapping.items() if f in self.fields}
+        by_key = {}
+        for f in self.fields.values():
+            by_key.setdefault(f.name.casefold(), f.name)
+            by_key.setdefault((f.label or "").strip().casefold(), f.name)
+        return {h: by_key[h.strip().casefold()] for h in headers if h and h.strip().casefold() in by_key}
+
+    def prepare(self, raw: Dict[str, Any], columns: Dict[str, str]) -> Dict[str, Any]:
+        data = {}
+        for header, field_name in columns.items():
+            value = raw.get(header)
+            if value is None or (isinstance(value, str) and not value.strip()):
+                continue
+            data[field_name] = coerce_value(self.fields[field_name], value)
+        for f in self.required:
+            if data.get(f.name) in (None, ""):
+                raise RowError("Required field is missing.", f.name)
+        return data
+
+    def run(self, import_id, path: str, filename: str):
+        """Executa o import (BackgroundTasks). Sessões próprias: dados e progresso."""
+        from app.engine.api.hardcoded_hooks import run_create_hooks
+
+        db = database.SessionSys()
+        progress_db = database.SessionSys()
+        job = progress_db.query(data_models.DataImport).filter(data_models.DataImport.id == import_id).first()
+        errors: List[Dict[str, Any]] = []
+        error_count = 0
+        processed = 0
+        staged = 0
+
+        def report(line_no, message, field=None):
+            nonlocal error_count
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": line_no, "field": field, "error": message})
+
+        def save_progress(**extra):
+            job.processed_rows = processed
+            job.inserted_rows = staged
+            job.error_count = error_count
+            job.errors = list(errors)
+            for k, v in extra.items():
+                setattr(job, k, v)
+            progress_db.commit()
+
+        try:
+            save_progress(status="running")
+            if not self.dry_run:
+                db.execute(text("CREATE TEMP TABLE import_stage (id uuid, data jsonb, search_text text) ON COMMIT DROP"))
+
+            columns = None
+            batch: List[Dict[str, Any]] = []
+            for line_no, raw in read_rows(path, filename):
+                if columns is None:
+                    columns = self.resolve_mapping(list(raw.keys()))
+                    if not columns:
+                        raise RowError("No column of the file matches a field of this table.")
+                processed += 1
+                try:
+                    data = self.prepare(raw, columns)
+                    # Savepoint por linha: hook que falha no meio não deixa escritas parciais
+                    with db.begin_nested():
+                        run_create_hooks(self.entity_slug, data, db, self.tenant_id)
+                    batch.append(data)
+                except RowError as e:
+                    report(line_no, str(e), e.field)
+                except Exception as e:
+                    report(line_no, getattr(e, "detail", None) or str(e))
+
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    staged += self._stage(db, batch)
+                    batch = []
+                    save_progress()
+
+            if batch:
+                staged += self._stage(db, batch)
+
+            if not self.dry_run:
+                now = datetime.utcnow()
+                db.execute(text(f"""
+                    INSERT INTO entity_records (id, tenant_id, entity_id, data, search_text, search_vector, created_at, updated_at)
+                    SELECT id, :tenant_id, :entity_id, data, search_text,
+                           to_tsvector('{ts_config()}', coalesce(search_text, '')), :now, :now
+                    FROM import_stage
+                """), {"tenant_id": self.tenant_id, "entity_id": self.entity_id, "now": now})
+                db.commit()
+
+            save_progress(status="completed", finished_at=datetime.utcnow(),
+                          message="Validation only (dry run)." if self.dry_run else None)
+            logger.info(f"[Import] {import_id}: {staged} rows imported, {error_count} errors")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[Import] {import_id} failed: {e}")
+            staged = 0
+            save_progress(status="failed", finished_at=datetime.utcnow(), message=str(e))
+        finally:
+            db.close()
+            progress_db.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _stage(self, db, batch: List[Dict[str, Any]]) -> int:
+        """Fórmulas snapshot do bloco + COPY para a tabela temporária. Retorna linhas gravadas."""
+        final_rows = apply_snapshot_formulas_many(db, self.tenant_id, self.entity_id, batch, self.user_context)
+        if self.dry_run:
+            return len(final_rows)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for data in final_rows:
+            writer.writerow([str(uuid.uuid4()), json.dumps(data, default=str), search_document(self.search_field_names, data)])
+        buffer.seek(0)
+
+        raw_conn = db.connection().connection
+        cursor = raw_conn.cursor()
+        try:
+            cursor.copy_expert("COPY import_stage (id, data, search_text) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+        return len(final_rows)
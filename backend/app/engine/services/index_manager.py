@@ -0,0 +1,133 @@
+import logging
+from typing import Dict, List
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.shared.database import engine
+from app.engine.formula_sql import text_column, sql_json_key
+from app.engine.pagination import sort_key
+
+logger = logging.getLogger(__name__)
+
+# Índices gerenciados em public.entity_records, derivados dos metadados do campo.
+# Todos são parciais (WHERE entity_id = '<uuid>') e nomeados pelo id do campo:
+#   ix_er_f_<field>  btree ((data->>'campo'))                  -> filtrável / ref
+#   ix_er_s_<field>  btree (<expr. de ordenação>, created_at, id) -> ordenável (keyset)
+#   ix_er_g_<field>  gin ((data->'campo') jsonb_path_ops)     -> list_ref (contém)
+
+MANAGED_PREFIXES = ("ix_er_f_", "ix_er_s_", "ix_er_g_")
+INDEX_KINDS = {"ix_er_f_": "filter", "ix_er_s_": "sort", "ix_er_g_": "contains"}
+
+class IndexManager:
+    @staticmethod
+    def index_names(field_id) -> List[str]:
+        hex_id = str(field_id).replace("-", "")
+        return [f"{prefix}{hex_id}" for prefix in MANAGED_PREFIXES]
+
+    @classmethod
+    def desired_indexes(cls, field) -> Dict[str, str]:
+        """Nome -> DDL (CREATE INDEX CONCURRENTLY) que o campo deveria ter."""
+        if field.is_virtual:
+            return {}
+
+        f_name, s_name, g_name = cls.index_names(field.id)
+        where = f"WHERE entity_id = '{field.entity_id}'"
+        table = "public.entity_records"
+
+        indexes = {}
+        if field.field_type == "list_ref":
+            indexes[g_name] = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {g_name} ON {table} USING gin ((data->{sql_json_key(field.name)}) jsonb_path_ops) {where}"
+        elif field.is_filterable or field.ref_target:
+            indexes[f_name] = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {f_name} ON {table} ({text_column(field.name)}) {where}"
+        if field.is_sortable:
+            expr = sort_key(field.name, "asc", field.field_type).expression
+            indexes[s_name] = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {s_name} ON {table} ({expr}, created_at, id) {where}"
+        return indexes
+
+    @classmethod
+    def _existing(cls, conn, names: List[str]) -> Dict[str, bool]:
+        """Nome -> válido? (um CREATE CONCURRENTLY que falhou deixa o índice inválido)"""
+        rows = conn.execute(text("""
+            SELECT c.relname, i.indisvalid
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relname = ANY(:names)
+        """), {"names": names}).fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    @classmethod
+    def sync_field(cls, field, rebuild: bool = False):
+        """
+        Cria/remove os índices do campo conforme os metadados.
+        rebuild=True recria tudo (ex: campo renomeado, a expressão mudou).
+        Roda fora de transação (CONCURRENTLY): chamar via BackgroundTasks.
+        """
+        names = cls.index_names(field.id)
+        desired = cls.desired_indexes(field)
+        try:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                existing = cls._existing(conn, names)
+                for name in names:
+                    if name in existing and (rebuild or name not in desired or not existing[name]):
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS public.{name}"))
+                        existing.pop(name)
+                for name, ddl in desired.items():
+                    if name not in existing:
+                        conn.execute(text(ddl))
+                        logger.info(f"[IndexManager] Created {name} for field '{field.name}'")
+        except Exception as e:
+            logger.error(f"[IndexManager] Sync failed for field '{field.name}': {e}")
+
+    @classmethod
+    def drop_fields(cls, field_ids: List):
+        names = [name for field_id in field_ids for name in cls.index_names(field_id)]
+        if not names:
+            return
+        try:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                for name in cls._existing(conn, names):
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS public.{name}"))
+        except Exception as e:
+            logger.error(f"[IndexManager] Drop failed: {e}")
+
+    @classmethod
+    def usage(cls, db: Session, fields) -> List[Dict]:
+        """Uso (pg_stat_user_indexes) dos índices gerenciados dos campos de uma entidade."""
+        expected = {}
+        for field in fields:
+            for name in cls.desired_indexes(field):
+                expected[name] = field.name
+        all_names = {name: field.name for field in fields for name in cls.index_names(field.id)}
+        if not all_names:
+            return []
+
+        rows = db.execute(text("""
+            SELECT s.indexrelname, s.idx_scan, s.idx_tup_read, s.idx_tup_fetch,
+                   pg_relation_size(s.indexrelid) AS size_bytes, i.indisvalid
+            FROM pg_stat_user_indexes s JOIN pg_index i ON i.indexrelid = s.indexrelid
+            WHERE s.schemaname = 'public' AND s.relname = 'entity_records'
+              AND s.indexrelname = ANY(:names)
+        """), {"names": list(all_names)}).fetchall()
+
+        report = []
+        found = set()
+        for r in rows:
+            found.add(r.indexrelname)
+            report.append({
+                "index": r.indexrelname,
+                "field": all_names[r.indexrelname],
+                "kind": INDEX_KINDS[r.indexrelname[:8]],
+                "status": "valid" if r.indisvalid else "invalid",
+                "managed": r.indexrelname in expected,
+                "scans": r.idx_scan,
+                "tuples_read": r.idx_tup_read,
+                "tuples_fetched": r.idx_tup_fetch,
+                "size_bytes": r.size_bytes,
+            })
+        for name, field_name in expected.items():
+            if name not in found:
+                report.append({
+                    "index": name, "field": field_name, "kind": INDEX_KINDS[name[:8]],
+                    "status": "missing", "managed": True,
+                    "scans": 0, "tuples_read": 0, "tuples_fetched": 0, "size_bytes": 0,
+                })
+        return report
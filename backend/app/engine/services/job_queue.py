@@ -0,0 +1,298 @@
+import os
+import random
+import signal
+import socket
+import asyncio
+import inspect
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.shared.database import SessionSys
+from app.engine.metadata import data_models
+
+logger = logging.getLogger(__name__)
+
+# Fila de jobs durável em public.jobs (Postgres, sem broker externo).
+#   enqueue()  -> grava o job na MESMA transação da escrita que o originou
+#   JobWorker  -> processo separado (`python -m app.worker`): reivindica jobs
+#                 vencidos com FOR UPDATE SKIP LOCKED, executa o handler do `kind`
+#                 e marca done; falha -> novo run_at com backoff exponencial;
+#                 esgotou max_attempts -> 'dead' (reprocessável via API).
+#                 JobFailed -> 'dead' direto: falha do próprio job, repetir não adianta.
+# Jobs em execução têm locked_at renovado a cada JOB_HEARTBEAT_INTERVAL pelo worker que os
+# detém; 'running' sem heartbeat há mais de JOB_LOCK_TIMEOUT (worker morreu) volta para a
+# fila, ou vai para 'dead' se já esgotou max_attempts.
+# Tarefas periódicas (@periodic_task) rodam em todo worker: devem ser seguras com réplicas
+# (ex.: trail_scheduler reivindica linhas com SKIP LOCKED).
+
+JOB_HANDLERS: Dict[str, Callable] = {}
+
+class JobFailed(Exception):
+    """Falha definitiva levantada pelo handler: o job vai para 'dead' sem novas tentativas."""
+PERIODIC_TASKS: List[Tuple[Callable, float]] = []
+
+def job_handler(kind: str):
+    """Registra o handler de um tipo de job. Handler: fn(payload) -> Any (sync ou async)."""
+    def decorator(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+def periodic_task(interval_seconds: float):
+    """Registra uma tarefa periódica do worker. Tarefa: fn(db) com sessão própria a cada execução."""
+    def decorator(fn):
+        PERIODIC_TASKS.append((fn, interval_seconds))
+        return fn
+    return decorator
+
+def enqueue(db: Session, kind: str, payload: Dict[str, Any], tenant_id=None, delay_seconds: float = 0, max_attempts: Optional[int] = None, group_key: Optional[str] = None) -> data_models.Job:
+    """Adiciona o job à sessão. Não faz commit: entra junto com a transação do chamador."""
+    job = data_models.Job(
+        tenant_id=tenant_id,
+        kind=kind,
+        payload=payload,
+        group_key=group_key,
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=datetime.utcnow() + timedelta(seconds=delay_seconds),
+    )
+    db.add(job)
+    return job
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def backoff_seconds(attempts: int) -> float:
+    """10s, 20s, 40s... (JOB_RETRY_BASE_SECONDS * 2^n, limitado), com jitter de até 10%."""
+    delay = min(settings.JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), settings.JOB_RETRY_MAX_SECONDS)
+    return delay * (1 + random.random() * 0.1)
+
+class JobQueue:
+    @staticmethod
+    def claim(db: Session, worker_id: str, limit: int = 1) -> List[Any]:
+        """Reivindica até `limit` jobs vencidos (outros workers pulam as linhas travadas)."""
+        rows = db.execute(text("""
+            UPDATE public.jobs j
+            SET status = 'running', locked_at = :now, locked_by = :worker, attempts = j.attempts + 1
+            FROM (
+                SELECT id FROM public.jobs
+                WHERE status = 'queued' AND run_at <= :now
+                ORDER BY run_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            ) due
+            WHERE j.id = due.id
+            RETURNING j.id, j.kind, j.payload, j.attempts, j.max_attempts, j.tenant_id
+        """), {"now": datetime.utcnow(), "worker": worker_id, "limit": limit}).fetchall()
+        db.commit()
+        return rows
+
+    @staticmethod
+    def claim_group(db: Session, kind: str, group_key: str, worker_id: str, limit: int) -> List[Any]:
+        """
+        Reivindica jobs do mesmo grupo para o handler processar junto com o atual.
+        Jobs novos entram mesmo antes do run_at (janela de agrupamento); retentativas só quando vencidas.
+        """
+        rows = db.execute(text("""
+            UPDATE public.jobs j
+            SET status = 'running', locked_at = :now, locked_by = :worker, attempts = j.attempts + 1
+            FROM (
+                SELECT id FROM public.jobs
+                WHERE status = 'queued' AND kind = :kind AND group_key = :group_key
+                  AND (attempts = 0 OR run_at <= :now)
+                ORDER BY created_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            ) grp
+            WHERE j.id = grp.id
+            RETURNING j.id, j.kind, j.payload, j.attempts, j.max_attempts, j.tenant_id
+        """), {"now": datetime.utcnow(), "worker": worker_id, "kind": kind, "group_key": group_key, "limit": limit}).fetchall()
+        db.commit()
+        return rows
+
+    @staticmethod
+    def complete(db: Session, job_id):
+        db.execute(text("""
+            UPDATE public.jobs SET status = 'done', finished_at = :now, locked_at = NULL, last_error = NULL
+            WHERE id = :id
+        """), {"id": job_id, "now": datetime.utcnow()})
+        db.commit()
+
+    @staticmethod
+    def fail(db: Session, job_id, attempts: int, max_attempts: int, error: str) -> str:
+        """Reagenda com backoff ou manda para 'dead'. Retorna o novo status."""
+        now = datetime.utcnow()
+        if attempts >= max_attempts:
+            status, run_at, finished_at = "dead", now, now
+        else:
+            status, run_at, finished_at = "queued", now + timedelta(seconds=backoff_seconds(attempts)), None
+        db.execute(text("""
+            UPDATE public.jobs
+            SET status = :status, run_at = :run_at, finished_at = :finished_at,
+                locked_at = NULL, locked_by = NULL, last_error = :error
+            WHERE id = :id
+        """), {"id": job_id, "status": status, "run_at": run_at, "finished_at": finished_at, "error": error[:4000]})
+        db.commit()
+        return status
+
+    @staticmethod
+    def heartbeat(db: Session, worker_ids: List[str]) -> int:
+        """Renova locked_at dos jobs 'running' destes workers (não são tratados como presos)."""
+        result = db.execute(text("""
+            UPDATE public.jobs SET locked_at = :now
+            WHERE status = 'running' AND locked_by = ANY(:workers)
+        """), {"now": datetime.utcnow(), "workers": list(worker_ids)})
+        db.commit()
+        return result.rowcount
+
+    @staticmethod
+    def requeue_stale(db: Session) -> Tuple[int, int]:
+        """
+        Jobs presos em 'running' (worker caiu no meio) voltam para a fila; os que já
+        esgotaram max_attempts vão para 'dead'. Retorna (reenfileirados, mortos).
+        """
+        now = datetime.utcnow()
+        rows = db.execute(text("""
+            UPDATE public.jobs
+            SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN CAST(:now AS timestamp) END,
+                locked_at = NULL, locked_by = NULL,
+                last_error = coalesce(last_error, 'Worker lost while running')
+            WHERE status = 'running' AND locked_at < :cutoff
+            RETURNING status
+        """), {"now": now, "cutoff": now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)}).fetchall()
+        db.commit()
+        dead = sum(1 for row in rows if row.status == "dead")
+        return len(rows) - dead, dead
+
+    @staticmethod
+    def retry(db: Session, job_id, tenant_id=None) -> bool:
+        """Devolve um job 'dead' para a fila (tentativas zeradas)."""
+        query = "UPDATE public.jobs SET status = 'queued', attempts = 0, run_at = :now, finished_at = NULL WHERE id = :id AND status = 'dead'"
+        params = {"id": job_id, "now": datetime.utcnow()}
+        if tenant_id is not None:
+            query += " AND tenant_id = :tenant_id"
+            params["tenant_id"] = tenant_id
+        result = db.execute(text(query), params)
+        db.commit()
+        return result.rowcount > 0
+
+class JobWorker:
+    """
+    Consome a fila com `concurrency` slots. Acesso ao banco roda em threads
+    (sessões síncronas); handlers async rodam no loop, síncronos em thread.
+    """
+
+    MAINTENANCE_INTERVAL = 60
+
+    def __init__(self, concurrency: Optional[int] = None, poll_interval: Optional[float] = None, worker_id: Optional[str] = None):
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+        self.worker_id = worker_id or default_worker_id()
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    @staticmethod
+    def _with_session(fn, *args):
+        db = SessionSys()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    async def _execute(self, job) -> Any:
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job.kind}'")
+        if inspect.iscoroutinefunction(handler):
+            return await handler(job.payload or {})
+        return await asyncio.to_thread(handler, job.payload or {})
+
+    async def _slot(self):
+        while not self._stopping.is_set():
+            try:
+                jobs = await asyncio.to_thread(self._with_session, JobQueue.claim, self.worker_id, 1)
+            except Exception as e:
+                logger.error(f"[JobWorker] Claim failed: {e}")
+                jobs = []
+
+            if not jobs:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job = jobs[0]
+            try:
+                await self._execute(job)
+                await asyncio.to_thread(self._with_session, JobQueue.complete, job.id)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                attempts = job.max_attempts if isinstance(e, JobFailed) else job.attempts
+                status = await asyncio.to_thread(self._with_session, JobQueue.fail, job.id, attempts, job.max_attempts, error)
+                log = logger.error if status == "dead" else logger.warning
+                log(f"[JobWorker] {job.kind} {job.id} failed (attempt {job.attempts}/{job.max_attempts}, now {status}): {error}")
+
+    async def _maintenance(self):
+        while not self._stopping.is_set():
+            try:
+                requeued, dead = await asyncio.to_thread(self._with_session, JobQueue.requeue_stale)
+                if requeued:
+                    logger.warning(f"[JobWorker] Requeued {requeued} stale job(s)")
+                if dead:
+                    logger.error(f"[JobWorker] {dead} stale job(s) exhausted max_attempts, now dead")
+            except Exception as e:
+                logger.error(f"[JobWorker] Maintenance failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.MAINTENANCE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _heartbeat(self):
+        # Roda até os slots terminarem (cancelada em run): cobre jobs que seguem após stop()
+        # Jobs reivindicados pelos handlers (claim_group) usam default_worker_id()
+        worker_ids = sorted({self.worker_id, default_worker_id()})
+        while True:
+            try:
+                await asyncio.to_thread(self._with_session, JobQueue.heartbeat, worker_ids)
+            except Exception as e:
+                logger.error(f"[JobWorker] Heartbeat failed: {e}")
+            await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+
+    async def _periodic(self, fn, interval: float):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(self._with_session, fn)
+            except Exception as e:
+                logger.error(f"[JobWorker] Periodic task {fn.__name__} failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except NotImplementedError:
+                pass
+        logger.info(f"[JobWorker] {self.worker_id} started ({self.concurrency} slots, kinds: {', '.join(sorted(JOB_HANDLERS))})")
+        # Jobs em andamento terminam antes de sair (stop só impede novos claims)
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await asyncio.gather(
+                self._maintenance(),
+                *[self._periodic(fn, interval) for fn, interval in PERIODIC_TASKS],
+                *[self._slot() for _ in range(self.concurrency)]
+            )
+        finally:
+            heartbeat.cancel()
+        logger.info(f"[JobWorker] {self.worker_id} stopped")
@@ -0,0 +1,169 @@
+import json
+import uuid
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.engine.metadata.cache import metadata_cache
+from app.engine.services.search_service import search_document, ts_config
+
+logger = logging.getLogger(__name__)
+
+# Escrita em lote em entity_records: um statement por bloco (jsonb_to_recordset),
+# com fallback linha a linha (savepoint) para isolar erros por registro.
+
+BULK_CHUNK_SIZE = 1000
+
+def _dumps(rows: List[Dict[str, Any]]) -> str:
+    return json.dumps(rows, default=str)
+
+def apply_snapshot_formulas_many(db: Session, tenant_id: str, entity_id: str, records: List[Dict[str, Any]], user_context: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Snapshot formulas (non-virtual fields) for many records at once: one engine
+    for all rows and references ([Ref].[Col], LOOKUP) prefetched for the batch.
+    """
+    from app.engine.formulas import FormulaEngine
+
+    snapshot_fields = metadata_cache.get(db, tenant_id).snapshot_fields(entity_id)
+    if not snapshot_fields or not records:
+        return records
+
+    engine = FormulaEngine(db, str(tenant_id))
+    results = []
+    with engine.batch([f.formula for f in snapshot_fields], records, current_entity_id=str(entity_id)):
+        for record_data in records:
+            updated_data = record_data.copy()
+            for field in snapshot_fields:
+                try:
+                    updated_data[field.name] = engine.evaluate(field.formula, updated_data, user_context, current_entity_id=str(entity_id))
+                except Exception:
+                    updated_data[field.name] = None
+            results.append(updated_data)
+    return results
+
+def load_user_context(db: Session, tenant_id, user_id) -> Optional[Dict[str, Any]]:
+    """Dados do usuário para fórmulas (USERNAME(), USEREMAIL(), cargo...). None sem usuário."""
+    from app.system import models as models_system
+    if not user_id: return None
+
+    user_context = {}
+    try:
+        user = db.query(models_system.GlobalUser).filter(models_system.GlobalUser.id == user_id).first()
+        if user:
+            user_context['id'] = str(user.id)
+            user_context['name'] = user.full_name
+            user_context['username'] = user.username
+            user_context['email'] = user.username
+
+            membership = db.query(models_system.Membership).filter(
+                models_system.Membership.user_id == user.id,
+                models_system.Membership.tenant_id == tenant_id
+            ).first()
+            if membership:
+                user_context['cargo'] = membership.cargo.name if membership.cargo else membership.role
+    except Exception:
+        pass
+    return user_context
+
+class RecordService:
+    @staticmethod
+    def _chunks(items: List, size: int = BULK_CHUNK_SIZE):
+        for start in range(0, len(items), size):
+            yield items[start:start + size]
+
+    @classmethod
+    def _run_chunked(cls, db: Session, sql: str, rows: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[int, str]:
+        """
+        Executa `sql` (que lê :rows via jsonb_to_recordset) por blocos.
+        Se um bloco falhar, refaz linha a linha para apontar o registro culpado.
+        Retorna {posição_em_rows: erro}.
+        """
+        errors: Dict[int, str] = {}
+        offset = 0
+        for chunk in cls._chunks(rows):
+            try:
+                with db.begin_nested():
+                    db.execute(text(sql), {**params, "rows": _dumps(chunk)})
+            except Exception:
+                for i, row in enumerate(chunk):
+                    try:
+                        with db.begin_nested():
+                            db.execute(text(sql), {**params, "rows": _dumps([row])})
+                    except Exception as e:
+                        errors[offset + i] = str(getattr(e, "orig", e)).strip()
+            offset += len(chunk)
+        return errors
+
+    @classmethod
+    def bulk_insert(cls, db: Session, tenant_id, entity_id, records: List[Dict[str, Any]], search_field_names: List[str]) -> Tuple[List[Optional[str]], Dict[int, str]]:
+        """
+        Insere vários registros. Retorna (ids por posição — None se falhou, {posição: erro}).
+        Não faz commit.
+        """
+        now = datetime.utcnow()
+        rows = [{
+            "id": str(uuid.uuid4()),
+            "data": data,
+            "search_text": search_document(search_field_names, data),
+        } for data in records]
+
+        sql = f"""
+            INSERT INTO entity_records (id, tenant_id, entity_id, data, search_text, search_vector, created_at, updated_at)
+            SELECT v.id, :tenant_id, :entity_id, v.data, v.search_text,
+                   to_tsvector('{ts_config()}', coalesce(v.search_text, '')), :now, :now
+            FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS v(id uuid, data jsonb, search_text text)
+        """
+        errors = cls._run_chunked(db, sql, rows, {"tenant_id": tenant_id, "entity_id": entity_id, "now": now})
+        ids = [None if i in errors else row["id"] for i, row in enumerate(rows)]
+        return ids, errors
+
+    @classmethod
+    def bulk_update(cls, db: Session, entity_id, updates: List[Tuple[str, Dict[str, Any]]], search_field_names: List[str]) -> Dict[int, str]:
+        """
+        Substitui `data` de vários registros ([(id, data_final)]). Retorna {posição: erro}.
+        Não faz commit.
+        """
+        rows = [{
+            "id": str(record_id),
+            "data": data,
+            "search_text": search_document(search_field_names, data),
+        } for record_id, data in updates]
+
+        sql = f"""
+            UPDATE entity_records r
+            SET data = v.data,
+                search_text = v.search_text,
+                search_vector = to_tsvector('{ts_config()}', coalesce(v.search_text, '')),
+                updated_at = :now
+            FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS v(id uuid, data jsonb, search_text text)
+            WHERE r.id = v.id AND r.entity_id = :entity_id
+        """
+        return cls._run_chunked(db, sql, rows, {"entity_id": entity_id, "now": datetime.utcnow()})
+
+    @classmethod
+    def bulk_delete(cls, db: Session, tenant_id, entity_id, record_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Remove vários registros. Retorna {id: data} dos que existiam. Não faz commit."""
+        deleted: Dict[str, Dict[str, Any]] = {}
+        for chunk in cls._chunks(record_ids):
+            result = db.execute(text("""
+                DELETE FROM entity_records
+                WHERE tenant_id = :tenant_id AND entity_id = :entity_id AND id = ANY(CAST(:ids AS uuid[]))
+                RETURNING id, data
+            """), {"tenant_id": tenant_id, "entity_id": entity_id, "ids": chunk})
+            for r in result.fetchall():
+                deleted[str(r.id)] = r.data or {}
+        return deleted
+
+    @classmethod
+    def fetch_many(cls, db: Session, tenant_id, entity_id, record_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """{id: data} dos registros existentes (uma query por bloco)."""
+        found: Dict[str, Dict[str, Any]] = {}
+        for chunk in cls._chunks(record_ids):
+            rows = db.execute(text("""
+                SELECT id, data FROM entity_records
+                WHERE tenant_id = :tenant_id AND entity_id = :entity_id AND id = ANY(CAST(:ids AS uuid[]))
+            """), {"tenant_id": tenant_id, "entity_id": entity_id, "ids": chunk}).fetchall()
+            for r in rows:
+                found[str(r.id)] = r.data or {}
+        return found
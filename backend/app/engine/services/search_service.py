@@ -0,0 +1,109 @@
+import re
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.engine.formula_sql import sql_json_key
+
+logger = logging.getLogger(__name__)
+
+# Busca global (?q=) sobre entity_records.
+# Cada registro guarda search_text (valores dos campos de texto) e search_vector
+# (tsvector desse texto). O q vira um tsquery de prefixos ("mar silv" ->
+# 'mar':* & 'silv':*), servido pelo índice GIN de search_vector.
+# Com SEARCH_TRIGRAM=1 (extensão pg_trgm), também casa substrings via ILIKE.
+
+SEARCH_FIELD_TYPES = {"text", "long_text", "select", "email", "phone", "whatsapp"}
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def ts_config() -> str:
+    # Inline (literal) para casar com o índice e não depender de bind param
+    if not re.match(r"^[a-z_]+$", settings.SEARCH_TS_CONFIG):
+        raise ValueError(f"Invalid SEARCH_TS_CONFIG: {settings.SEARCH_TS_CONFIG!r}")
+    return settings.SEARCH_TS_CONFIG
+
+def search_fields(fields) -> List[str]:
+    """Nomes dos campos persistidos de tipo texto (ordem estável)."""
+    return [f.name for f in fields if f.field_type in SEARCH_FIELD_TYPES and not f.is_virtual]
+
+def search_document(field_names: Iterable[str], data: Dict[str, Any]) -> str:
+    """Texto indexado do registro. Mesmo resultado que document_sql() no banco."""
+    parts = []
+    for name in field_names:
+        val = (data or {}).get(name)
+        if val is None or isinstance(val, (dict, list)):
+            continue
+        if isinstance(val, bool):
+            val = "true" if val else "false"
+        parts.append(str(val))
+    return " ".join(parts)
+
+def document_sql(field_names: List[str]) -> str:
+    """Equivalente SQL de search_document() sobre a coluna data."""
+    if not field_names:
+        return "''"
+    cols = []
+    for name in field_names:
+        key = sql_json_key(name)
+        cols.append(f"(CASE WHEN jsonb_typeof(data->{key}) IN ('object', 'array') THEN NULL ELSE data->>{key} END)")
+    return f"concat_ws(' ', {', '.join(cols)})"
+
+def apply_search(record, field_names: List[str]):
+    """Atualiza as colunas de busca do registro (ORM) a partir de record.data."""
+    doc = search_document(field_names, record.data)
+    record.search_text = doc
+    record.search_vector = func.to_tsvector(ts_config(), doc)
+
+def tsquery_text(q: str) -> Optional[str]:
+    """'mar silv' -> 'mar:* & silv:*' (tokens \\w+, seguros para to_tsquery)."""
+    tokens = _TOKEN_PATTERN.findall(q or "")
+    if not tokens:
+        return None
+    return " & ".join(f"{t.lower()}:*" for t in tokens)
+
+def search_condition(q: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(WHERE, params) para ?q=, ou None se não houver termos."""
+    tsq = tsquery_text(q)
+    if not tsq:
+        return None
+    cond = f"entity_records.search_vector @@ to_tsquery('{ts_config()}', :search_tsq)"
+    params = {"search_tsq": tsq}
+    if settings.SEARCH_TRIGRAM:
+        cond = f"({cond} OR entity_records.search_text ILIKE :search_like)"
+        params["search_like"] = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return cond, params
+
+def rank_expression(q: str) -> Optional[str]:
+    """ts_rank do registro para ?q= (tsquery inline: também entra no SELECT/ORDER BY)."""
+    tsq = tsquery_text(q)
+    if not tsq:
+        return None
+    literal = "'" + tsq.replace("'", "''") + "'"
+    return f"ts_rank(entity_records.search_vector, to_tsquery('{ts_config()}', {literal}))"
+
+def reindex_entity(db: Session, entity_id, field_names: List[str]) -> int:
+    """Recalcula search_text/search_vector de todos os registros da entidade (no banco)."""
+    doc = document_sql(field_names)
+    result = db.execute(text(f"""
+        UPDATE entity_records
+        SET search_text = {doc},
+            search_vector = to_tsvector('{ts_config()}', {doc})
+        WHERE entity_id = :entity_id
+    """), {"entity_id": entity_id})
+    db.commit()
+    return result.rowcount
+
+def reindex_entity_task(entity_id, field_names: List[str]):
+    """reindex_entity() com sessão própria (para BackgroundTasks)."""
+    from app.shared.database import SessionSys
+    db = SessionSys()
+    try:
+        count = reindex_entity(db, entity_id, field_names)
+        logger.info(f"[Search] Reindexed {count} records of entity {entity_id}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[Search] Reindex failed for entity {entity_id}: {e}")
+    finally:
+        db.close()
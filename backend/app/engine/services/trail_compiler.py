@@ -0,0 +1,283 @@
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.engine.formulas import CompiledFormula, compile_formula
+from app.engine.metadata.models import MetaTrail
+from app.engine.automation.registry import get_action, missing_params, uses_db
+
+logger = logging.getLogger(__name__)
+
+# Compilador de trilhas: MetaTrail.nodes -> TrailPlan validado, em cache por (trail_id, updated_at).
+# Toda a análise do grafo (nó inicial, arestas, ciclos) e a detecção/compilação das fórmulas
+# da config acontecem uma vez por versão da trilha; a execução só percorre o plano.
+# Aceita os dois formatos de nó: builder ({type, action_type, config, next_node_id}) e o
+# formato linear de /automation/run ({type, action, params, next | outputs.next}).
+
+TEMPLATE_PATTERN = re.compile(r"\{\{(.+?)\}\}")
+
+class TrailCompileError(Exception):
+    pass
+
+def is_template(value: Any) -> bool:
+    if isinstance(value, str):
+        return '{{' in value
+    if isinstance(value, list):
+        return any(is_template(v) or isinstance(v, dict) for v in value)
+    return False
+
+def interpolate(value: Any, context: Dict[str, Any]) -> Any:
+    """Substitui {{ caminho.com.pontos }} pelo valor no contexto; placeholders sem valor ficam como estão."""
+    if isinstance(value, str):
+        def replace_match(match):
+            key = match.group(1).strip()
+            val = context
+            try:
+                for k in key.split('.'):
+                    val = val[k]
+                return str(val)
+            except (KeyError, TypeError):
+                return f"{{{{{key}}}}}"
+        return TEMPLATE_PATTERN.sub(replace_match, value)
+    if isinstance(value, dict):
+        return {k: interpolate(v, context) for k, v in value.items()}
+    if isinstance(value, list):
+        return [interpolate(v, context) for v in value]
+    return value
+
+def is_formula(value: str) -> bool:
+    # Mesma regra do executor: "=expr" ou qualquer texto com referência [Coluna]
+    stripped = value.strip()
+    return stripped.startswith('=') or '[' in value
+
+class CompiledConfig:
+    """
+    Config de um nó com os slots de fórmula já compilados.
+    Valores fixos são resolvidos na compilação; na execução só fórmulas e templates {{ }} são avaliados.
+    """
+
+    __slots__ = ("static", "formulas", "templates", "nested")
+
+    def __init__(self, config: Dict[str, Any], errors: List[str], path: str):
+        self.static: Dict[str, Any] = {}
+        self.formulas: Dict[str, CompiledFormula] = {}
+        self.templates: Dict[str, Any] = {}
+        self.nested: Dict[str, "CompiledConfig"] = {}
+        for k, v in (config or {}).items():
+            if isinstance(v, dict):
+                self.nested[k] = CompiledConfig(v, errors, f"{path}.{k}")
+            elif is_template(v):
+                # Antes da regra de fórmula: "{{ Payload.id }}" não é expressão
+                self.templates[k] = v
+            elif isinstance(v, str) and is_formula(v):
+                expr = v.strip()[1:] if v.strip().startswith('=') else v
+                compiled = compile_formula(expr)
+                if compiled.code is None:
+                    errors.append(f"{path}.{k}: {compiled.error}")
+                self.formulas[k] = compiled
+            else:
+                self.static[k] = v
+
+    def has_formulas(self) -> bool:
+        return bool(self.formulas) or any(n.has_formulas() for n in self.nested.values())
+
+    def resolve(self, evaluate: Callable[[CompiledFormula], Any], context: Dict[str, Any]) -> Dict[str, Any]:
+        resolved = dict(self.static)
+        for k, compiled in self.formulas.items():
+            resolved[k] = evaluate(compiled)
+        for k, template in self.templates.items():
+            resolved[k] = interpolate(template, context)
+        for k, nested in self.nested.items():
+            resolved[k] = nested.resolve(evaluate, context)
+        return resolved
+
+class PlanStep:
+    """
+    Nó compilado. PARALLEL: `branches` são os nós iniciais de cada ramo, executados em
+    paralelo; cada ramo termina ao chegar no `next_node_id` do PARALLEL (join) ou no fim.
+    """
+
+    __slots__ = ("node_id", "node", "type", "action_type", "config", "next_node_id", "next_true", "next_false", "branches", "concurrent")
+
+    def __init__(self, node_id: str, node: Dict[str, Any], errors: List[str]):
+        self.node_id = node_id
+        self.node = node
+        self.type = node.get('type')
+        self.action_type = node.get('action_type') or node.get('action')
+        config = node.get('config') or node.get('params') or {}
+        self.config = CompiledConfig(config, errors, node_id)
+        self.next_node_id = next_target(node)
+        self.next_true = node.get('next_true')
+        self.next_false = node.get('next_false')
+        self.branches = [b for b in (node.get('branches') or []) if b]
+        self.concurrent = False # PARALLEL: ramos podem rodar em threads (definido em compile_trail)
+        if self.type == 'PARALLEL' and not self.branches:
+            errors.append(f"{node_id}: PARALLEL node without branches")
+        if self.type == 'ACTION':
+            if not get_action(self.action_type):
+                errors.append(f"{node_id}: unknown action type '{self.action_type}'")
+            else:
+                missing = missing_params(self.action_type, config.keys())
+                if missing:
+                    errors.append(f"{node_id}: {self.action_type} missing required params {missing}")
+
+    def next(self, result: Any) -> Optional[str]:
+        if self.type == 'DECISION':
+            return self.next_true if result is True else self.next_false
+        return self.next_node_id
+
+    def edges(self) -> List[str]:
+        return self.branches + [t for t in (self.next_node_id, self.next_true, self.next_false) if t]
+
+    @property
+    def db_free(self) -> bool:
+        """Nó que não usa a sessão: ação uses_db=False sem fórmulas na config (templates {{ }} leem só o contexto)."""
+        return self.type == 'ACTION' and not uses_db(self.action_type) and not self.config.has_formulas()
+
+class TrailPlan:
+    def __init__(self, trail_id: str, version, name: str, start: Optional[str], steps: Dict[str, PlanStep],
+                 local_variables: List[str], errors: List[str], max_concurrency: int):
+        self.trail_id = trail_id
+        self.version = version
+        self.name = name
+        self.start = start
+        self.steps = steps
+        self.local_variables = local_variables
+        self.errors = errors
+        self.max_concurrency = max_concurrency # Ramos simultâneos por nó PARALLEL
+
+def next_target(node: Dict[str, Any]) -> Optional[str]:
+    return node.get('next_node_id') or node.get('next') or (node.get('outputs') or {}).get('next')
+
+def find_start_node(nodes: Dict[str, Any]) -> Optional[str]:
+    # First check if there is a 'ROOT' node (frontend uses this convention sometimes)
+    if 'ROOT' in nodes: return 'ROOT'
+
+    # Explicit trigger/start node
+    for nid, node in nodes.items():
+        if (node or {}).get('type') in ('TRIGGER', 'START'):
+            return nid
+
+    # Node that is not a target of any other
+    all_targets = {t for n in nodes.values() for t in (next_target(n), n.get('next_true'), n.get('next_false')) if t}
+    all_targets.update(b for n in nodes.values() for b in (n.get('branches') or []))
+    for nid in nodes.keys():
+        if nid not in all_targets:
+            return nid
+    return None
+
+def _find_cycle(start: str, steps: Dict[str, PlanStep]) -> Optional[List[str]]:
+    """Ciclo alcançável a partir do nó inicial (DFS iterativo), ou None."""
+    visiting, done = set(), set()
+    stack: List[Tuple[str, int]] = [(start, 0)]
+    path: List[str] = []
+    while stack:
+        node_id, edge_index = stack.pop()
+        if edge_index == 0:
+            visiting.add(node_id)
+            path.append(node_id)
+        edges = [t for t in steps[node_id].edges() if t in steps]
+        if edge_index < len(edges):
+            stack.append((node_id, edge_index + 1))
+            target = edges[edge_index]
+            if target in visiting:
+                return path[path.index(target):] + [target]
+            if target not in done:
+                stack.append((target, 0))
+        else:
+            visiting.discard(node_id)
+            done.add(node_id)
+            path.pop()
+    return None
+
+def _branch_nodes(branch_id: str, stop_at: Optional[str], steps: Dict[str, PlanStep]) -> List[str]:
+    """Nós alcançáveis a partir do início de um ramo até o join (exclusive)."""
+    seen, stack = [], [branch_id]
+    while stack:
+        node_id = stack.pop()
+        if node_id == stop_at or node_id in seen or node_id not in steps:
+            continue
+        seen.append(node_id)
+        stack.extend(steps[node_id].edges())
+    return seen
+
+def compile_trail(trail: MetaTrail) -> TrailPlan:
+    """Valida e compila a trilha. Levanta TrailCompileError para grafos que não podem rodar (ciclo)."""
+    nodes = trail.nodes or {}
+    errors: List[str] = []
+    steps = {node_id: PlanStep(node_id, node or {}, errors) for node_id, node in nodes.items()}
+
+    for step in steps.values():
+        for target in step.edges():
+            if target not in steps:
+                errors.append(f"{step.node_id}: edge to missing node '{target}'")
+
+    start = find_start_node(nodes)
+    if start:
+        cycle = _find_cycle(start, steps)
+        if cycle:
+            raise TrailCompileError(f"Trail {trail.id} has a cycle: {' -> '.join(cycle)}")
+
+    # Ramos em threads só quando nenhum nó usa a sessão: a trilha continua uma transação única
+    for step in steps.values():
+        if step.type == 'PARALLEL':
+            step.concurrent = all(
+                steps[nid].db_free
+                for branch_id in step.branches
+                for nid in _branch_nodes(branch_id, step.next_node_id, steps)
+            )
+
+    local_variables = [v['name'] for v in (getattr(trail, 'local_variables', None) or []) if v.get('name')]
+    # Limite por trilha: trigger_config.max_concurrency (padrão TRAIL_MAX_PARALLEL)
+    try:
+        max_concurrency = max(1, int((trail.trigger_config or {}).get('max_concurrency') or settings.TRAIL_MAX_PARALLEL))
+    except (TypeError, ValueError):
+        errors.append(f"invalid max_concurrency: {(trail.trigger_config or {}).get('max_concurrency')!r}")
+        max_concurrency = settings.TRAIL_MAX_PARALLEL
+    plan = TrailPlan(str(trail.id), trail.updated_at, trail.name, start, steps, local_variables, errors, max_concurrency)
+    if errors:
+        logger.warning(f"[TrailCompiler] Trail {trail.name} ({trail.id}) compiled with warnings: {errors}")
+    return plan
+
+class TrailPlanCache:
+    """
+    Planos compilados por (trail_id, updated_at), LRU por processo.
+    Salvar a trilha muda updated_at: a versão nova é compilada na próxima execução.
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._plans: "OrderedDict[Tuple[str, Any], TrailPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, trail_id: str, tenant_id) -> Optional[TrailPlan]:
+        """Plano da trilha ativa, ou None se não existir/inativa. Levanta TrailCompileError."""
+        # Só a versão (sem carregar o JSON dos nós) para checar o cache
+        row = db.query(MetaTrail.id, MetaTrail.is_active, MetaTrail.updated_at).filter(
+            MetaTrail.id == trail_id,
+            MetaTrail.tenant_id == tenant_id,
+        ).first()
+        if not row or not row.is_active:
+            return None
+
+        key = (str(row.id), row.updated_at)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+
+        trail = db.query(MetaTrail).filter(MetaTrail.id == row.id).first()
+        if not trail:
+            return None
+        plan = compile_trail(trail)
+        with self._lock:
+            self._plans[(str(trail.id), trail.updated_at)] = plan
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        return plan
+
+trail_plan_cache = TrailPlanCache(max_size=settings.TRAIL_PLAN_CACHE_SIZE)
@@ -1,39 +1,60 @@
 
+import time
 import logging
-from typing import Dict, Any, Optional
-import httpx
-from uuid import uuid4
+from datetime import datetime
+from functools import cached_property
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.engine.metadata.models import MetaTrail, MetaEntity, MetaField
 from app.engine.formulas import FormulaEngine
+from app.engine.automation.registry import get_action
+from app.engine.services.record_service import load_user_context
+from app.engine.services.trail_compiler import trail_plan_cache, TrailCompileError, TrailPlan, PlanStep
+from app.engine.services.trail_run_log import trail_run_log, TrailRunTrace
 
 logger = logging.getLogger(__name__)
 
+class TrailNodeError(Exception):
+    """Exceção em um nó: a execução para e a transação da trilha é desfeita."""
+
+    def __init__(self, node_id: str, error: Exception):
+        super().__init__(f"Node {node_id} failed: {type(error).__name__}: {error}")
+        self.node_id = node_id
+        self.error = error
+
 class TrailExecutor:
     def __init__(self, db: Session, tenant_id: str, user_id: Optional[str] = None):
         self.db = db
         self.tenant_id = tenant_id
         self.user_id = user_id
         self.formula_engine = FormulaEngine(db, tenant_id)
+        self.executed: List[str] = [] # Nós executados na última execute_trail (ordem de execução)
+        self.trace: Optional[TrailRunTrace] = None # Log da execução atual (trail_run_log)
+
+    @cached_property
+    def user_context(self) -> Optional[Dict[str, Any]]:
+        # Fórmulas snapshot das ações de banco (uma consulta por execução)
+        return load_user_context(self.db, self.tenant_id, self.user_id)
 
-    def execute_trail(self, trail_id: str, trigger_context: Dict[str, Any]):
+    def execute_trail(self, trail_id: str, trigger_context: Dict[str, Any], trigger: Optional[str] = None):
         """
         Executa uma trilha completa a partir de um contexto inicial.
         Args:
             trail_id: UUID da trilha.
             trigger_context: Dados iniciais (Payload). Ex: { "entity_id": "...", "data": {...} }
+            trigger: Origem da execução no log (workflow, manual, api, scheduler).
         """
-        trail = self.db.query(MetaTrail).filter(
-            MetaTrail.id == trail_id,
-            MetaTrail.tenant_id == self.tenant_id,
-        ).first()
+        try:
+            plan = trail_plan_cache.get(self.db, trail_id, self.tenant_id)
+        except TrailCompileError as e:
+            logger.error(f"Trail {trail_id} cannot run: {e}")
+            return
 
-        if not trail or not trail.is_active:
+        if not plan:
             logger.warning(f"Trail {trail_id} not found or inactive.")
             return
 
-        logger.info(f"Starting Trail Execution: {trail.name} ({trail.id})")
+        logger.info(f"Starting Trail Execution: {plan.name} ({plan.trail_id})")
         
         # Contexto de Execução (acumula resultados dos nós)
         # [Payload] é o gatilho inicial.
@@ -44,351 +65,131 @@ class TrailExecutor:
         }
         
         # Initialize Local Variables with defaults
-        if trail.local_variables:
-            for var in trail.local_variables:
-                 # Default to empty string or 0 based on type? 
-                 # For now just empty string or null
-                 execution_context[var['name']] = None
+        for name in plan.local_variables:
+            execution_context[name] = None
+
+        # Uma transação por execução: as ações não fazem commit (savepoint por nó de banco).
+        # Exceção em um nó (TrailNodeError) desfaz tudo; resultado {"error"} de ação não interrompe.
+        self.trace = trail_run_log.start(plan, self.tenant_id, trigger)
+        error = None
+        try:
+            self.executed = self._run_chain(plan, plan.start, execution_context)
+            self.db.commit()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            self.db.rollback()
+            raise
+        finally:
+            trail_run_log.record(self.trace, error=error)
+
+        logger.info(f"Trail Execution {plan.trail_id} finished.")
+        return execution_context
 
-        nodes = trail.nodes or {}
-        start_node = self._find_start_node(nodes)
-        
-        current_node_id = start_node
+    def _run_chain(self, plan: TrailPlan, node_id: Optional[str], context: Dict[str, Any], stop_at: Optional[str] = None) -> List[str]:
+        """Percorre o plano a partir de `node_id` até o fim (ou `stop_at`, o join de um ramo). Retorna os nós executados."""
+        def evaluate(compiled):
+            return self.formula_engine.evaluate_compiled(compiled, context)
+
+        visited = []
         client_instruction = None 
         
-        while current_node_id:
-            node = nodes.get(current_node_id)
-            if not node:
+        while node_id and node_id != stop_at:
+            step = plan.steps.get(node_id)
+            if not step:
                 break
             
-            logger.debug(f"Processing Node: {current_node_id} ({node.get('type')})")
+            logger.debug(f"Processing Node: {node_id} ({step.type})")
+            started_at, t0 = datetime.utcnow(), time.perf_counter()
+            resolved_config = None
             
             try:
-                # 1. Resolver Config
-                resolved_config = self._resolve_config(node.get('config', {}), execution_context)
+                # 1. Resolver Config (fórmulas pré-compiladas no plano)
+                resolved_config = step.config.resolve(evaluate, context)
                 
                 # 2. Executar Lógica
-                result = self._execute_node_logic(node, resolved_config, execution_context)
+                if step.type == 'PARALLEL':
+                    result = self._run_parallel(plan, step, resolved_config, context)
+                else:
+                    result = self._execute_node_logic(step, resolved_config, context)
                 
                 # 3. Store Result
-                execution_context[current_node_id] = result
+                context[node_id] = result
+                visited.append(node_id)
+                if self.trace:
+                    self.trace.add_step(step, started_at, time.perf_counter() - t0, resolved_config, result)
                 
                 # Check for Client Instructions (like Navigation)
                 if isinstance(result, dict) and result.get('__client_instruction'):
                     client_instruction = result['__client_instruction']
                 
                 # 4. Next Node
-                current_node_id = self._determine_next_node(node, result)
+                node_id = step.next(result)
                 
             except Exception as e:
-                logger.error(f"Error executing node {current_node_id}: {e}")
-                break
+                logger.error(f"Error executing node {node_id}: {e}")
+                if self.trace:
+                    self.trace.add_step(step, started_at, time.perf_counter() - t0, resolved_config, error=f"{type(e).__name__}: {e}")
+                if isinstance(e, TrailNodeError):
+                    raise # Nó de um ramo PARALLEL: mantém o nó de origem
+                raise TrailNodeError(node_id, e) from e
 
-        logger.info(f"Trail Execution {trail.id} finished.")
-        return execution_context
+        return visited
 
-    def _find_start_node(self, nodes: Dict) -> Optional[str]:
-        # First check if there is a 'ROOT' node (frontend uses this convention sometimes)
-        if 'ROOT' in nodes: return 'ROOT'
-        
-        # Scan for node that is not a target of any other
-        all_targets = set()
-        for n in nodes.values():
-            if n.get('next_node_id'): all_targets.add(n.get('next_node_id'))
-            if n.get('next_true'): all_targets.add(n.get('next_true'))
-            if n.get('next_false'): all_targets.add(n.get('next_false'))
-        
-        for nid in nodes.keys():
-            if nid not in all_targets:
-                return nid
-        return None
-
-    def _resolve_config(self, config: Dict, context: Dict) -> Dict:
-        resolved = {}
-        for k, v in config.items():
-            if isinstance(v, dict):
-                resolved[k] = self._resolve_config(v, context)
-            elif isinstance(v, str) and (v.strip().startswith('=') or '[' in v):
-                expr = v.strip()[1:] if v.strip().startswith('=') else v
-                resolved[k] = self.formula_engine.evaluate(expr, context)
-            else:
-                resolved[k] = v
-        return resolved
-
-    def _execute_node_logic(self, node: Dict, config: Dict, context: Dict) -> Any:
-        node_type = node.get('type')
-        action_type = node.get('action_type')
-
-        if node_type == 'TRIGGER':
+    def _run_parallel(self, plan: TrailPlan, step: PlanStep, config: Dict, context: Dict) -> Dict[str, Any]:
+        """
+        Fan-out: cada ramo roda sobre uma cópia do contexto. No join, os resultados entram no
+        contexto na ordem declarada dos ramos (determinístico, independente de qual terminou primeiro).
+        Threads só para ramos sem acesso ao banco (step.concurrent: HTTP, arquivos); ramos com
+        ações de banco ou fórmulas rodam em sequência na sessão da execução (transação única).
+        Resultado {"error"} em algum nó dos ramos marca o PARALLEL como falho.
+        """
+        limit = plan.max_concurrency
+        if config.get('max_concurrency'):
+            limit = min(limit, max(1, int(config['max_concurrency'])))
+
+        def run_branch(branch_id: str) -> Dict[str, Any]:
+            branch_context = dict(context)
+            visited = self._run_chain(plan, branch_id, branch_context, stop_at=step.next_node_id)
+            return {nid: branch_context[nid] for nid in visited}
+
+        if limit == 1 or len(step.branches) == 1 or not step.concurrent:
+            results = [run_branch(b) for b in step.branches]
+        else:
+            # Exceção em um ramo sobe no join (pool.map) e falha o nó PARALLEL
+            with ThreadPoolExecutor(max_workers=min(limit, len(step.branches)), thread_name_prefix="trail-branch") as pool:
+                results = list(pool.map(run_branch, step.branches))
+
+        branches = {}
+        errors = {}
+        for branch_id, branch_results in zip(step.branches, results):
+            context.update(branch_results)
+            branches[branch_id] = branch_results
+            errors.update({nid: r["error"] for nid, r in branch_results.items() if isinstance(r, dict) and r.get("error")})
+
+        if errors:
+            failed = ", ".join(f"{nid}: {error}" for nid, error in errors.items())
+            return {"status": "failed", "error": f"{len(errors)} branch node(s) failed ({failed})", "branches": branches}
+        return {"status": "success", "branches": branches}
+
+    def _execute_node_logic(self, step: PlanStep, config: Dict, context: Dict) -> Any:
+        node_type = step.type
+
+        if node_type in ('TRIGGER', 'START'):
             return context.get('Payload')
 
         elif node_type == 'DECISION':
             # Config 'expression' needs to be boolean
             expr = config.get('expression')
-            # If it was already resolved by _resolve_config, it might be the value.
+            # If it was already resolved by the plan's config slots, it might be the value.
             # But normally formula_engine returns the value. 
-            # If 'expression' key exists in config, _resolve_config evaluated it.
+            # If 'expression' key exists in config, the plan evaluated it.
             return bool(expr)
 
         elif node_type == 'ACTION':
-            return self._run_action(action_type, config, context)
+            # Handlers em app/engine/automation/registry.py
+            handler = get_action(step.action_type)
+            if not handler:
+                return {"status": "unknown_action", "error": f"Unknown action type: {step.action_type}"}
+            return handler(self, config, context)
             
         return None
-
-    def _run_action(self, action_type: str, config: Dict, context: Dict):
-        if action_type == 'DB_CREATE':
-            # config: { table_id: UUID, mapped_values: { col: val } }
-            table_id = config.get('table_id')
-            values = config.get('mapped_values', {})
-            
-            if not table_id: return {"error": "No table_id"}
-            
-            # Find Table Name
-            entity = self.db.query(MetaEntity).filter(MetaEntity.id == table_id).first()
-            if not entity: return {"error": "Entity not found"}
-            
-            # Construir Insert SQL
-            cols = ', '.join(values.keys())
-            # Safe parameter interpolation needed ideally, but values are from trusted formulas?
-            # Creating a params dict for execute
-            params = {}
-            placeholders = []
-            for k, v in values.items():
-                placeholders.append(f":{k}")
-                params[k] = v
-            
-            sql = f"INSERT INTO {entity.slug} ({cols}) VALUES ({', '.join(placeholders)}) RETURNING id"
-            
-            try:
-                res = self.db.execute(text(sql), params)
-                self.db.commit()
-                new_id = res.fetchone()[0]
-                return {"id": str(new_id), "status": "success"}
-            except Exception as e:
-                self.db.rollback()
-                logger.error(f"DB_CREATE Error: {e}")
-                return {"error": str(e)}
-
-        elif action_type == 'DB_UPDATE':
-            # config: { table_id: UUID, record_id: UUID, mapped_values: {} }
-            table_id = config.get('table_id')
-            record_id = config.get('record_id')
-            values = config.get('mapped_values', {})
-            
-            if not table_id or not record_id: return {"error": "Missing ID"}
-            
-            entity = self.db.query(MetaEntity).filter(MetaEntity.id == table_id).first()
-            if not entity: return {"error": "Entity not found"}
-            
-            set_clauses = []
-            params = {"record_id": record_id}
-            for k, v in values.items():
-                set_clauses.append(f"{k} = :{k}")
-                params[k] = v
-                
-            sql = f"UPDATE {entity.slug} SET {', '.join(set_clauses)} WHERE id = :record_id"
-            try:
-                self.db.execute(text(sql), params)
-                self.db.commit()
-                return {"status": "success"}
-            except Exception as e:
-                self.db.rollback()
-                return {"error": str(e)}
-
-        elif action_type == 'DB_DELETE':
-             table_id = config.get('table_id')
-             record_id = config.get('record_id')
-             if not table_id or not record_id: return {"error": "Missing ID"}
-             
-             entity = self.db.query(MetaEntity).filter(MetaEntity.id == table_id).first()
-             sql = f"DELETE FROM {entity.slug} WHERE id = :record_id"
-             try:
-                self.db.execute(text(sql), {"record_id": record_id})
-                self.db.commit()
-                return {"status": "success"}
-             except Exception as e:
-                 return {"error": str(e)}
-
-        elif action_type == 'NAVIGATE':
-            # config: { page_id: UUID, record_id: UUID/Formula }
-            return {
-                "__client_instruction": {
-                    "type": "NAVIGATE",
-                    "page_id": config.get('page_id'),
-                    "record_id": config.get('record_id')
-                },
-                "status": "instruction_sent"
-            }
-
-        elif action_type == 'DB_FETCH_FIELD':
-            # config: { table_id: UUID, record_id: UUID, field_name: str }
-            table_id = config.get('table_id')
-            record_id = config.get('record_id')
-            field_name = config.get('field_name')
-            
-            if not table_id or not record_id or not field_name: 
-                return {"error": "Missing params for Fetch Field"}
-            
-            entity = self.db.query(MetaEntity).filter(MetaEntity.id == table_id).first()
-            if not entity: return {"error": "Entity not found"}
-            
-            # Raw SQL for speed and flexibility
-            sql = text(f"SELECT data ->> :field FROM {entity.slug} WHERE id = :record_id")
-            result = self.db.execute(sql, {"field": field_name, "record_id": record_id}).fetchone()
-            
-            val = result[0] if result else None
-            return {"value": val, "status": "success"}
-
-        elif action_type == 'MATH_OP':
-             # config: { expression: "10 * 2" }
-             # logic: Evaluate expression with context
-             expr = config.get('expression')
-             if not expr: return {"error": "No expression"}
-             
-             try:
-                 # Add context variables to formula evaluation scope if needed
-                 # Current FormulaEngine handles basic math and context
-                 val = self.formula_engine.evaluate(expr, context)
-                 return {"result": val, "status": "success"}
-             except Exception as e:
-                 return {"error": f"Math Error: {e}"}
-
-        elif action_type == 'GENERATE_CSV':
-            # config: { table_id: UUID, filter: str }
-            import csv
-            import os
-            from datetime import datetime
-            
-            table_id = config.get('table_id')
-            if not table_id: return {"error": "Table ID required"}
-            
-            entity = self.db.query(MetaEntity).filter(MetaEntity.id == table_id).first()
-            if not entity: return {"error": "Entity not found"}
-            
-            # Fetch Data (Simple Select All for now, can add filtering later)
-            sql = text(f"SELECT data FROM {entity.slug}") # TODO: Apply filters
-            rows = self.db.execute(sql).fetchall()
-            
-            # Determine Headers (from MetaField)
-            fields = self.db.query(MetaField).filter(MetaField.entity_id == entity.id).all()
-            headers = [f.name for f in fields]
-            
-            # Generate File
-            filename = f"export_{entity.slug}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-            filepath = os.path.join("uploads", filename)
-            
-            # Ensure upload dir exists (in container mapped volume)
-            os.makedirs("uploads", exist_ok=True)
-            
-            with open(filepath, 'w', newline='') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=headers)
-                writer.writeheader()
-                for row in rows:
-                    # row[0] is the data json
-                    data = row[0]
-                    # Filter keys to only those in headers (schema match)
-                    row_data = {k: data.get(k, '') for k in headers}
-                    writer.writerow(row_data)
-            
-            return {"url": f"/uploads/{filename}", "status": "success"}
-
-        elif action_type == 'GENERATE_PDF':
-            # config: { page_id: UUID, record_id: UUID } (Simulate Page View)
-            # OR simple data dump template
-            import os
-            from xhtml2pdf import pisa
-            from datetime import datetime
-            
-            # Mock content for MVP - In real app, render a Jinja2 template
-            content = f"""
-            <html>
-            <body>
-            <h1>Relatório de Execução</h1>
-            <p>Gerado em: {datetime.now()}</p>
-            <hr/>
-            <h3>Dados do Contexto</h3>
-            <pre>{context}</pre>
-            </body>
-            </html>
-            """
-            
-            filename = f"report_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-            filepath = os.path.join("uploads", filename)
-            os.makedirs("uploads", exist_ok=True)
-            
-            try:
-                with open(filepath, "w+b") as result_file:
-                    pisa_status = pisa.CreatePDF(content, dest=result_file)
-                
-                if pisa_status.err:
-                    return {"error": "PDF Generation Error"}
-                
-                return {"url": f"/uploads/{filename}", "status": "success"}
-            except Exception as e:
-                return {"error": f"PDF Error: {e}"}
-
-        elif action_type == 'SEND_NOTIFICATION':
-             # config: { message: str, recipient: str (username or formula) }
-             message = config.get('message')
-             recipient_input = config.get('recipient')
-             
-             if not message or not recipient_input: return {"error": "Missing msg/recipient"}
-             
-             # Resolve Recipient(s)
-             from app.system.models import GlobalUser
-             
-             # Check if it's a formula result array or string
-             recipients = []
-             
-             # Case 1: "pbrandon" (Username)
-             if isinstance(recipient_input, str) and not recipient_input.startswith('['):
-                 user = self.db.query(GlobalUser).filter(GlobalUser.username == recipient_input).first()
-                 if user: recipients.append(user.id)
-             
-             # Case 2: List of IDs [uuid, uuid] (from formula)
-             elif isinstance(recipient_input, list):
-                 recipients = recipient_input
-             
-             # Dispatch
-             count = 0
-             for uid in recipients:
-                 # Create Notification (Using shared service or direct DB)
-                 # Keep it simple: Direct DB
-                 # TODO: Import Notification Model
-                 # For now, just Log
-                 logger.info(f"NOTIFICATION to {uid}: {message}")
-                 count += 1
-             
-             return {"status": "success", "count": count}
-
-        elif action_type == 'WEBHOOK_OUT':
-            # config: { url: str, method: str, headers: dict, body: dict }
-            url = config.get('url')
-            method = config.get('method', 'POST')
-            headers = config.get('headers', {})
-            body = config.get('body', {})
-            
-            try:
-                with httpx.Client() as client:
-                    resp = client.request(method, url, headers=headers, json=body, timeout=10.0)
-                    return {"status": resp.status_code, "response": resp.text}
-            except Exception as e:
-                return {"error": str(e)}
-        
-        elif action_type == 'CREATE_TASK':
-             # config: { assignee_id: UUID, title: str, description: str }
-             # Stub for now
-             return {"status": "mock_task_created", "config": config}
-
-        return {"status": "unknown_action"}
-
-    def _determine_next_node(self, node: Dict, result: Any) -> Optional[str]:
-        node_type = node.get('type')
-        
-        if node_type == 'DECISION':
-            if result is True:
-                return node.get('next_true')
-            else:
-                return node.get('next_false')
-                
-        return node.get('next_node_id')
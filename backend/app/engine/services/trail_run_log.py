@@ -0,0 +1,158 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.shared import database
+from app.engine.metadata.data_models import TrailRun, TrailRunStep
+from app.engine.services.job_queue import periodic_task
+
+logger = logging.getLogger(__name__)
+
+# Log de execuções de trilhas (trail_runs + trail_run_steps).
+#   O TrailExecutor abre um TrailRunTrace por execução e registra cada nó (início, duração,
+#   tamanho da config resolvida, status/erro). Ao terminar, a run entra no buffer do processo.
+#   O buffer é gravado em lote (um INSERT multi-linha por tabela) ao atingir
+#   TRAIL_RUN_LOG_BATCH_SIZE nós ou TRAIL_RUN_LOG_FLUSH_SECONDS, com sessão própria:
+#   o log não participa da transação da trilha (runs com rollback também ficam registradas).
+#   No worker, uma tarefa periódica esvazia o buffer e aplica a retenção; na API, o shutdown esvazia.
+
+class TrailRunTrace:
+    """Execução em andamento. Ramos PARALLEL (threads) registram nós na mesma trace."""
+
+    def __init__(self, plan, tenant_id, trigger: Optional[str]):
+        self.run_id = uuid.uuid4()
+        self.tenant_id = tenant_id
+        self.trail_id = plan.trail_id
+        self.trail_version = plan.version
+        self.trigger = trigger
+        self.started_at = datetime.utcnow()
+        self._t0 = time.perf_counter()
+        self.steps: List[Dict[str, Any]] = []
+
+    def add_step(self, step, started_at: datetime, elapsed: float, config: Optional[Dict], result: Any = None, error: Optional[str] = None):
+        if error is None and isinstance(result, dict) and result.get("error"):
+            error = str(result["error"])
+        self.steps.append({
+            "run_id": self.run_id,
+            "tenant_id": self.tenant_id,
+            "trail_id": self.trail_id,
+            "node_id": step.node_id,
+            "node_type": step.type,
+            "action_type": step.action_type,
+            "status": "error" if error else "success",
+            "error": error,
+            "config_size": len(json.dumps(config, default=str)) if config is not None else None,
+            "started_at": started_at,
+            "finished_at": started_at + timedelta(seconds=elapsed),
+            "duration_ms": round(elapsed * 1000, 3),
+        }) # list.append é atômico: seguro para os ramos em threads
+
+    def finish(self, error: Optional[str] = None) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._t0
+        if error:
+            status = "error"
+        elif any(s["status"] == "error" for s in self.steps):
+            status = "failed"
+        else:
+            status = "success"
+        return {
+            "id": self.run_id,
+            "tenant_id": self.tenant_id,
+            "trail_id": self.trail_id,
+            "trail_version": self.trail_version,
+            "trigger": self.trigger,
+            "status": status,
+            "error": error,
+            "node_count": len(self.steps),
+            "started_at": self.started_at,
+            "finished_at": self.started_at + timedelta(seconds=elapsed),
+            "duration_ms": round(elapsed * 1000, 3),
+        }
+
+class TrailRunLog:
+    def __init__(self, batch_size: int = 500, flush_seconds: float = 5.0):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._runs: List[Dict[str, Any]] = []
+        self._steps: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def start(self, plan, tenant_id, trigger: Optional[str] = None) -> Optional[TrailRunTrace]:
+        if not settings.TRAIL_RUN_LOG:
+            return None
+        return TrailRunTrace(plan, tenant_id, trigger)
+
+    def record(self, trace: Optional[TrailRunTrace], error: Optional[str] = None):
+        """Fecha a trace e a coloca no buffer. Grava o lote se estiver cheio ou velho."""
+        if trace is None:
+            return
+        run = trace.finish(error)
+        with self._lock:
+            self._runs.append(run)
+            self._steps.extend(trace.steps)
+            due = len(self._steps) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._runs)
+
+    def flush(self, db: Optional[Session] = None) -> int:
+        """Grava o buffer (runs antes dos nós, pela FK). Retorna quantas runs foram gravadas."""
+        # Um flush por vez: um segundo chamador não espera, o próximo ciclo grava o que sobrar
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                runs, steps = self._runs, self._steps
+                self._runs, self._steps = [], []
+                self._last_flush = time.monotonic()
+            if not runs:
+                return 0
+
+            own_session = db is None
+            db = db or database.SessionSys()
+            try:
+                db.execute(insert(TrailRun), runs)
+                if steps:
+                    db.execute(insert(TrailRunStep), steps)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                # Log de diagnóstico: descarta o lote em vez de acumular memória
+                logger.error(f"[TrailRunLog] Failed to write {len(runs)} runs / {len(steps)} steps: {e}")
+                return 0
+            finally:
+                if own_session:
+                    db.close()
+            return len(runs)
+        finally:
+            self._flush_lock.release()
+
+    @staticmethod
+    def purge(db: Session, retention_days: int) -> int:
+        """Remove runs (e nós, via CASCADE) mais antigas que retention_days."""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        deleted = db.query(TrailRun).filter(TrailRun.started_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+trail_run_log = TrailRunLog(batch_size=settings.TRAIL_RUN_LOG_BATCH_SIZE, flush_seconds=settings.TRAIL_RUN_LOG_FLUSH_SECONDS)
+
+@periodic_task(settings.TRAIL_RUN_LOG_FLUSH_SECONDS)
+def flush_trail_run_log(db: Session):
+    return trail_run_log.flush(db)
+
+@periodic_task(3600)
+def purge_trail_run_log(db: Session):
+    if settings.TRAIL_RUN_LOG_RETENTION_DAYS > 0:
+        return TrailRunLog.purge(db, settings.TRAIL_RUN_LOG_RETENTION_DAYS)
@@ -0,0 +1,207 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.shared import database
+from app.engine.metadata import models as models_meta
+from app.system import models as models_system
+from app.engine.services.job_queue import enqueue, job_handler, periodic_task
+
+logger = logging.getLogger(__name__)
+
+# Agendador de trilhas SCHEDULER (substitui o heartbeat APScheduler que rodava em cada web worker).
+#   trigger_config: {"cron": "*/15 8-18 * * 1-5"} (UTC) ou {"interval": <minutos>}
+#   tick() (periódico, no worker): trava as trilhas vencidas (next_run_at <= agora) com
+#   FOR UPDATE SKIP LOCKED, avança next_run_at e enfileira um "trail.scheduled" na mesma
+#   transação. Com várias réplicas, cada disparo é reivindicado por exatamente uma.
+#   Disparos perdidos durante uma parada viram um só (next_run_at recalculado a partir de agora).
+
+class CronExpression:
+    """Cron de 5 campos (minuto hora dia mês dia-da-semana), com *, listas, faixas, passos e @macros."""
+
+    MACROS = {
+        "@yearly": "0 0 1 1 *",
+        "@annually": "0 0 1 1 *",
+        "@monthly": "0 0 1 * *",
+        "@weekly": "0 0 * * 0",
+        "@daily": "0 0 * * *",
+        "@midnight": "0 0 * * *",
+        "@hourly": "0 * * * *",
+    }
+    BOUNDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+    MAX_YEARS = 5
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = self.MACROS.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression '{expression}': expected 5 fields")
+        parsed = [self._parse(f, lo, hi) for f, (lo, hi) in zip(fields, self.BOUNDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {d % 7 for d in weekdays} # 7 = domingo
+        # Dia do mês e da semana restritos ao mesmo tempo: basta um casar (semântica do cron)
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _parse(self, field: str, lo: int, hi: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/", 1)
+                step = int(step_str)
+                if step < 1:
+                    raise ValueError(f"Invalid cron step in '{self.expression}'")
+            if part == "*":
+                start, end = lo, hi
+            elif "-" in part:
+                start, end = (int(p) for p in part.split("-", 1))
+            else:
+                start = int(part)
+                end = hi if step > 1 else start
+            if start < lo or end > hi or start > end:
+                raise ValueError(f"Cron value out of range in '{self.expression}'")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, t: datetime) -> bool:
+        dom = t.day in self.days
+        dow = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day and self._any_weekday:
+            return True
+        if self._any_day:
+            return dow
+        if self._any_weekday:
+            return dom
+        return dom or dow
+
+    def next_after(self, after: datetime) -> datetime:
+        """Próximo instante (minuto cheio) estritamente depois de `after`."""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + timedelta(days=366 * self.MAX_YEARS)
+        while t <= limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+class TrailScheduler:
+    # Agenda inválida ou vazia (templates, migração, edição direta): next_run_at recebe esta data
+    # e a trilha sai das duas consultas do tick (sem ser travada a cada ciclo nem tomar o lugar
+    # das trilhas válidas no lote). Salvar a trilha no builder recalcula via schedule().
+    NEVER = datetime(9999, 12, 31)
+
+    @staticmethod
+    def _set_next_run(trail: models_meta.MetaTrail, next_run_at: Optional[datetime]):
+        trail.next_run_at = next_run_at
+        # Reagendar não é editar: sem isso o onupdate de updated_at avançaria a cada execução
+        # (e a versão da trilha no cache de planos, chaveado por updated_at)
+        trail.updated_at = models_meta.MetaTrail.updated_at
+
+    @staticmethod
+    def _park_invalid(trail: models_meta.MetaTrail, error: ValueError):
+        logger.warning(f"[Scheduler] Trail {trail.id} has an invalid schedule: {error}")
+        TrailScheduler._set_next_run(trail, TrailScheduler.NEVER)
+
+    @staticmethod
+    def next_run(config: Dict[str, Any], after: datetime) -> Optional[datetime]:
+        """Próxima execução depois de `after`, ou None se a config não agenda nada."""
+        if config.get("cron"):
+            return CronExpression(config["cron"]).next_after(after)
+        interval = int(config.get("interval") or 0)
+        if interval > 0:
+            return after + timedelta(minutes=interval)
+        return None
+
+    @staticmethod
+    def first_run(config: Dict[str, Any], now: datetime) -> Optional[datetime]:
+        # Intervalo: primeira execução imediata (como no heartbeat antigo); cron: próximo casamento
+        if not config.get("cron") and int(config.get("interval") or 0) > 0:
+            return now
+        return TrailScheduler.next_run(config, now)
+
+    @staticmethod
+    def schedule(trail: models_meta.MetaTrail):
+        """
+        Recalcula next_run_at após criar/alterar a trilha (builder).
+        Levanta ValueError para cron/intervalo inválido.
+        """
+        if trail.trigger_type == 'SCHEDULER' and trail.is_active:
+            trail.next_run_at = TrailScheduler.first_run(trail.trigger_config or {}, datetime.utcnow())
+        else:
+            trail.next_run_at = None
+
+    @staticmethod
+    def _claim(db: Session, *criteria) -> List[models_meta.MetaTrail]:
+        return db.query(models_meta.MetaTrail).filter(
+            models_meta.MetaTrail.trigger_type == 'SCHEDULER',
+            models_meta.MetaTrail.is_active == True,
+            *criteria
+        ).order_by(models_meta.MetaTrail.next_run_at).limit(settings.SCHEDULER_BATCH_SIZE).with_for_update(skip_locked=True).all()
+
+    @staticmethod
+    def tick(db: Session) -> int:
+        """Enfileira as trilhas vencidas. Retorna quantas disparou."""
+        now = datetime.utcnow()
+
+        # Trilhas ainda sem next_run_at (templates, migração): agenda a primeira execução
+        for trail in TrailScheduler._claim(db, models_meta.MetaTrail.next_run_at.is_(None)):
+            try:
+                first_run = TrailScheduler.first_run(trail.trigger_config or {}, now)
+            except ValueError as e:
+                TrailScheduler._park_invalid(trail, e)
+                continue
+            TrailScheduler._set_next_run(trail, first_run or TrailScheduler.NEVER) # sem cron/intervalo: nada a agendar
+        db.commit()
+
+        due = TrailScheduler._claim(db, models_meta.MetaTrail.next_run_at <= now)
+        for trail in due:
+            scheduled_for = trail.next_run_at
+            try:
+                next_run_at = TrailScheduler.next_run(trail.trigger_config or {}, now)
+            except ValueError as e:
+                TrailScheduler._park_invalid(trail, e)
+                continue
+            TrailScheduler._set_next_run(trail, next_run_at or TrailScheduler.NEVER)
+            enqueue(db, "trail.scheduled", {
+                "trail_id": str(trail.id),
+                "tenant_id": str(trail.tenant_id),
+                "scheduled_for": scheduled_for.isoformat(),
+            }, tenant_id=trail.tenant_id)
+            logger.info(f"[Scheduler] Trail {trail.name} ({trail.id}) due at {scheduled_for.isoformat()}, next at {next_run_at}")
+        db.commit()
+        return len(due)
+
+@periodic_task(settings.SCHEDULER_TICK_SECONDS)
+def scheduler_tick(db: Session):
+    return TrailScheduler.tick(db)
+
+@job_handler("trail.scheduled")
+def handle_scheduled_trail(payload: dict):
+    from app.engine.automation.service import AutomationService
+
+    db = database.SessionCrm()
+    try:
+        # Sessão isolada por execução, roteada para o schema do tenant da trilha
+        tenant = db.query(models_system.Tenant).filter(models_system.Tenant.id == payload["tenant_id"]).first()
+        if not tenant or not tenant.slug:
+            logger.warning(f"[Scheduler] Tenant {payload['tenant_id']} not found. Skipping trail {payload['trail_id']}.")
+            return
+        schema_name = f"tenant_{tenant.slug.replace('-', '_')}"
+        database.set_search_path(db, database.tenant_search_path(schema_name))
+
+        logger.info(f"Executing Scheduled Trail: {payload['trail_id']}")
+        AutomationService(db, payload["tenant_id"]).run_trail(payload["trail_id"], {
+            "trigger": "scheduler",
+            "timestamp": payload["scheduled_for"],
+        }, trigger="scheduler")
+    finally:
+        db.close()
@@ -1,15 +1,55 @@
-import httpx
+import asyncio
 import logging
 from datetime import datetime
 from sqlalchemy.orm import Session
+from app.shared.database import SessionSys
+from app.core.http_client import http_pool
 from app.engine.metadata import models as models_meta
 from app.system import models as models_system
+from app.engine.metadata.cache import metadata_cache
+from app.engine.metadata.trigger_index import trigger_index, EMPTY_ROUTES
+from app.engine.services.job_queue import JobFailed, enqueue, job_handler
 
 logger = logging.getLogger(__name__)
 
+# Automação de eventos de registro, via fila de jobs (job_queue):
+#   escrita -> "workflow.event" (mesma transação) -> worker resolve os alvos e
+#   agenda um "workflow.webhook" por workflow e um "trail.execute" por trilha.
+# Cada entrega é um job próprio: falha de um webhook não reexecuta as trilhas.
+
+# Eventos em lote: webhooks recebem um POST por bloco ("entity.created.batch")
+WORKFLOW_BATCH_SIZE = 500
+
 class WorkflowService:
     @staticmethod
-    async def trigger_workflows(
+    def _resolve_targets(db: Session, entity_slug: str, trigger_type: str, tenant_id: str):
+        """(entity, TriggerRoutes) do evento, via metadata_cache + trigger_index (índice conferido pela versão de origem)."""
+        entity = metadata_cache.get(db, tenant_id).entity_by_slug(entity_slug)
+        if not entity:
+            logger.warning(f"[Workflow] Entity not found for slug: {entity_slug}")
+            return None, EMPTY_ROUTES
+        return entity, trigger_index.routes(db, tenant_id, entity.id, trigger_type)
+
+    @staticmethod
+    def _may_have_targets(db: Session, entity_slug: str, trigger_type: str, tenant_id: str) -> bool:
+        """Filtro do enfileiramento: entidades sem trilha/workflow para o evento não geram job."""
+        entity, routes = WorkflowService._resolve_targets(db, entity_slug, trigger_type, tenant_id)
+        return entity is not None and bool(routes)
+
+    @staticmethod
+    def _actor(db: Session, user_id: str = None) -> dict:
+        # Fetch user info if available
+        user_info = {"id": user_id, "email": "unknown"}
+        if user_id:
+            user = db.query(models_system.GlobalUser).filter(models_system.GlobalUser.id == user_id).first()
+            if user:
+                user_info["email"] = user.recovery_email or user.username
+        return user_info
+
+    # --- Enfileiramento (chamar antes do commit da escrita) ---
+
+    @staticmethod
+    def enqueue_event(
         db: Session,
         entity_slug: str,
         trigger_type: str,
@@ -19,110 +59,162 @@ class WorkflowService:
         changes: dict = None
     ):
         """
-        Main entry point to check and dispatch workflows.
-        This function should be called as a Background Task to avoid blocking the API.
+        Main entry point for record events. Adds a "workflow.event" job to the
+        caller's transaction: it is only visible to the worker if the write commits.
+        Entities with no trail/workflow for this event enqueue nothing.
+        """
+        if not WorkflowService._may_have_targets(db, entity_slug, trigger_type, tenant_id):
+            return
+        enqueue(db, "workflow.event", {
+            "entity_slug": entity_slug,
+            "trigger_type": trigger_type,
+            "tenant_id": str(tenant_id),
+            "user_id": str(user_id) if user_id else None,
+            "items": [{"data": payload_data, "changes": changes or {}}],
+            "batch": False,
+        }, tenant_id=tenant_id)
+
+    @staticmethod
+    def enqueue_batch_event(
+        db: Session,
+        entity_slug: str,
+        trigger_type: str,
+        items: list,
+        tenant_id: str,
+        user_id: str = None
+    ):
+        """
+        Batch version of enqueue_event for bulk writes.
+        items: [{"id": ..., "data": {...}, "changes": {...}}]. Webhooks get one
+        "entity.<event>.batch" POST per WORKFLOW_BATCH_SIZE items, trails still run once per record.
         """
-        try:
-            # 1. Find the Entity by Slug
-            entity = db.query(models_meta.MetaEntity).filter(
-                models_meta.MetaEntity.slug == entity_slug,
-                models_meta.MetaEntity.tenant_id == tenant_id
-            ).first()
-
-            if not entity:
-                logger.warning(f"[Workflow] Entity not found for slug: {entity_slug}")
-                return
-
-            # 2. Find Active Workflows for this Entity and Trigger
-            # 2. Find Active Workflows for this Entity and Trigger
-            # A) Legacy Workflows
-            workflows = db.query(models_meta.MetaWorkflow).filter(
-                models_meta.MetaWorkflow.entity_id == entity.id,
-                models_meta.MetaWorkflow.trigger_type == trigger_type,
-                models_meta.MetaWorkflow.is_active == True
-            ).all()
-
-            # B) New Trails (DB_EVENT)
-            # Filter in Python for JSON config match (simpler than JSON SQL query for now)
-            # We look for trails that are DB_EVENT for this Tenant
-            trails = db.query(models_meta.MetaTrail).filter(
-                models_meta.MetaTrail.tenant_id == tenant_id,
-                models_meta.MetaTrail.trigger_type == 'DB_EVENT',
-                models_meta.MetaTrail.is_active == True
-            ).all()
-            
-            # Filter relevant trails
-            active_trails = []
-            for t in trails:
-                cfg = t.trigger_config or {}
-                # Check Entity ID
-                if str(cfg.get('entity_id')) != str(entity.id):
-                    continue
-                # Check Event (ON_CREATE, ON_UPDATE, ON_DELETE, or ALL)
-                evt = cfg.get('event', 'ALL')
-                if evt != 'ALL' and evt != trigger_type:
-                    continue
-                active_trails.append(t)
-
-            if not workflows and not active_trails:
-                return # No automation configured
-
-            # 3. Construct Payload
-            # Fetch user info if available
-            user_info = {"id": user_id, "email": "unknown"}
-            if user_id:
-                user = db.query(models_system.User).filter(models_system.User.id == user_id).first()
-                if user:
-                    user_info["email"] = user.email
-
-            event_payload = {
-                "event": f"entity.{trigger_type.lower().replace('on_', '')}",
-                "entity": entity_slug,
-                "entity_name": entity.display_name,
-                "tenant_id": str(tenant_id),
-                "actor": user_info,
-                "timestamp": datetime.utcnow().isoformat(),
-                "data": payload_data,
-                "changes": changes or {}
-            }
-
-            # 4. Dispatch Legacy Webhooks
-            if workflows:
-                async with httpx.AsyncClient() as client:
-                    for wf in workflows:
-                        try:
-                            # Internal Script Handler
-                            if wf.webhook_url and wf.webhook_url.startswith("internal://"):
-                                script_name = wf.webhook_url.replace("internal://", "")
-                                logger.info(f"[Workflow] Executing Internal Script: {script_name}")
-                                
-                                # Import shared service
-                                from app.engine.services.internal_scripts import execute_script_by_name
-                                
-                                # Execute (Sync in Async loop - acceptable for light scripts, else use threadpool)
-                                result = execute_script_by_name(script_name, event_payload)
-                                logger.info(f"[Workflow] Result: {result}")
-                                continue
-
-                            # Standard Webhook
-                            logger.info(f"[Workflow] Dispatching {wf.name or 'Webhook'} to {wf.webhook_url}")
-                            resp = await client.post(wf.webhook_url, json=event_payload, timeout=10.0)
-                            if resp.status_code >= 400:
-                                logger.error(f"[Workflow] Failed to send to {wf.webhook_url}: {resp.status_code} - {resp.text}")
-                        except Exception as e:
-                            logger.error(f"[Workflow] Error dispatching to {wf.webhook_url}: {str(e)}")
-            
-            # 5. Execute Trails (Sync/Direct for now, can be backgrounded)
-            if active_trails:
-                from app.engine.services.trail_executor import TrailExecutor
-                executor = TrailExecutor(db, str(tenant_id), user_id=user_id)
-                for trail in active_trails:
-                    try:
-                        logger.info(f"[Workflow] Executing Trail: {trail.name}")
-                        # Payload for trail is the event context
-                        executor.execute_trail(str(trail.id), event_payload)
-                    except Exception as e:
-                         logger.error(f"[Workflow] Error executing trail {trail.name}: {str(e)}")
-
-        except Exception as e:
-            logger.error(f"[Workflow] Critical error in trigger_workflows: {str(e)}")
+        if not items:
+            return
+        if not WorkflowService._may_have_targets(db, entity_slug, trigger_type, tenant_id):
+            return
+        enqueue(db, "workflow.event", {
+            "entity_slug": entity_slug,
+            "trigger_type": trigger_type,
+            "tenant_id": str(tenant_id),
+            "user_id": str(user_id) if user_id else None,
+            "items": [{"id": i.get("id"), "data": i.get("data"), "changes": i.get("changes") or {}} for i in items],
+            "batch": True,
+        }, tenant_id=tenant_id)
+
+    # --- Execução (worker) ---
+
+    @staticmethod
+    def fan_out(db: Session, entity_slug: str, trigger_type: str, items: list, tenant_id: str, user_id: str = None, batch: bool = False) -> int:
+        """Resolve os alvos do evento e agenda uma entrega por webhook/trilha. Retorna quantos jobs criou."""
+        entity, routes = WorkflowService._resolve_targets(db, entity_slug, trigger_type, tenant_id)
+        if not routes:
+            return 0 # No automation configured
+
+        event = f"entity.{trigger_type.lower().replace('on_', '')}"
+        base = {
+            "entity": entity_slug,
+            "entity_name": entity.display_name,
+            "tenant_id": str(tenant_id),
+            "actor": WorkflowService._actor(db, user_id),
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+        payloads = [
+            {**base, "event": event, "data": i.get("data"), "changes": i.get("changes") or {}}
+            for i in items
+        ]
+
+        # Webhook payloads: one per record, or one "<event>.batch" per chunk
+        if batch:
+            deliveries = [
+                {**base, "event": f"{event}.batch", "items": items[start:start + WORKFLOW_BATCH_SIZE]}
+                for start in range(0, len(items), WORKFLOW_BATCH_SIZE)
+            ]
+        else:
+            deliveries = payloads
+
+        count = 0
+        for workflow_id in routes.workflow_ids:
+            for delivery in deliveries:
+                enqueue(db, "workflow.webhook", {"workflow_id": workflow_id, "event": delivery}, tenant_id=tenant_id)
+                count += 1
+        for event_payload in payloads:
+            for trail_id in routes.trail_ids:
+                enqueue(db, "trail.execute", {
+                    "trail_id": trail_id,
+                    "tenant_id": str(tenant_id),
+                    "user_id": user_id,
+                    "event": event_payload,
+                }, tenant_id=tenant_id)
+                count += 1
+        return count
+
+    @staticmethod
+    async def dispatch_webhook(wf, event_payload: dict):
+        """Entrega um evento a um workflow. Levanta exceção em falha (o job é reagendado)."""
+        # Internal Script Handler
+        if wf.webhook_url and wf.webhook_url.startswith("internal://"):
+            script_name = wf.webhook_url.replace("internal://", "")
+            logger.info(f"[Workflow] Executing Internal Script: {script_name}")
+
+            # Import shared service
+            from app.engine.services.internal_scripts import execute_script_by_name
+
+            result = await asyncio.to_thread(execute_script_by_name, script_name, event_payload)
+            logger.info(f"[Workflow] Result: {result}")
+            return
+
+        # Standard Webhook
+        logger.info(f"[Workflow] Dispatching {wf.name or 'Webhook'} to {wf.webhook_url}")
+        resp = await http_pool.request("POST", wf.webhook_url, json=event_payload)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"Webhook {wf.webhook_url} answered {resp.status_code}: {resp.text[:500]}")
+
+# --- Handlers da fila ---
+
+@job_handler("workflow.event")
+def handle_workflow_event(payload: dict):
+    db = SessionSys()
+    try:
+        count = WorkflowService.fan_out(
+            db,
+            entity_slug=payload["entity_slug"],
+            trigger_type=payload["trigger_type"],
+            items=payload.get("items") or [],
+            tenant_id=payload["tenant_id"],
+            user_id=payload.get("user_id"),
+            batch=payload.get("batch", False),
+        )
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+def _load_workflow(workflow_id: str):
+    db = SessionSys()
+    try:
+        return db.query(models_meta.MetaWorkflow).filter(models_meta.MetaWorkflow.id == workflow_id).first()
+    finally:
+        db.close()
+
+@job_handler("workflow.webhook")
+async def handle_workflow_webhook(payload: dict):
+    wf = await asyncio.to_thread(_load_workflow, payload["workflow_id"])
+    if not wf or not wf.is_active:
+        logger.info(f"[Workflow] Workflow {payload['workflow_id']} removed or inactive. Skipping.")
+        return
+    await WorkflowService.dispatch_webhook(wf, payload["event"])
+
+@job_handler("trail.execute")
+def handle_trail_execute(payload: dict):
+    from app.engine.services.trail_executor import TrailExecutor, TrailNodeError
+    db = SessionSys()
+    try:
+        logger.info(f"[Workflow] Executing Trail: {payload['trail_id']}")
+        # Payload for trail is the event context
+        TrailExecutor(db, payload["tenant_id"], user_id=payload.get("user_id")).execute_trail(payload["trail_id"], payload["event"], trigger="workflow")
+    except TrailNodeError as e:
+        # Exceção em um nó (já desfeita pelo executor): repetir reexecutaria efeitos externos
+        # (WEBHOOK, GENERATE_PDF) e erros determinísticos de fórmula/config. Retentativa só para infraestrutura.
+        raise JobFailed(f"Trail {payload['trail_id']}: {e}") from e
+    finally:
+        db.close()
@@ -6,6 +6,8 @@ import logging
 import os
 from .core.middleware import TenantMiddleware
 from .core.config import settings
+from .core.http_client import http_pool
+from app.engine.services.trail_run_log import trail_run_log
 from app.shared import database, security, schemas
 from app.system import models as models_system
 
@@ -35,6 +37,7 @@ from app.engine.api import data # REFAC: Universal Data API
 from app.engine.api import actions # REFAC: Actions API (DEPRECATED - Use automation)
 from app.engine.api import automation # NEW: Automation API
 from app.engine.api import analytics # REFAC: Analytics API
+from app.engine.api import imports # NEW: Data Import API
 
 # --- LEGACY / SHARED ROUTERS ---
 # Reduced for Stability Protocol
@@ -119,6 +122,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Kind"],
 )
 
 @app.get("/")
@@ -137,6 +141,7 @@ app.include_router(notifications.router, prefix="/v1/notifications", tags=["Syst
 app.include_router(builder.router, prefix="/api/builder", tags=["Builder"])
 app.include_router(metadata.router, prefix="/api/engine", tags=["Engine Runtime"])
 app.include_router(data.router, prefix="/api/engine", tags=["Universal Data"])
+app.include_router(imports.router, prefix="/api/engine", tags=["Data Import"])
 # app.include_router(actions.router, prefix="/api/engine", tags=["Engine Actions"]) # DEPRECATED
 app.include_router(automation.router, prefix="/api/engine/automation", tags=["Engine Automation"])
 app.include_router(analytics.router, prefix="/api/engine/analytics", tags=["Engine Analytics"])
@@ -147,96 +152,18 @@ app.include_router(diagnostics.router, prefix="/v1/sysadmin/diagnostics", tags=[
 from app.system.api.sysadmin import templates
 app.include_router(templates.router, prefix="/v1/sysadmin/templates", tags=["SysAdmin Templates"])
 
-# --- SCHEDULER (V1.0 MVP) ---
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timedelta
-import asyncio
+# Trilhas SCHEDULER: agendadas pelo worker (`python -m app.worker`, ver trail_scheduler)
 
-scheduler = BackgroundScheduler()
-
-def check_scheduled_trails():
-    """
-    Heartbeat job to check for scheduled trails (Timer/Cron).
-    Runs every 60 seconds.
-    """
-    logger.info("Scheduler Heartbeat...")
-    db = database.SessionSys()
-    try:
-        # Find active Scheduler trails
-        # Note: We need to check all tenants.
-        # Ideally, we iterate tenants, but for now we query all MetaTrails globally if possible?
-        # MetaTrail is in 'public' schema but usually filtered by tenant_id.
-        # Since we are in sys context, we can query all.
-        
-        trails = db.query(models_meta.MetaTrail).filter(
-            models_meta.MetaTrail.trigger_type == 'SCHEDULER',
-            models_meta.MetaTrail.is_active == True
-        ).all()
-        
-        for trail in trails:
-            config = trail.trigger_config or {}
-            interval_mins = int(config.get('interval', 0))
-            if interval_mins <= 0: continue
-            
-            last_run_str = config.get('last_run')
-            should_run = False
-            now = datetime.utcnow()
-            
-            if not last_run_str:
-                should_run = True
-            else:
-                last_run = datetime.fromisoformat(last_run_str)
-                if (now - last_run) > timedelta(minutes=interval_mins):
-                    should_run = True
-            
-            if should_run:
-                logger.info(f"Executing Scheduled Trail: {trail.name}")
-                
-                # 3. Contextualize Tenant Schema
-                # We need to set the search_path so that the TrailExecutor can find the dynamic tables
-                # stored in the tenant's schema.
-                if trail.tenant and trail.tenant.slug:
-                    schema_name = f"tenant_{trail.tenant.slug.replace('-', '_')}"
-                    db.execute(text(f"SET search_path TO {schema_name}, public"))
-                
-                # Execute Trail
-                # We need to use TrailExecutor. But it requires a tenant-scoped session usually?
-                # TrailExecutor takes (db, tenant_id).
-                
-                # Execute Trail (New Architecture)
-                from app.engine.automation.service import AutomationService
-                service = AutomationService(db)
-                
-                payload = {
-                    "trigger": "scheduler",
-                    "timestamp": now.isoformat()
-                }
-                
-                service.run_trail(str(trail.id), payload)
-                
-                # Update Last Run
-                config['last_run'] = now.isoformat()
-                # Flag modified for SQLAlchemy (JSON mutation detection is tricky)
-                trail.trigger_config = config 
-                # Re-assigning dict usually triggers update in standard ORM usage if specific type used, 
-                # but explicit reassignment is safer.
-                
-                # Note: This commits the transaction for each trail run to save state.
-                db.commit()
-
-    except Exception as e:
-        logger.error(f"Scheduler Error: {e}")
-        db.rollback()
-    finally:
-        db.close()
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await database.async_engine.dispose()
 
-@app.on_event("startup")
-def start_scheduler():
-    if not scheduler.running:
-        scheduler.add_job(check_scheduled_trails, 'interval', seconds=60)
-        scheduler.start()
-        logger.info("Task Scheduler Started (60s interval)")
+@app.on_event("shutdown")
+async def close_http_pool():
+    await http_pool.aclose()
+    http_pool.close()
 
 @app.on_event("shutdown")
-def stop_scheduler():
-    scheduler.shutdown()
\ No newline at end of file
+def flush_trail_run_log():
+    # Runs ainda no buffer do log de execuções (trail_run_log)
+    trail_run_log.flush()
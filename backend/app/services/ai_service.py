@@ -1,7 +1,7 @@
 import logging
-import httpx
 import json
 from typing import List, Dict, Any, Optional
+from app.core.http_client import http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -84,8 +84,7 @@ class AIService:
         """
         try:
             # Check existing models
-            with httpx.Client(timeout=5.0) as client:
-                resp = client.get(f"{OLLAMA_HOST}/api/tags")
+            resp = http_pool.request_sync("GET", f"{OLLAMA_HOST}/api/tags", timeout=5.0)
                 
             if resp.status_code == 200:
                 models = resp.json().get("models", [])
@@ -97,14 +96,13 @@ class AIService:
             logger.info(f"[AI] Model {model_name} not found. Starting download (Pulling)...")
             
             # Using longer timeout for PULL
-            with httpx.Client(timeout=600.0) as client:
-                pull_resp = client.post(f"{OLLAMA_HOST}/api/pull", json={"name": model_name, "stream": False})
-                if pull_resp.status_code == 200:
-                    logger.info(f"[AI] Model {model_name} pulled successfully.")
-                    return True
-                else:
-                    logger.error(f"[AI] Failed to pull model: {pull_resp.text}")
-                    return False
+            pull_resp = http_pool.request_sync("POST", f"{OLLAMA_HOST}/api/pull", json={"name": model_name, "stream": False}, timeout=600.0)
+            if pull_resp.status_code == 200:
+                logger.info(f"[AI] Model {model_name} pulled successfully.")
+                return True
+            else:
+                logger.error(f"[AI] Failed to pull model: {pull_resp.text}")
+                return False
 
         except Exception as e:
             logger.error(f"[AI] Model check/pull failed: {e}")
@@ -126,8 +124,7 @@ class AIService:
             }
         }
         
-        with httpx.Client(timeout=60.0) as client:
-            resp = client.post(url, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            return data.get("response", "")
+        resp = http_pool.request_sync("POST", url, json=payload, timeout=60.0)
+        resp.raise_for_status()
+        data = resp.json()
+        return data.get("response", "")
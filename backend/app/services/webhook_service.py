@@ -1,64 +1,142 @@
-import httpx
+import hmac
+import json
+import time
+import uuid
+import asyncio
+import hashlib
 import logging
+from datetime import datetime
 from sqlalchemy.orm import Session
-from app.db import models_integration
-import asyncio
+from app.core.config import settings
+from app.core.http_client import http_pool
+from app.shared import database
+from app.shared import models_integration
+from app.engine.services.job_queue import enqueue, job_handler, default_worker_id, JobQueue
 
 logger = logging.getLogger(__name__)
 
+# Outbox transacional de webhooks (WebhookConfig, schema do tenant):
+#   enqueue_event() grava um job "webhook.deliver" por webhook interessado na MESMA
+#   transação da mudança; o worker entrega com backoff exponencial (job_queue).
+#   Com WEBHOOK_BATCH_MAX > 1, eventos na fila do mesmo webhook saem em um único POST.
+#   Com WebhookConfig.secret, o corpo é assinado (HMAC-SHA256).
+# Entrega at-least-once: o receptor deduplica pelo "id" de cada evento.
+
+SIGNATURE_HEADER = "X-Repforce-Signature"
+TIMESTAMP_HEADER = "X-Repforce-Timestamp"
+
 class WebhookService:
     def __init__(self, db: Session):
         self.db = db
 
-    async def dispatch_event(self, event_name: str, payload: dict):
+    def enqueue_event(self, event_name: str, payload: dict, tenant_id=None) -> int:
         """
-        Dispara um evento para todos os Webhooks configurados para esse evento.
+        Registra o evento para todos os Webhooks ativos que o assinam.
+        Não faz commit: o evento só existe se a transação do chamador for confirmada.
         """
-        try:
-            # 1. Encontrar Webhooks ativos para este evento
-            # Nota: O filtro JSON idealmente usaria operador @> do Postgres,
-            # mas aqui faremos filtro em Python para simplicidade no MVP SQLite/PG hibrido.
-            configs = self.db.query(models_integration.WebhookConfig).filter(
-                models_integration.WebhookConfig.is_active == True
-            ).all()
-
-            targets = [c for c in configs if event_name in c.events]
-            
-            if not targets:
-                logger.debug(f"Nenhum webhook configurado para o evento {event_name}")
-                return
-
-            logger.info(f"Disparando evento {event_name} para {len(targets)} webhooks")
-
-            # 2. Enviar Payloads (Async)
-            async with httpx.AsyncClient() as client:
-                tasks = []
-                for config in targets:
-                    tasks.append(self._send_payload(client, config, event_name, payload))
-                
-                await asyncio.gather(*tasks)
-
-        except Exception as e:
-            logger.error(f"Erro no dispatch de webhooks: {e}")
-
-    async def _send_payload(self, client: httpx.AsyncClient, config, event_name, payload):
-        try:
-            full_payload = {
-                "event": event_name,
-                "timestamp": payload.get("timestamp"),
-                "data": payload
-            }
-            
-            headers = config.api_headers or {}
-            
-            # TODO: Implement HMAC signature with config.secret if needed
-            
-            response = await client.post(config.url, json=full_payload, headers=headers, timeout=5.0)
-            
-            if response.status_code >= 400:
-                logger.warning(f"Webhook {config.name} falhou com status {response.status_code}")
-            else:
-                logger.debug(f"Webhook {config.name} sucesso")
-
-        except Exception as e:
-            logger.error(f"Falha ao enviar webhook para {config.url}: {e}")
+        # Nota: O filtro JSON idealmente usaria operador @> do Postgres,
+        # mas aqui faremos filtro em Python para simplicidade no MVP SQLite/PG hibrido.
+        configs = self.db.query(models_integration.WebhookConfig).filter(
+            models_integration.WebhookConfig.is_active == True
+        ).all()
+
+        targets = [c for c in configs if event_name in (c.events or [])]
+        if not targets:
+            logger.debug(f"Nenhum webhook configurado para o evento {event_name}")
+            return 0
+
+        event = {
+            "id": str(uuid.uuid4()),
+            "event": event_name,
+            "timestamp": payload.get("timestamp") or datetime.utcnow().isoformat(),
+            "data": json.loads(json.dumps(payload, default=str)),
+        }
+        # Schema do tenant para o worker reabrir o WebhookConfig
+        search_path = self.db.info.get("search_path")
+        delay = settings.WEBHOOK_BATCH_WINDOW if settings.WEBHOOK_BATCH_MAX > 1 else 0
+
+        for config in targets:
+            enqueue(self.db, "webhook.deliver", {
+                "search_path": search_path,
+                "webhook_id": config.id,
+                "event": event,
+            }, tenant_id=tenant_id, delay_seconds=delay, group_key=f"{search_path}:{config.id}")
+
+        logger.info(f"Evento {event_name} enfileirado para {len(targets)} webhooks")
+        return len(targets)
+
+    @staticmethod
+    def sign(secret: str, timestamp: str, body: bytes) -> str:
+        """HMAC-SHA256 de "<timestamp>.<corpo>" (o timestamp no header impede replay)."""
+        digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+        return f"sha256={digest}"
+
+    @staticmethod
+    async def deliver(config: dict, events: list):
+        """Envia um evento (ou lote) a um webhook. Levanta exceção em falha (o job é reagendado)."""
+        if len(events) == 1:
+            body = events[0]
+        else:
+            body = {"event": "batch", "count": len(events), "events": events}
+        raw = json.dumps(body, default=str).encode()
+
+        headers = dict(config.get("api_headers") or {})
+        headers["Content-Type"] = "application/json"
+        if config.get("secret"):
+            timestamp = str(int(time.time()))
+            headers[TIMESTAMP_HEADER] = timestamp
+            headers[SIGNATURE_HEADER] = WebhookService.sign(config["secret"], timestamp, raw)
+
+        response = await http_pool.request("POST", config["url"], content=raw, headers=headers, timeout=5.0)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Webhook {config.get('name')} falhou com status {response.status_code}: {response.text[:500]}")
+        logger.debug(f"Webhook {config.get('name')} sucesso ({len(events)} evento(s))")
+
+# --- Handler da fila ---
+
+def _load_config(search_path, webhook_id):
+    db = database.SessionCrm()
+    try:
+        if search_path:
+            database.set_search_path(db, search_path)
+        config = db.query(models_integration.WebhookConfig).filter(
+            models_integration.WebhookConfig.id == webhook_id
+        ).first()
+        if not config or not config.is_active:
+            return None
+        return {"name": config.name, "url": config.url, "secret": config.secret, "api_headers": config.api_headers}
+    finally:
+        db.close()
+
+def _with_session(fn, *args):
+    db = database.SessionSys()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+@job_handler("webhook.deliver")
+async def handle_webhook_delivery(payload: dict):
+    config = await asyncio.to_thread(_load_config, payload.get("search_path"), payload["webhook_id"])
+    if not config:
+        logger.info(f"Webhook {payload['webhook_id']} removido ou inativo. Evento descartado.")
+        return
+
+    # Lote: outros eventos na fila para o mesmo webhook vão no mesmo POST
+    siblings = []
+    if settings.WEBHOOK_BATCH_MAX > 1:
+        group_key = f"{payload.get('search_path')}:{payload['webhook_id']}"
+        siblings = await asyncio.to_thread(
+            _with_session, JobQueue.claim_group, "webhook.deliver", group_key, default_worker_id(), settings.WEBHOOK_BATCH_MAX - 1
+        )
+
+    try:
+        await WebhookService.deliver(config, [payload["event"]] + [s.payload["event"] for s in siblings])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        for s in siblings:
+            await asyncio.to_thread(_with_session, JobQueue.fail, s.id, s.attempts, s.max_attempts, error)
+        raise
+
+    for s in siblings:
+        await asyncio.to_thread(_with_session, JobQueue.complete, s.id)
@@ -1,7 +1,8 @@
 
 import os
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from sqlalchemy import event, text
 
 # 1. Configuração da Conexão (PostgreSQL)
@@ -27,19 +28,48 @@ def get_database_url():
     db = os.getenv("POSTGRES_DB", "repforce")
     return f"postgresql://{user}:{password}@{server}:{port}/{db}"
 
+def get_async_database_url(url: str) -> str:
+    """Mesma base, driver asyncpg (postgresql://... -> postgresql+asyncpg://...)."""
+    scheme, rest = url.split("://", 1)
+    return f"{scheme.split('+')[0]}+asyncpg://{rest}"
+
 SQLALCHEMY_DATABASE_URL = get_database_url()
 
+# search_path das conexões do pool: fixado na abertura da conexão (parâmetro de
+# startup, sem round-trip). O último search_path aplicado fica em connection.info
+# (por conexão do pool); no início de cada transaction de Session, a conexão é levada
+# ao search_path da sessão (o do tenant ou DEFAULT_SEARCH_PATH) só se for diferente:
+# sem SET quando a conexão já está no schema certo e sem vazamento entre tenants.
+# Conexões diretas (engine.connect()) não passam por aqui: usam nomes qualificados
+# (schema_manager, index_manager) ou SET LOCAL (provisionamento em manager).
+DEFAULT_SEARCH_PATH = "public"
+
 # Engine único com Pool de Conexões
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
     pool_pre_ping=True, # Auto-reconnect
     pool_size=20,
-    max_overflow=10
+    max_overflow=10,
+    connect_args={"options": f"-c search_path={DEFAULT_SEARCH_PATH}"}
+)
+
+# Engine assíncrono (asyncpg) para as rotas quentes (engine data/analytics/metadata).
+# Pool próprio: conexões não são compartilhadas com o engine síncrono.
+async_engine = create_async_engine(
+    get_async_database_url(SQLALCHEMY_DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=int(os.getenv("ASYNC_DB_POOL_SIZE", 20)),
+    max_overflow=int(os.getenv("ASYNC_DB_MAX_OVERFLOW", 10)),
+    connect_args={"server_settings": {"search_path": DEFAULT_SEARCH_PATH}}
 )
 
 # Sessão "Sistema" (Schema Public / Manager)
 SessionSys = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sessão "Sistema" assíncrona. expire_on_commit=False: objetos continuam legíveis
+# após o commit sem novo SELECT implícito (lazy load não existe em async).
+AsyncSessionSys = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 # Sessão "CRM" (Schema Tenant) - Será configurada dinamicamente
 SessionCrm = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -50,16 +80,69 @@ BaseCrm = declarative_base() # Base CRM (Tenant)
 # Configuração de Schema para Models Globais (Opcional, mas seguro)
 # Base.metadata.schema = "public" 
 
+def tenant_search_path(schema_name: str) -> str:
+    # Tenant First, then Public (for shared funcs if any)
+    return f"\"{schema_name}\", public"
+
+def set_search_path(db: Session, search_path: str):
+    """
+    Roteia a sessão para outro search_path: vale para a transação atual (SET LOCAL)
+    e para as próximas (conferido em cada BEGIN via after_begin).
+    """
+    db.info["search_path"] = search_path
+    if db.in_transaction():
+        db.execute(text(f"SET LOCAL search_path TO {search_path}"))
+
+def _set_connection_search_path(connection, search_path: str) -> bool:
+    """
+    SET search_path fora de transação (autocommit, como o pre-ping do psycopg2): o valor
+    sobrevive ao commit/rollback da transação que começa em seguida. False se o driver
+    não permitir (já em transação, driver sem autocommit).
+    """
+    dbapi_connection = connection.connection.dbapi_connection
+    try:
+        autocommit = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+    except Exception:
+        return False
+    try:
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SET search_path TO {search_path}")
+        finally:
+            cursor.close()
+    finally:
+        dbapi_connection.autocommit = autocommit
+    return True
+
+@event.listens_for(Session, "after_begin")
+def _apply_search_path(session, transaction, connection):
+    search_path = session.info.get("search_path") or DEFAULT_SEARCH_PATH
+    if connection.info.get("search_path", DEFAULT_SEARCH_PATH) == search_path:
+        return # Conexão já está no schema da sessão: sem round-trip
+    if _set_connection_search_path(connection, search_path):
+        connection.info["search_path"] = search_path
+    else:
+        connection.exec_driver_sql(f"SET LOCAL search_path TO {search_path}")
+
 # Dependência: Obter DB de Sistema (Global)
 def get_db():
+    # Conexões do pool já estão no public (DEFAULT_SEARCH_PATH)
     db = SessionSys()
     try:
-        # Garante que está no public
-        db.execute(text("SET search_path TO public"))
         yield db
     finally:
         db.close()
 
+# Dependência: Obter DB de Sistema (Global), assíncrona.
+# Leituras síncronas curtas (metadata_cache, load_user_context) rodam via
+# `await db.run_sync(fn, ...)`, que recebe uma Session comum sobre a mesma conexão.
+# run_sync executa no event loop: trabalho de CPU ou I/O longo (FormulaEngine, hooks,
+# HTTP) vai para run_in_threadpool com sessão própria, ou a rota fica síncrona (def).
+async def get_async_db():
+    async with AsyncSessionSys() as db:
+        yield db
+
 from fastapi import Request, HTTPException
 
 # Dependência: Obter DB de CRM (Tenant-Specific)
@@ -91,8 +174,8 @@ def get_crm_db(request: Request):
              yield None
              return
 
-        # Set Search Path: Tenant First, then Public (for shared funcs if any)
-        db.execute(text(f"SET search_path TO \"{schema_name}\", public"))
+        # Search Path conferido no início de cada transação da sessão (SET só se a conexão estiver em outro)
+        set_search_path(db, tenant_search_path(schema_name))
         yield db
     finally:
         db.close()
\ No newline at end of file
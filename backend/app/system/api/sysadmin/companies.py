@@ -13,6 +13,7 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
 
 from app.system.services.schema_manager import SchemaManager # Import SchemaManager
+from app.core.tenant_cache import tenant_cache
 
 def get_current_superuser(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
     payload = security.decode_access_token(token)
@@ -85,6 +86,8 @@ def create_company(
         # IMPORTANT: COMMIT AND REFRESH to free the global session before DDL
         db.commit()
         db.refresh(new_tenant)
+        tenant_cache.invalidate_tenant(new_tenant.slug)
+        tenant_cache.invalidate_membership(admin_user.id, new_tenant.id)
         print(f"Global record for tenant {new_tenant.slug} created successfully.")
         
     except Exception as e:
@@ -148,6 +151,7 @@ def create_company(
         try:
             db.delete(new_tenant)
             db.commit()
+            tenant_cache.invalidate_tenant()
             print(f"Cleaned up tenant record {payload.slug} after provisioning failure.")
         except Exception as cleanup_err:
             print(f"Critical: Failed to cleanup global record: {cleanup_err}")
@@ -180,6 +184,7 @@ def update_company(
         
     db.commit()
     db.refresh(tenant)
+    tenant_cache.invalidate_tenant(tenant.slug)
     return tenant
 
 @router.delete("/{company_id}")
@@ -207,6 +212,8 @@ def delete_company(
         # Ideally, we should check if metadata is deleted.
         db.delete(tenant)
         db.commit()
+        # Memberships e API keys do tenant caem em cascata: descarta o cache inteiro
+        tenant_cache.invalidate_tenant()
         return {"message": f"Tenant {tenant.slug} completely removed."}
 
     except Exception as e:
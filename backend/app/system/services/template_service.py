@@ -1,5 +1,8 @@
 from sqlalchemy.orm import Session
 from app.engine.metadata import models as models_meta
+from app.engine.metadata.cache import metadata_cache, FieldMeta
+from app.engine.metadata.trigger_index import trigger_index
+from app.engine.services.index_manager import IndexManager
 from app.system import models as models_system
 from app.system.services.schema_manager import SchemaManager
 import json
@@ -24,7 +27,9 @@ class TemplateService:
                     "is_required": field.is_required,
                     "options": field.options,
                     "formula": field.formula,
-                    "is_virtual": field.is_virtual
+                    "is_virtual": field.is_virtual,
+                    "is_filterable": field.is_filterable,
+                    "is_sortable": field.is_sortable
                 })
             
             entities_data.append({
@@ -146,6 +151,7 @@ class TemplateService:
             SchemaManager.create_table(schema_name, new_entity.slug)
 
             # Create Fields
+            new_fields = []
             for field_def in entity_def.get("fields", []):
                 new_field = models_meta.MetaField(
                     entity_id=new_entity.id,
@@ -155,9 +161,12 @@ class TemplateService:
                     is_required=field_def.get("is_required", False),
                     options=field_def.get("options", []),
                     formula=field_def.get("formula"),
-                    is_virtual=field_def.get("is_virtual", False)
+                    is_virtual=field_def.get("is_virtual", False),
+                    is_filterable=field_def.get("is_filterable", False),
+                    is_sortable=field_def.get("is_sortable", False)
                 )
                 db.add(new_field)
+                new_fields.append(new_field)
                 
                 # Physical Column (Only if not virtual)
                 if not new_field.is_virtual:
@@ -171,6 +180,13 @@ class TemplateService:
             
             db.commit()
 
+            # Managed indexes (new entity: empty, builds instantly)
+            for new_field in new_fields:
+                db.refresh(new_field)
+                IndexManager.sync_field(FieldMeta(new_field))
+
+        metadata_cache.invalidate(tenant_id)
+
         # 2. Navigation
         for group_def in template_data.get("navigation", []):
             new_group = models_meta.MetaNavigationGroup(
@@ -226,3 +242,4 @@ class TemplateService:
             )
             db.add(new_trail)
         db.commit()
+        trigger_index.invalidate(tenant_id)
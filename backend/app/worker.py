@@ -0,0 +1,49 @@
+"""
+Job worker entry point (workflow events, webhooks, webhook outbox, trail runs,
+SCHEDULER trails, trail run log flush/retention).
+
+    python -m app.worker [--concurrency N] [--poll-interval SECONDS]
+
+Run as many worker processes as needed: jobs are claimed with
+FOR UPDATE SKIP LOCKED, so workers never pick up the same job.
+"""
+import asyncio
+import argparse
+import logging
+from app.core.config import settings
+from app.shared import database
+from app.system import models as models_system # noqa: F401 (mappers)
+from app.engine.metadata import models as models_meta, data_models # noqa: F401 (mappers)
+from app.core.http_client import http_pool
+from app.engine.services.job_queue import JobWorker
+from app.engine.services import workflow_service # noqa: F401 (registers job handlers)
+from app.services import webhook_service # noqa: F401 (registers job handlers)
+from app.engine.services import trail_scheduler # noqa: F401 (registers the scheduler tick)
+from app.engine.services.trail_run_log import trail_run_log # registers the run log flush/purge tasks
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("worker")
+
+def main():
+    parser = argparse.ArgumentParser(description="Background job worker")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+    parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    worker = JobWorker(concurrency=args.concurrency, poll_interval=args.poll_interval)
+
+    async def run():
+        try:
+            await worker.run()
+        finally:
+            await http_pool.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        http_pool.close()
+        trail_run_log.flush()
+        database.engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Latency benchmark for the request path through TenantMiddleware.
+
+Fires concurrent authenticated requests at a running backend and prints
+p50/p95/p99. Run it against the same endpoint before and after a change:
+
+    python scripts/bench_middleware.py --url http://localhost:8000/api/engine/object/clientes?limit=1 \
+        --token <JWT> --slug <tenant> --concurrency 64 --requests 5000
+
+Use a streaming endpoint (e.g. /object/<slug>/export) with --stream to
+measure time-to-first-byte instead of full response time.
+"""
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import httpx
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run(args):
+    headers = {}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+    if args.slug:
+        headers["X-Tenant-Slug"] = args.slug
+    if args.api_key:
+        headers["X-API-Key"] = args.api_key
+
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=args.timeout) as client:
+        # Aquecimento (conexões, caches)
+        for _ in range(min(args.concurrency, 20)):
+            await client.get(args.url)
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    if args.stream:
+                        async with client.stream("GET", args.url) as response:
+                            async for _ in response.aiter_raw():
+                                break
+                    else:
+                        response = await client.get(args.url)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+
+    print(f"requests={len(latencies)} errors={errors} concurrency={args.concurrency} elapsed={elapsed:.2f}s rps={len(latencies) / elapsed:.0f}")
+    print(f"mean={statistics.mean(latencies):.1f}ms p50={percentile(latencies, 50):.1f}ms "
+          f"p95={percentile(latencies, 95):.1f}ms p99={percentile(latencies, 99):.1f}ms max={max(latencies):.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--token")
+    parser.add_argument("--slug")
+    parser.add_argument("--api-key")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--stream", action="store_true", help="Measure time to first byte")
+    args = parser.parse_args()
+    if args.requests < 1 or args.concurrency < 1:
+        sys.exit("--requests and --concurrency must be positive")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measures the cost of the per-request `SET search_path` that get_db used to run.
+
+Compares, on the app engine (same pool and connect options), N iterations of:
+  - legacy:       checkout -> SET search_path TO public -> SELECT 1 -> close
+  - current:      checkout -> SELECT 1 -> close (search_path fixed at connect time)
+  - tenant-local: checkout -> SET LOCAL search_path (every transaction) -> SELECT 1 -> close
+  - tenant:       checkout -> SELECT 1 -> close (path cached per pooled connection)
+  - switch:       alternating tenant/system sessions (worst case: one SET per transaction)
+
+    python scripts/bench_search_path.py --iterations 2000 --schema tenant_demo
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from sqlalchemy import text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.shared import database
+
+def measure(label, iterations, fn):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:12} mean={statistics.mean(samples):.3f}ms p50={samples[len(samples) // 2]:.3f}ms p99={p99:.3f}ms")
+
+def legacy():
+    db = database.SessionSys()
+    try:
+        db.execute(text("SET search_path TO public"))
+        db.execute(text("SELECT 1")).scalar()
+    finally:
+        db.close()
+
+def current():
+    db = database.SessionSys()
+    try:
+        db.execute(text("SELECT 1")).scalar()
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--schema", help="Tenant schema for the tenant case (e.g. tenant_demo)")
+    args = parser.parse_args()
+
+    search_path = database.tenant_search_path(args.schema) if args.schema else None
+
+    def tenant_local():
+        db = database.SessionSys()
+        try:
+            db.execute(text(f"SET LOCAL search_path TO {search_path}"))
+            db.execute(text("SELECT 1")).scalar()
+        finally:
+            db.close()
+
+    def tenant():
+        db = database.SessionCrm()
+        try:
+            database.set_search_path(db, search_path)
+            db.execute(text("SELECT 1")).scalar()
+        finally:
+            db.close()
+
+    turn = [0]
+    def switch():
+        turn[0] += 1
+        (tenant if turn[0] % 2 else current)()
+
+    current() # Aquecimento do pool
+    measure("legacy", args.iterations, legacy)
+    measure("current", args.iterations, current)
+    if args.schema:
+        measure("tenant-local", args.iterations, tenant_local)
+        measure("tenant", args.iterations, tenant)
+        measure("switch", args.iterations, switch)
+
+if __name__ == "__main__":
+    main()
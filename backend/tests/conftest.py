@@ -0,0 +1 @@
+import app.main  # noqa: F401 - registra todos os models (relationships por nome) antes dos testes
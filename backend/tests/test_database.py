@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+from app.shared import database
+from app.shared.database import DEFAULT_SEARCH_PATH, _apply_search_path, tenant_search_path
+
+TENANT = tenant_search_path("tenant_acme")
+
+
+class FakeDBAPIConnection:
+    """psycopg2: autocommit só muda fora de transação; registra o que cada cursor executa."""
+
+    def __init__(self, log):
+        self.log = log
+        self.in_transaction = False
+        self._autocommit = False
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        if self.in_transaction:
+            raise RuntimeError("set_session cannot be used inside a transaction")
+        self._autocommit = value
+
+    def cursor(self):
+        return SimpleNamespace(execute=lambda sql: self.log.append((sql, self._autocommit)), close=lambda: None)
+
+
+class FakeConnection:
+    """Connection do pool: info persiste entre checkouts da mesma conexão."""
+
+    def __init__(self):
+        self.log = []
+        self.info = {}
+        self.connection = SimpleNamespace(dbapi_connection=FakeDBAPIConnection(self.log))
+
+    def exec_driver_sql(self, sql):
+        self.log.append((sql, False))
+
+
+def begin(conn, search_path=None):
+    session = SimpleNamespace(info={"search_path": search_path} if search_path else {})
+    _apply_search_path(session, None, conn)
+
+
+def test_set_only_when_the_pooled_connection_is_on_another_path():
+    conn = FakeConnection()
+
+    begin(conn) # conexão nova já está no public (parâmetro de startup)
+    assert conn.log == []
+
+    begin(conn, TENANT)
+    begin(conn, TENANT) # mesmo tenant na mesma conexão: sem round-trip
+    assert conn.log == [(f"SET search_path TO {TENANT}", True)] # autocommit: sobrevive a rollback
+    assert conn.connection.dbapi_connection.autocommit is False
+
+    begin(conn) # sessão de sistema depois do tenant: volta ao public
+    assert conn.log[-1] == (f"SET search_path TO {DEFAULT_SEARCH_PATH}", True)
+    assert conn.info["search_path"] == DEFAULT_SEARCH_PATH
+
+
+def test_falls_back_to_set_local_inside_a_transaction():
+    conn = FakeConnection()
+    conn.connection.dbapi_connection.in_transaction = True
+
+    begin(conn, TENANT)
+    begin(conn, TENANT)
+
+    assert conn.log == [(f"SET LOCAL search_path TO {TENANT}", False)] * 2
+    assert "search_path" not in conn.info # SET LOCAL acaba com a transação: nada em cache
+
+
+def test_set_search_path_mid_transaction_is_local():
+    executed = []
+    db = SimpleNamespace(info={}, in_transaction=lambda: True, execute=lambda stmt: executed.append(str(stmt)))
+    database.set_search_path(db, TENANT)
+    assert db.info["search_path"] == TENANT
+    assert executed == [f"SET LOCAL search_path TO {TENANT}"]
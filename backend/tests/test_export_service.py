@@ -0,0 +1,89 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.engine import formulas
+from app.engine.services import export_service
+from app.engine.services.export_service import ExportService
+
+
+class FakeQuery:
+    """Imita query.with_entities(...).execution_options(...).yield_per(n)."""
+
+    def __init__(self, rows):
+        self.session = object()
+        self.rows = rows
+
+    def with_entities(self, *cols):
+        return self
+
+    def execution_options(self, **opts):
+        assert opts == {"stream_results": True}
+        return self
+
+    def yield_per(self, n):
+        return iter(self.rows)
+
+
+class FakeEngine:
+    instances = []
+
+    def __init__(self, session, tenant_id):
+        self.calls = 0
+        FakeEngine.instances.append(self)
+
+    def evaluate_many(self, formulas_by_name, contexts, user_context, current_entity_id=None):
+        self.calls += 1
+        return [{"dobro": ctx["n"] * 2} for ctx in contexts]
+
+
+def rows(count):
+    created = datetime(2024, 1, 1)
+    return [SimpleNamespace(id=i, data={"n": i, "tags": ["a"]}, created_at=created) for i in range(count)]
+
+
+def test_virtuals_computed_per_chunk_with_fresh_engine(monkeypatch):
+    monkeypatch.setattr(export_service, "EXPORT_CHUNK_SIZE", 2)
+    monkeypatch.setattr(formulas, "FormulaEngine", FakeEngine)
+    FakeEngine.instances = []
+    service = ExportService("t1", "e1", ["id", "n", "dobro"], {"dobro": "[n] * 2"}, None)
+
+    chunks = list(service.iter_chunks(FakeQuery(rows(5))))
+
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert [flat["dobro"] for c in chunks for flat in c] == [0, 2, 4, 6, 8]
+    # um engine por bloco: refs pré-carregadas não crescem com o export
+    assert len(FakeEngine.instances) == 3
+
+
+def test_virtual_failure_exports_nulls(monkeypatch):
+    class BrokenEngine(FakeEngine):
+        def evaluate_many(self, *args, **kwargs):
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(formulas, "FormulaEngine", BrokenEngine)
+    service = ExportService("t1", "e1", ["id", "dobro"], {"dobro": "[n] * 2"}, None)
+    [chunk] = list(service.iter_chunks(FakeQuery(rows(2))))
+    assert [flat["dobro"] for flat in chunk] == [None, None]
+
+
+def test_csv_has_bom_header_and_flat_cells():
+    service = ExportService("t1", "e1", ["id", "tags", "created_at", "falta"], {}, None)
+    body = b"".join(service.stream("csv", FakeQuery(rows(2)))).decode("utf-8")
+    lines = body.splitlines()
+    assert lines[0] == "\ufeffid,tags,created_at,falta"
+    assert lines[1] == '0,"[""a""]",2024-01-01T00:00:00,'
+
+
+def test_ndjson_one_object_per_line():
+    service = ExportService("t1", "e1", ["id", "n"], {}, None)
+    body = b"".join(service.stream("ndjson", FakeQuery(rows(3)))).decode("utf-8")
+    assert [json.loads(line) for line in body.splitlines()] == [{"id": str(i), "n": i} for i in range(3)]
+
+
+def test_unknown_format():
+    service = ExportService("t1", "e1", ["id"], {}, None)
+    with pytest.raises(ValueError, match="pdf"):
+        service.stream("pdf", FakeQuery([]))
@@ -0,0 +1,87 @@
+import ast
+
+import pytest
+
+from app.engine.formula_sql import (
+    UntranslatableFormula, compile_filter, numeric_column, sql_json_key, text_column,
+)
+from app.engine.formulas import STATIC_GLOBALS, compile_formula
+
+
+def fold(node):
+    """Avalia nós independentes da linha (o FormulaEngine faz isso no contexto pai)."""
+    code = compile(ast.fix_missing_locations(ast.Expression(node)), "<fold>", "eval")
+    return eval(code, {**STATIC_GLOBALS, "USER": lambda: "u-1"})
+
+
+def where(formula, this_context=None):
+    return compile_filter(compile_formula(formula).tree, this_context, fold)
+
+
+def test_text_equality_binds_value():
+    sql, params = where("[status] = 'aberto'")
+    assert sql == "((data->>'status') = :f0)"
+    assert params == {"f0": "aberto"}
+
+
+def test_numeric_comparison_uses_numeric_column():
+    sql, params = where("[valor] > 100")
+    assert sql == f"({numeric_column('valor')} > :f0)"
+    assert params == {"f0": 100}
+
+
+def test_value_on_the_left_is_flipped():
+    sql, _ = where("100 < [valor]")
+    assert sql == f"({numeric_column('valor')} > :f0)"
+
+
+def test_boolean_and_null():
+    assert where("[ativo] = True")[0] == "((data->'ativo') = 'true'::jsonb)"
+    assert where("[dono] = None")[0] == "((data->>'dono') IS NULL)"
+
+
+def test_this_reference_and_folded_function():
+    sql, params = where("AND([cliente] = [_THIS].[id], [dono] = USER())", {"id": "c-9"})
+    assert sql == "(((data->>'cliente') = :f0) AND ((data->>'dono') = :f1))"
+    assert params == {"f0": "c-9", "f1": "u-1"}
+
+
+def test_in_list_and_array_column():
+    sql, params = where("IN([status], SPLIT('a,b', ','))")
+    assert sql == "((data->>'status') = ANY(:f0))"
+    assert params == {"f0": ["a", "b"]}
+    sql, params = where("IN('vip', [tags])")
+    assert sql == "((data->'tags') @> CAST(:f0 AS jsonb))"
+    assert params == {"f0": '["vip"]'}
+
+
+def test_blank_and_not():
+    assert where("ISBLANK([email])")[0] == "((data->>'email') IS NULL OR (data->>'email') = '')"
+    assert where("NOT([status] = 'x')")[0] == "(((data->>'status') = :f0) IS NOT TRUE)"
+
+
+def test_string_ordering_uses_c_collation():
+    assert 'COLLATE "C"' in where("[nome] < 'm'")[0]
+
+
+def test_constant_conditions_fold():
+    assert where("1 = 1")[0] == "TRUE"
+    assert where("ISBLANK('')")[0] == "TRUE"
+
+
+@pytest.mark.parametrize("formula", [
+    "[a] < [b]",           # ordenação entre colunas
+    "LEN([nome]) > 3",     # função da linha
+    "IN([a], [b])",        # IN entre colunas
+    "[ativo] > True",      # ordenação booleana
+])
+def test_untranslatable(formula):
+    with pytest.raises(UntranslatableFormula):
+        where(formula)
+
+
+def test_json_key_is_escaped():
+    assert sql_json_key("o'brien") == "'o''brien'"
+    assert text_column("id") == "CAST(id AS text)"
+    with pytest.raises(UntranslatableFormula):
+        sql_json_key("")
@@ -0,0 +1,82 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.engine import formulas
+from app.engine.formulas import FormulaEngine, compile_formula
+from app.engine.metadata.cache import TenantMetadata
+from app.engine.metadata.models import MetaEntity
+
+TENANT_ID = uuid.uuid4()
+
+
+def test_compile_formula_is_cached():
+    first = compile_formula("[valor] * 2")
+    assert compile_formula("[valor] * 2") is first
+    assert first.code is not None
+    assert "valor" in first.columns
+
+
+def test_invalid_formula_is_cached_with_error():
+    compiled = compile_formula("[valor] * ")
+    assert compiled.code is None and compiled.error
+    assert compile_formula("[valor] * ") is compiled
+
+
+def test_count_select_is_pushed_down():
+    compiled = compile_formula("COUNT(SELECT('pedidos', 'id', [status] = 'aberto'))")
+    assert "SELECT_COUNT" in compiled.functions
+    assert "COUNT" not in compiled.functions
+
+
+class FakeSession:
+    """Responde ao SELECT em lote do prefetch; conta as consultas."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, statement, params=None):
+        self.queries.append((str(statement), params))
+        return SimpleNamespace(fetchall=lambda: self.rows, scalar=lambda: None, fetchone=lambda: None)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    clientes = MetaEntity(id=uuid.uuid4(), tenant_id=TENANT_ID, slug="clientes", display_name="Clientes", is_system=False)
+    meta = TenantMetadata(1, [clientes], [])
+    monkeypatch.setattr(formulas.metadata_cache, "get", lambda db, tenant_id: meta)
+    db = FakeSession([
+        SimpleNamespace(id=uuid.uuid4(), data={"codigo": "C1", "nome": "Ana"}),
+        SimpleNamespace(id=uuid.uuid4(), data={"codigo": "C2", "nome": "Bia"}),
+    ])
+    return FormulaEngine(db, str(TENANT_ID)), db
+
+
+def test_evaluate_many_prefetches_once_and_clears(engine):
+    engine, db = engine
+    rows = [{"cliente": "C1"}, {"cliente": "C2"}, {"cliente": "C9"}]
+
+    results = engine.evaluate_many({"nome": "LOOKUP([cliente], 'clientes', 'codigo', 'nome')"}, rows)
+
+    assert [r["nome"] for r in results] == ["Ana", "Bia", None]
+    assert len(db.queries) == 1 # uma consulta para a página inteira
+    assert engine._prefetched == {} # escopo do lote: nada fica no engine
+
+
+def test_batch_scope_clears_on_error(engine):
+    engine, _ = engine
+    with pytest.raises(RuntimeError):
+        with engine.batch(["LOOKUP([cliente], 'clientes', 'codigo', 'nome')"], [{"cliente": "C1"}]):
+            assert engine._prefetched
+            raise RuntimeError("boom")
+    assert engine._prefetched == {}
+
+
+def test_plain_arithmetic_and_functions(engine):
+    engine, db = engine
+    assert engine.evaluate("[valor] * 2 + 1", {"valor": 10}) == 21
+    assert engine.evaluate("IF([valor] > 5, 'alto', 'baixo')", {"valor": 10}) == "alto"
+    assert engine.evaluate("CONCATENATE([a], '-', [b])", {"a": "x", "b": "y"}) == "x-y"
+    assert db.queries == []
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.http_client import CircuitOpenError, OutboundHttp
+
+HOST = "api.example.com:443"
+URL = "https://api.example.com/hook"
+
+
+def pool(**kwargs):
+    return OutboundHttp(breaker_threshold=kwargs.pop("threshold", 2), breaker_cooldown=kwargs.pop("cooldown", 30.0), **kwargs)
+
+
+def fail(http, probe=False):
+    http._release(HOST, time.perf_counter(), probe, error="ConnectError: refused")
+
+
+def test_threshold_opens_and_rejects():
+    http = pool()
+    for _ in range(2):
+        fail(http, http._acquire(HOST))
+    assert http.snapshot()[HOST]["state"] == "open"
+    with pytest.raises(CircuitOpenError):
+        http._acquire(HOST)
+    assert http.snapshot()[HOST]["rejected"] == 1
+
+
+def test_half_open_allows_a_single_probe():
+    http = pool(cooldown=0)
+    for _ in range(2):
+        fail(http, http._acquire(HOST))
+
+    assert http._acquire(HOST) is True # probe
+    assert http.snapshot()[HOST]["state"] == "half_open"
+    with pytest.raises(CircuitOpenError):
+        http._acquire(HOST)
+
+
+def test_only_probe_release_clears_probe_flag():
+    http = pool(cooldown=0)
+    slow = http._acquire(HOST) # começou com o circuito fechado
+    for _ in range(2):
+        fail(http, http._acquire(HOST))
+    probe = http._acquire(HOST)
+    assert probe is True and slow is False
+
+    # A chamada antiga termina com sucesso: não fecha o circuito nem libera outra sonda
+    http._release(HOST, time.perf_counter(), slow, status=200)
+    assert http.snapshot()[HOST]["state"] == "half_open"
+    with pytest.raises(CircuitOpenError):
+        http._acquire(HOST)
+
+    http._release(HOST, time.perf_counter(), probe, status=200)
+    assert http.snapshot()[HOST]["state"] == "closed"
+    assert http._acquire(HOST) is False
+
+
+def test_failed_probe_reopens():
+    http = pool(cooldown=0)
+    for _ in range(2):
+        fail(http, http._acquire(HOST))
+    fail(http, http._acquire(HOST))
+    assert http.snapshot()[HOST]["state"] == "open"
+
+
+def test_request_sync_counts_5xx_and_429_as_failures():
+    statuses = iter([500, 429, 200])
+    http = pool(threshold=3)
+    http._sync_client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(next(statuses))))
+
+    assert [http.request_sync("POST", URL).status_code for _ in range(3)] == [500, 429, 200]
+    snapshot = http.snapshot()[HOST]
+    assert snapshot["failures"] == 2
+    assert snapshot["consecutive_failures"] == 0
+    assert snapshot["state"] == "closed"
+
+
+def test_cancelled_probe_frees_the_half_open_slot():
+    http = pool(cooldown=0)
+    for _ in range(2):
+        fail(http, http._acquire(HOST))
+
+    async def hang(request):
+        await asyncio.sleep(60)
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(hang))
+        http._loops[asyncio.get_running_loop()] = (client, {})
+        task = asyncio.create_task(http.request("POST", URL))
+        await asyncio.sleep(0.01)
+        assert http.snapshot()[HOST]["in_flight"] == 1 # a sonda está em voo
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await client.aclose()
+
+    asyncio.run(scenario())
+    snapshot = http.snapshot()[HOST]
+    assert snapshot["in_flight"] == 0
+    # Cancelamento não conta como falha: segue half-open e a próxima chamada vira a sonda
+    assert snapshot["state"] == "half_open" and snapshot["failures"] == 2
+    assert http._acquire(HOST) is True
@@ -0,0 +1,76 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.engine.services.import_service import RowError, _parse_number, coerce_value, read_rows
+
+
+def field(field_type, name="campo"):
+    return SimpleNamespace(name=name, field_type=field_type)
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("1.234,56", 1234.56),
+    ("1,234.56", 1234.56),
+    ("R$ 10,5", 10.5),
+    ("42", 42.0),
+    (7, 7),
+    (2.5, 2.5),
+])
+def test_parse_number(raw, expected):
+    assert _parse_number(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [True, "abc", "", "nan", "inf", "-Infinity", "1e400", float("nan")])
+def test_parse_number_rejects(raw):
+    with pytest.raises(ValueError):
+        _parse_number(raw)
+
+
+@pytest.mark.parametrize("field_type, raw, expected", [
+    ("currency", "1.000,00", 1000.0),
+    ("integer", "12", 12),
+    ("boolean", "Sim", True),
+    ("boolean", "não", False),
+    ("date", "31/12/2026", "2026-12-31"),
+    ("date", "2026-12-31", "2026-12-31"),
+    ("date", "31/12/2026 08:30", "2026-12-31T08:30:00"),
+    ("date", datetime(2026, 1, 2), "2026-01-02"),
+    ("date", date(2026, 1, 2), "2026-01-02"),
+    ("list_ref", "a; b, c", ["a", "b", "c"]),
+    ("list_ref", '["a", "b"]', ["a", "b"]),
+    ("text", 12.0, "12"),
+    ("text", "  nome  ", "nome"),
+])
+def test_coerce_value(field_type, raw, expected):
+    assert coerce_value(field(field_type), raw) == expected
+
+
+@pytest.mark.parametrize("field_type, raw", [("integer", "1,5"), ("integer", "inf"), ("boolean", "talvez"), ("date", "32/01/2026"), ("number", "x"), ("number", "NaN")])
+def test_coerce_value_raises_row_error(field_type, raw):
+    with pytest.raises(RowError) as exc:
+        coerce_value(field(field_type, "valor"), raw)
+    assert exc.value.field == "valor"
+
+
+def test_read_rows_keeps_file_line_numbers(tmp_path):
+    path = tmp_path / "dados.csv"
+    path.write_text("nome;valor\nAna;1\n\n;\nBia;2\n\"Caio\nSilva\";3\nDora;4\n", encoding="utf-8")
+
+    rows = [(line_no, row["nome"]) for line_no, row in read_rows(str(path), "dados.csv")]
+
+    assert rows == [(2, "Ana"), (5, "Bia"), (7, "Caio\nSilva"), (8, "Dora")]
+
+
+def test_read_rows_xlsx_line_numbers(tmp_path):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    for values in (["nome", "valor"], ["Ana", 1], [None, None], ["Bia", 2]):
+        ws.append(values)
+    path = tmp_path / "dados.xlsx"
+    wb.save(path)
+
+    assert [(n, r["nome"]) for n, r in read_rows(str(path), "dados.xlsx")] == [(2, "Ana"), (4, "Bia")]
@@ -0,0 +1,87 @@
+import uuid
+from types import SimpleNamespace
+
+from app.engine.services import index_manager
+from app.engine.services.index_manager import IndexManager
+
+ENTITY_ID = uuid.uuid4()
+
+
+def field(name="valor", field_type="text", filterable=False, sortable=False, virtual=False, ref_target=None):
+    return SimpleNamespace(id=uuid.uuid4(), entity_id=ENTITY_ID, name=name, field_type=field_type, is_virtual=virtual,
+                           is_filterable=filterable, is_sortable=sortable, ref_target=ref_target)
+
+
+def test_filterable_and_sortable_indexes_are_partial():
+    f = field("valor", "number", filterable=True, sortable=True)
+    f_name, s_name, _ = IndexManager.index_names(f.id)
+    indexes = IndexManager.desired_indexes(f)
+
+    assert set(indexes) == {f_name, s_name}
+    assert "((data->>'valor'))" in indexes[f_name]
+    assert "CAST((data->>'valor') AS numeric)" in indexes[s_name]
+    assert indexes[s_name].rstrip().endswith(f"WHERE entity_id = '{ENTITY_ID}'")
+    assert ", created_at, id)" in indexes[s_name] # mesma ordem do keyset
+
+
+def test_ref_gets_filter_index_and_list_ref_gets_gin():
+    ref = field("cliente", "ref", ref_target="clientes")
+    assert list(IndexManager.desired_indexes(ref)) == [IndexManager.index_names(ref.id)[0]]
+
+    tags = field("tags", "list_ref", filterable=True)
+    (name, ddl), = IndexManager.desired_indexes(tags).items()
+    assert name == IndexManager.index_names(tags.id)[2]
+    assert "USING gin ((data->'tags') jsonb_path_ops)" in ddl
+
+
+def test_virtual_and_plain_fields_have_no_indexes():
+    assert IndexManager.desired_indexes(field(virtual=True, filterable=True)) == {}
+    assert IndexManager.desired_indexes(field()) == {}
+
+
+class FakeConnection:
+    def __init__(self, existing):
+        self.existing = existing
+        self.statements = []
+
+    def execution_options(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        rows = [(name, valid) for name, valid in self.existing.items() if name in (params or {}).get("names", [])]
+        return SimpleNamespace(fetchall=lambda: rows)
+
+
+def test_sync_field_drops_stale_and_invalid_and_creates_missing(monkeypatch):
+    f = field("valor", "number", filterable=True)
+    f_name, s_name, g_name = IndexManager.index_names(f.id)
+    # s: não é mais desejado; f: CREATE CONCURRENTLY falhou (inválido)
+    conn = FakeConnection({f_name: False, s_name: True})
+    monkeypatch.setattr(index_manager, "engine", SimpleNamespace(connect=lambda: conn))
+
+    IndexManager.sync_field(f)
+
+    ddl = conn.statements[1:]
+    assert f"DROP INDEX CONCURRENTLY IF EXISTS public.{f_name}" in ddl
+    assert f"DROP INDEX CONCURRENTLY IF EXISTS public.{s_name}" in ddl
+    assert any(s.startswith(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {f_name}") for s in ddl)
+    assert not any(g_name in s for s in ddl)
+
+
+def test_sync_field_keeps_valid_indexes(monkeypatch):
+    f = field("valor", "number", filterable=True)
+    f_name = IndexManager.index_names(f.id)[0]
+    conn = FakeConnection({f_name: True})
+    monkeypatch.setattr(index_manager, "engine", SimpleNamespace(connect=lambda: conn))
+
+    IndexManager.sync_field(f)
+
+    assert len(conn.statements) == 1 # só a consulta a pg_index
@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.engine.services import job_queue
+from app.engine.services.job_queue import JobQueue, JobWorker, backoff_seconds
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+        self.rowcount = len(rows)
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeSession:
+    """Registra (sql, params) executados; devolve as linhas configuradas."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.executed = []
+        self.commits = 0
+
+    def execute(self, statement, params=None):
+        self.executed.append((str(statement), params))
+        return FakeResult(self.rows)
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_SECONDS", 10)
+    monkeypatch.setattr(settings, "JOB_RETRY_MAX_SECONDS", 60)
+    assert 10 <= backoff_seconds(1) <= 11
+    assert 40 <= backoff_seconds(3) <= 44
+    assert 60 <= backoff_seconds(10) <= 66
+
+
+def test_requeue_stale_dead_letters_exhausted_jobs():
+    db = FakeSession([SimpleNamespace(status="queued"), SimpleNamespace(status="dead"), SimpleNamespace(status="queued")])
+
+    assert JobQueue.requeue_stale(db) == (2, 1)
+    sql, params = db.executed[0]
+    assert "attempts >= max_attempts THEN 'dead'" in sql
+    assert params["cutoff"] < params["now"]
+    assert db.commits == 1
+
+
+def test_fail_dead_letters_at_max_attempts():
+    db = FakeSession()
+    assert JobQueue.fail(db, "job", 5, 5, "boom") == "dead"
+    assert JobQueue.fail(db, "job", 2, 5, "boom") == "queued"
+
+
+def test_heartbeat_refreshes_worker_jobs():
+    db = FakeSession()
+    JobQueue.heartbeat(db, ["host:1"])
+    sql, params = db.executed[0]
+    assert "SET locked_at = :now" in sql
+    assert params["workers"] == ["host:1"]
+
+
+def test_worker_heartbeats_while_job_runs(monkeypatch):
+    """O heartbeat segue enquanto um job longo roda e para quando o worker termina."""
+    monkeypatch.setattr(settings, "JOB_HEARTBEAT_INTERVAL", 0.01)
+    monkeypatch.setattr(job_queue, "PERIODIC_TASKS", [])
+    calls = {"heartbeat": 0, "completed": []}
+    job = SimpleNamespace(id="job-1", kind="test.slow", payload={}, attempts=1, max_attempts=5)
+    worker = JobWorker(concurrency=1, poll_interval=0.01, worker_id="w1")
+    claimed = []
+
+    def with_session(fn, *args):
+        if fn is JobQueue.claim:
+            if claimed:
+                return []
+            claimed.append(job)
+            return [job]
+        if fn is JobQueue.heartbeat:
+            calls["heartbeat"] += 1
+            return 1
+        if fn is JobQueue.complete:
+            calls["completed"].append(args[0])
+            return None
+        if fn is JobQueue.requeue_stale:
+            return 0, 0
+        raise AssertionError(fn)
+
+    async def slow(payload):
+        await asyncio.sleep(0.05)
+        worker.stop()
+
+    monkeypatch.setattr(worker, "_with_session", with_session)
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "test.slow", slow)
+
+    asyncio.run(asyncio.wait_for(worker.run(), timeout=2))
+
+    assert calls["completed"] == ["job-1"]
+    assert calls["heartbeat"] >= 2
+
+
+def test_job_failed_goes_dead_without_retry(monkeypatch):
+    monkeypatch.setattr(job_queue, "PERIODIC_TASKS", [])
+    job = SimpleNamespace(id="job-1", kind="test.final", payload={}, attempts=1, max_attempts=5)
+    worker = JobWorker(concurrency=1, poll_interval=0.01, worker_id="w1")
+    failed = []
+
+    def with_session(fn, *args):
+        if fn is JobQueue.claim:
+            worker.stop()
+            return [job] if not failed else []
+        if fn is JobQueue.fail:
+            failed.append(args)
+            return "dead"
+        return 0, 0
+
+    def final(payload):
+        raise job_queue.JobFailed("node n1 failed")
+
+    monkeypatch.setattr(worker, "_with_session", with_session)
+    monkeypatch.setitem(job_queue.JOB_HANDLERS, "test.final", final)
+
+    asyncio.run(asyncio.wait_for(worker.run(), timeout=2))
+
+    # attempts = max_attempts: JobQueue.fail manda para 'dead' em vez de reagendar
+    [(job_id, attempts, max_attempts, error)] = failed
+    assert (job_id, attempts, max_attempts) == ("job-1", 5, 5)
+    assert "node n1 failed" in error
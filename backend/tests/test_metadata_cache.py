@@ -0,0 +1,165 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.tenant_cache import LocalStore
+from app.engine.metadata import cache as cache_module
+from app.engine.metadata.cache import MetadataCache
+
+TENANT_ID = uuid.uuid4()
+ENTITY_ID = uuid.uuid4()
+
+
+class SharedStore(LocalStore):
+    """LocalStore compartilhado entre instâncias do cache (faz o papel do Redis)."""
+
+    shared = True
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeQuery:
+    def __init__(self, rows, on_load=None):
+        self.rows = rows
+        self.on_load = on_load
+
+    def filter(self, *args):
+        return self
+
+    def join(self, *args):
+        return self
+
+    def all(self):
+        if self.on_load:
+            self.on_load()
+        return list(self.rows)
+
+
+class FakeSession:
+    """Entidades/campos do tenant; conta as cargas (2 queries por carga)."""
+
+    def __init__(self):
+        self.entities = [entity("clientes", "Clientes")]
+        self.fields = [field("nome")]
+        self.queries = 0
+        self.on_load = None
+
+    def query(self, model):
+        self.queries += 1
+        rows = self.entities if model.__name__ == "MetaEntity" else self.fields
+        return FakeQuery(rows, self.on_load)
+
+    @property
+    def loads(self):
+        return self.queries // 2
+
+
+def entity(slug, display_name):
+    return SimpleNamespace(id=ENTITY_ID, tenant_id=TENANT_ID, slug=slug, display_name=display_name,
+                           is_system=False, icon=None, layout_config=None)
+
+
+def field(name, formula=None, is_virtual=False):
+    return SimpleNamespace(id=uuid.uuid4(), entity_id=ENTITY_ID, name=name, label=name, field_type="text",
+                           is_required=False, options=None, formula=formula, is_virtual=is_virtual,
+                           is_filterable=True, is_sortable=True)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_snapshot_is_reused_until_ttl(clock):
+    cache, db = MetadataCache(ttl_seconds=60), FakeSession()
+
+    first = cache.get(db, TENANT_ID)
+    clock.now += 59
+    assert cache.get(db, TENANT_ID) is first
+    assert db.loads == 1
+
+    clock.now += 1
+    assert cache.get(db, TENANT_ID) is not first
+    assert db.loads == 2
+
+
+def test_invalidate_bumps_version_and_reloads(clock):
+    cache, db = MetadataCache(ttl_seconds=60), FakeSession()
+    assert cache.get(db, TENANT_ID).entity_by_slug("clientes").display_name == "Clientes"
+
+    db.entities = [entity("clientes", "Clientes PJ")]
+    db.fields.append(field("total", formula="[a]+[b]"))
+    cache.invalidate(TENANT_ID)
+
+    meta = cache.get(db, TENANT_ID)
+    assert cache.version(TENANT_ID) == 1
+    assert meta.version == 1
+    assert meta.entity_by_name("Clientes PJ").slug == "clientes"
+    assert [f.name for f in meta.snapshot_fields(ENTITY_ID)] == ["total"]
+    assert db.loads == 2
+
+
+def test_invalidate_is_per_tenant(clock):
+    cache, db = MetadataCache(ttl_seconds=60), FakeSession()
+    other = uuid.uuid4()
+    cache.get(db, TENANT_ID)
+    cache.get(db, other)
+
+    cache.invalidate(other)
+    cache.get(db, TENANT_ID)
+    assert db.loads == 2
+
+    cache.invalidate()
+    assert cache.version(TENANT_ID) == 1 and cache.version(other) == 2
+
+
+def test_snapshot_built_during_invalidation_is_not_published(clock):
+    cache, db = MetadataCache(ttl_seconds=60), FakeSession()
+    db.on_load = lambda: cache.invalidate(TENANT_ID) if db.loads == 0 else None
+
+    stale = cache.get(db, TENANT_ID)
+    assert stale.version == 0
+
+    db.on_load = None
+    fresh = cache.get(db, TENANT_ID)
+    assert fresh is not stale and fresh.version == 1
+    assert cache.get(db, TENANT_ID) is fresh
+
+
+def test_local_store_invalidation_stays_in_process(clock):
+    store = LocalStore()
+    worker_a, worker_b = MetadataCache(ttl_seconds=60, store=store), MetadataCache(ttl_seconds=60, store=store)
+    db_a, db_b = FakeSession(), FakeSession()
+    worker_a.get(db_a, TENANT_ID)
+    stale = worker_b.get(db_b, TENANT_ID)
+
+    worker_a.invalidate(TENANT_ID)
+
+    # Sem store compartilhado, o outro worker só recarrega ao vencer o TTL
+    assert worker_b.get(db_b, TENANT_ID) is stale
+    clock.now += 60
+    assert worker_b.get(db_b, TENANT_ID) is not stale
+
+
+def test_shared_version_invalidates_other_workers(clock):
+    store = SharedStore()
+    worker_a, worker_b = MetadataCache(ttl_seconds=60, store=store), MetadataCache(ttl_seconds=60, store=store)
+    db_b = FakeSession()
+    stale = worker_b.get(db_b, TENANT_ID)
+    assert worker_b.get(db_b, TENANT_ID) is stale
+
+    worker_a.invalidate(TENANT_ID)
+
+    fresh = worker_b.get(db_b, TENANT_ID)
+    assert fresh is not stale
+    assert worker_b.get(db_b, TENANT_ID) is fresh
+    assert db_b.loads == 2
@@ -0,0 +1,154 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core import middleware
+from app.core.middleware import TenantMiddleware
+
+TENANT_ID = str(uuid.uuid4())
+
+
+class FakeTenantCache:
+    """Mesma interface do TenantCache usada pelo middleware, sem banco."""
+
+    def __init__(self):
+        self.tenants = {"acme": {"id": TENANT_ID}}
+        self.api_keys = {"svc-key": {"slug": "acme", "tenant_id": TENANT_ID}, "orphan-key": {"slug": None, "tenant_id": None}}
+        self.memberships = {("7", TENANT_ID): {"role": "editor"}}
+        self.defaults = {"7": "acme"}
+        self.calls = []
+
+    def tenant_for_api_key(self, key):
+        self.calls.append(("api_key", key))
+        return self.api_keys.get(key)
+
+    def tenant_by_slug(self, slug):
+        self.calls.append(("slug", slug))
+        return self.tenants.get(slug)
+
+    def membership_role(self, user_id, tenant_id):
+        self.calls.append(("membership", user_id, tenant_id))
+        return self.memberships.get((user_id, tenant_id))
+
+    def default_tenant_slug(self, user_id):
+        self.calls.append(("default", user_id))
+        return self.defaults.get(user_id)
+
+
+def fake_decode(token):
+    if token == "user-7":
+        return {"sub": "7"}
+    if token == "admin":
+        return {"sub": "1", "is_superuser": True}
+    raise ValueError("bad signature")
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = FakeTenantCache()
+    monkeypatch.setattr(middleware, "tenant_cache", cache)
+    monkeypatch.setattr(middleware, "decode_access_token", fake_decode)
+    return cache
+
+
+@pytest.fixture
+def client(cache):
+    app = FastAPI()
+    app.add_middleware(TenantMiddleware)
+
+    @app.get("/state")
+    def read_state(request: Request):
+        state = request.state
+        return {
+            "tenant_id": str(state.tenant_id) if state.tenant_id else None,
+            "tenant_slug": state.tenant_slug,
+            "role_name": state.role_name,
+            "user_id": getattr(state, "user_id", None),
+            "is_sysadmin": getattr(state, "is_sysadmin", None),
+            "tenant_schema": getattr(state, "tenant_schema", None),
+        }
+
+    @app.post("/auth/login")
+    def login(request: Request):
+        return {"tenant_slug": request.state.tenant_slug}
+
+    return TestClient(app)
+
+
+def test_api_key_propagates_service_context(client):
+    body = client.get("/state", headers={"X-API-Key": "svc-key"}).json()
+
+    assert body["tenant_slug"] == "acme"
+    assert body["tenant_id"] == TENANT_ID
+    assert body["user_id"] == 0
+    assert body["is_sysadmin"] is True
+
+
+def test_jwt_with_slug_sets_role_and_schema(client):
+    body = client.get("/state", headers={"Authorization": "Bearer user-7", "X-Tenant-Slug": "acme"}).json()
+
+    assert body == {
+        "tenant_id": TENANT_ID,
+        "tenant_slug": "acme",
+        "role_name": "editor",
+        "user_id": "7",
+        "is_sysadmin": False,
+        "tenant_schema": "tenant_acme",
+    }
+
+
+def test_jwt_without_slug_resolves_default_tenant(client, cache):
+    body = client.get("/state", headers={"Authorization": "Bearer user-7"}).json()
+
+    assert body["tenant_slug"] == "acme"
+    assert ("default", "7") in cache.calls
+
+
+def test_sysadmin_skips_membership_check(client, cache):
+    body = client.get("/state", headers={"Authorization": "Bearer admin", "X-Tenant-Slug": "acme"}).json()
+
+    assert body["role_name"] == "sysadmin"
+    assert body["tenant_slug"] == "acme"
+    assert not [c for c in cache.calls if c[0] == "membership"]
+
+
+@pytest.mark.parametrize("headers,status", [
+    ({"X-API-Key": "nope"}, 401),
+    ({"X-API-Key": "orphan-key"}, 404),
+    ({"Authorization": "Bearer user-7", "X-Tenant-Slug": "ghost"}, 404),
+])
+def test_rejections(client, headers, status):
+    assert client.get("/state", headers=headers).status_code == status
+
+
+def test_non_member_is_denied(client, cache):
+    cache.tenants["other"] = {"id": str(uuid.uuid4())}
+
+    response = client.get("/state", headers={"Authorization": "Bearer user-7", "X-Tenant-Slug": "other"})
+
+    assert response.status_code == 403
+
+
+def test_invalid_jwt_is_logged_not_printed(client, caplog, capsys):
+    body = client.get("/state", headers={"Authorization": "Bearer broken"}).json()
+
+    assert body["user_id"] is None
+    assert body["tenant_slug"] is None
+    assert "Invalid JWT" in caplog.text
+    assert capsys.readouterr().out == ""
+
+
+def test_public_routes_skip_resolution(client, cache):
+    response = client.post("/auth/login", headers={"X-Tenant-Slug": "acme"})
+
+    assert response.json() == {"tenant_slug": None}
+    assert cache.calls == []
+
+
+def test_state_is_initialized_without_auth_headers(client, cache):
+    body = client.get("/state").json()
+
+    assert body["tenant_id"] is None and body["tenant_slug"] is None and body["role_name"] is None
+    assert cache.calls == []
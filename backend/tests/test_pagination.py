@@ -0,0 +1,166 @@
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.engine.api import data
+from app.engine.metadata.cache import TenantMetadata
+from app.engine.metadata.models import MetaEntity, MetaField
+from app.engine.pagination import (
+    InvalidCursor, SortKey, decode_cursor, encode_cursor, sort_key,
+)
+from app.shared import database
+
+TENANT_ID = uuid.uuid4()
+ENTITY_ID = uuid.uuid4()
+
+
+def test_cursor_roundtrip_returns_python_types():
+    created_at = datetime(2026, 1, 2, 3, 4, 5, 678901)
+    record_id = uuid.uuid4()
+    key, decoded_at, decoded_id = decode_cursor(encode_cursor(Decimal("10.50"), created_at, record_id))
+    assert key == "10.50"
+    assert decoded_at == created_at
+    assert decoded_id == record_id
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", encode_cursor(1, "ontem", uuid.uuid4()), encode_cursor(1, datetime.now(), "x")])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("sort_by, field_type, raw, expected", [
+    ("updated_at", None, "2026-01-02T03:04:05", datetime(2026, 1, 2, 3, 4, 5)),
+    ("id", None, "7b7e5cf4-6a52-4a8f-bb0c-2a1f7f1a9c11", uuid.UUID("7b7e5cf4-6a52-4a8f-bb0c-2a1f7f1a9c11")),
+    ("valor", "number", 10.5, Decimal("10.5")),
+    ("nome", "text", "Ana", "Ana"),
+])
+def test_after_binds_key_as_cast_type(sort_by, field_type, raw, expected):
+    key = sort_key(sort_by, "asc", field_type)
+    condition, params = key.after((raw, datetime(2026, 1, 1), uuid.uuid4()))
+    assert params["cursor_key"] == expected
+    assert type(params["cursor_key"]) is type(expected)
+    assert ":cursor_key" in condition
+
+
+def test_after_rank_key_is_float():
+    _, params = SortKey("rank", "CAST({} AS real)", descending=True).after((0.25, datetime(2026, 1, 1), uuid.uuid4()))
+    assert params["cursor_key"] == 0.25 and isinstance(params["cursor_key"], float)
+
+
+def test_after_rejects_key_of_wrong_type():
+    with pytest.raises(InvalidCursor):
+        sort_key("valor", "asc", "number").after(("abc", datetime(2026, 1, 1), uuid.uuid4()))
+
+
+def test_after_null_key_skips_key_param():
+    condition, params = sort_key("valor", "desc", "number").after((None, datetime(2026, 1, 1), uuid.uuid4()))
+    assert "cursor_key" not in params
+    assert "IS NULL" in condition
+
+
+# --- list_records paginado (sessão assíncrona falsa: captura SQL + parâmetros) ---
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class Row(tuple):
+    """Linha de select(EntityRecord, sort_key): row[0] é o registro, row.sort_key a chave."""
+
+    def __new__(cls, record, key):
+        row = super().__new__(cls, (record, key))
+        row.sort_key = key
+        return row
+
+
+class FakeAsyncSession:
+    """Responde ao SELECT de entity_records com as linhas após o cursor, em ordem (valor, created_at, id) DESC."""
+
+    def __init__(self, records):
+        self.records = records
+        self.statements = []
+
+    async def run_sync(self, fn, *args):
+        return fn(None, *args)
+
+    async def execute(self, statement):
+        compiled = statement.compile(dialect=asyncpg.dialect())
+        params = compiled.params
+        self.statements.append((str(compiled), params))
+        rows = sorted(((Decimal(str(r.data["valor"])), r.created_at, r.id), r) for r in self.records)[::-1]
+        if "cursor_key" in params:
+            after = (params["cursor_key"], params["cursor_created_at"], params["cursor_id"])
+            rows = [(key, r) for key, r in rows if key < after]
+        return FakeResult([Row(r, key[0]) for key, r in rows])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    entity = MetaEntity(id=ENTITY_ID, tenant_id=TENANT_ID, slug="vendas", display_name="Vendas", is_system=False)
+    field = MetaField(id=uuid.uuid4(), entity_id=ENTITY_ID, name="valor", label="Valor", field_type="number", is_virtual=False)
+    meta = TenantMetadata(1, [entity], [field])
+    monkeypatch.setattr(data.metadata_cache, "get", lambda db, tenant_id: meta)
+
+    base = datetime(2026, 1, 1)
+    records = [
+        SimpleNamespace(id=uuid.uuid4(), created_at=base + timedelta(minutes=i), data={"valor": v})
+        for i, v in enumerate([30, 10, 20, 10, 50])
+    ]
+    session = FakeAsyncSession(records)
+
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def tenant(request: Request, call_next):
+        request.state.tenant_id = TENANT_ID
+        return await call_next(request)
+
+    app.include_router(data.router)
+
+    async def get_session():
+        yield session
+
+    app.dependency_overrides[database.get_async_db] = get_session
+    return TestClient(app), session
+
+
+def test_list_records_pages_with_cursor(client):
+    client, session = client
+    seen = []
+    cursor = None
+    for _ in range(5):
+        params = {"sort_by": "valor", "sort_dir": "desc", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/object/vendas", params=params)
+        assert response.status_code == 200, response.text
+        seen.extend(r["valor"] for r in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == [50, 30, 20, 10, 10]
+
+    # Parâmetros do cursor chegam ao asyncpg com o tipo do CAST
+    sql, params = session.statements[-1]
+    assert isinstance(params["cursor_created_at"], datetime)
+    assert isinstance(params["cursor_id"], uuid.UUID)
+    assert isinstance(params["cursor_key"], Decimal)
+    assert "VARCHAR AS timestamp" not in sql
+
+
+def test_list_records_rejects_bad_cursor(client):
+    client, _ = client
+    response = client.get("/object/vendas", params={"sort_by": "valor", "cursor": "garbage"})
+    assert response.status_code == 400
@@ -0,0 +1,132 @@
+import json
+import uuid
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.engine.api import data, hardcoded_hooks
+from app.engine.services.record_service import RecordService
+
+
+class FakeSession:
+    """Executa o SQL em memória: falha qualquer lote que contenha um registro com data["bad"]."""
+
+    def __init__(self, rows=None):
+        self.calls = []
+        self.rows = rows or []
+
+    @contextmanager
+    def begin_nested(self):
+        yield
+
+    def execute(self, stmt, params):
+        self.calls.append((str(stmt), params))
+        if "rows" in params:
+            if any(r["data"].get("bad") for r in json.loads(params["rows"])):
+                raise ValueError("invalid row")
+            return None
+        found = [r for r in self.rows if r.id in params["ids"]]
+        return SimpleNamespace(fetchall=lambda: found)
+
+
+def test_bulk_insert_chunks_and_isolates_bad_rows(monkeypatch):
+    # BULK_CHUNK_SIZE é lido como default de _chunks na definição
+    monkeypatch.setattr(RecordService._chunks, "__defaults__", (2,))
+    db = FakeSession()
+    records = [{"nome": "a"}, {"nome": "b", "bad": True}, {"nome": "c"}]
+
+    ids, errors = RecordService.bulk_insert(db, "t1", "e1", records, ["nome"])
+
+    assert ids[1] is None and ids[0] and ids[2]
+    assert errors == {1: "invalid row"}
+    # bloco [a, b] falha e é refeito linha a linha; bloco [c] passa direto
+    assert [len(json.loads(p["rows"])) for _, p in db.calls] == [2, 1, 1, 1]
+    sent = json.loads(db.calls[-1][1]["rows"])[0]
+    assert sent["search_text"] == "c"
+
+
+def test_bulk_update_reports_positions():
+    db = FakeSession()
+    errors = RecordService.bulk_update(db, "e1", [("r1", {"x": 1}), ("r2", {"bad": True})], [])
+    assert errors == {1: "invalid row"}
+    assert "UPDATE entity_records" in db.calls[0][0]
+
+
+def test_bulk_delete_returns_existing_data():
+    db = FakeSession(rows=[SimpleNamespace(id="r1", data={"x": 1}), SimpleNamespace(id="r3", data=None)])
+    deleted = RecordService.bulk_delete(db, "t1", "e1", ["r1", "r2", "r3"])
+    assert deleted == {"r1": {"x": 1}, "r3": {}}
+    assert len(db.calls) == 1
+
+
+class FakeRouteSession:
+    """Registra savepoints, commits e em que savepoint cada hook rodou."""
+
+    def __init__(self):
+        self.events = []
+        self.savepoint = None
+
+    @contextmanager
+    def begin_nested(self):
+        self.savepoint = len(self.events)
+        self.events.append("savepoint")
+        try:
+            yield
+        except Exception:
+            self.events.append("rollback savepoint")
+            raise
+        finally:
+            self.savepoint = None
+
+    def commit(self):
+        self.events.append("commit")
+
+
+def test_bulk_update_runs_hooks_in_savepoints_and_commits_once(monkeypatch):
+    ids = [str(uuid.uuid4()) for _ in range(2)]
+    meta = SimpleNamespace(entity_by_slug=lambda slug: SimpleNamespace(id="e1"), fields=lambda entity_id: [])
+    monkeypatch.setattr(data.metadata_cache, "get", lambda db, tenant_id: meta)
+    monkeypatch.setattr(RecordService, "fetch_many", classmethod(lambda cls, db, t, e, record_ids: {i: {"status": "Rascunho"} for i in record_ids}))
+    monkeypatch.setattr(RecordService, "bulk_update", classmethod(lambda cls, db, e, updates, names: {}))
+    monkeypatch.setattr(data, "apply_snapshot_formulas_many", lambda db, t, e, rows, ctx: rows)
+    monkeypatch.setattr(data, "get_user_context", lambda request, db, tenant_id: None)
+    events = []
+    monkeypatch.setattr(data.WorkflowService, "enqueue_batch_event", staticmethod(lambda db, **kw: events.extend(kw["items"])))
+
+    def hook(entity_slug, record_id, payload, db, tenant_id, old_data):
+        assert db.savepoint is not None
+        db.events.append(f"hook {record_id}")
+        if record_id == ids[1]:
+            raise HTTPException(status_code=400, detail="Estoque Insuficiente")
+
+    monkeypatch.setattr(data, "run_update_hooks", hook)
+    db = FakeRouteSession()
+    request = SimpleNamespace(state=SimpleNamespace(tenant_id="t1", user_id=None))
+
+    result = data.update_records_bulk("pedidos", [{"id": i, "status": "Aprovado"} for i in ids], request=request, db=db)
+
+    assert result["updated"] == 1
+    assert result["errors"] == [{"index": 1, "id": ids[1], "error": "Estoque Insuficiente"}]
+    assert db.events == ["savepoint", f"hook {ids[0]}", "savepoint", f"hook {ids[1]}", "rollback savepoint", "commit"]
+    assert [e["id"] for e in events] == [ids[0]]
+
+
+def test_conversion_hook_does_not_commit(monkeypatch):
+    produto = SimpleNamespace(data={"estoque_atual": 10})
+    item = SimpleNamespace(data={"pedido_ref": "p1", "produto_ref": "prod", "quantidade": 3})
+    monkeypatch.setattr(hardcoded_hooks, "get_entity_id", lambda db, tenant_id, slug: "itens")
+    monkeypatch.setattr(hardcoded_hooks, "get_record", lambda db, tenant_id, slug, record_id: produto)
+    monkeypatch.setattr(hardcoded_hooks, "flag_modified", lambda obj, key: None)
+    added = []
+    db = SimpleNamespace(
+        query=lambda model: SimpleNamespace(filter=lambda *a: SimpleNamespace(all=lambda: [item])),
+        add=added.append,
+        commit=lambda: pytest.fail("hook must not commit"),
+    )
+
+    hardcoded_hooks.process_conversion("p1", {}, db, "t1")
+
+    assert produto.data["estoque_atual"] == 7
+    assert added == [produto]
@@ -0,0 +1,96 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.engine.automation import registry
+from app.engine.automation.definitions import ActionType
+from app.engine.automation.registry import ACTION_HANDLERS, get_action, missing_params, uses_db
+from app.engine.services.trail_compiler import interpolate, is_template
+
+
+def test_handlers_registered_by_type_and_alias():
+    assert get_action("WEBHOOK") is get_action("WEBHOOK_OUT") is registry.webhook
+    assert get_action(ActionType.DB_CREATE.value) is registry.db_create
+    assert get_action("NOPE") is None and get_action(None) is None
+
+
+def test_uses_db_flags():
+    assert not uses_db("WEBHOOK_OUT") and not uses_db("SHOW_TOAST")
+    assert uses_db("DB_CREATE") and uses_db("MATH_OP")
+    # tipo desconhecido conta como usando o banco (ramo PARALLEL roda serial)
+    assert uses_db("NOPE")
+
+
+def test_missing_params():
+    assert missing_params("DB_FETCH_FIELD", ["table_id"]) == ["record_id", "field_name"]
+    assert missing_params("WEBHOOK", {"url": "x"}.keys()) == []
+    assert missing_params("NOPE", []) == []
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("{{ Payload.id }}", True),
+    ("texto", False),
+    (["a", "{{x}}"], True),
+    ([{"k": 1}], True),
+    (["a"], False),
+    (3, False),
+])
+def test_is_template(value, expected):
+    assert is_template(value) is expected
+
+
+def test_interpolate_nested_values():
+    context = {"Payload": {"id": 7, "nome": "Ana"}}
+    value = {"url": "/r/{{ Payload.id }}", "items": ["{{Payload.nome}}", 1], "falta": "{{ Payload.x }}"}
+    assert interpolate(value, context) == {"url": "/r/7", "items": ["Ana", 1], "falta": "{{Payload.x}}"}
+
+
+def test_webhook_action(monkeypatch):
+    sent = []
+
+    def request_sync(method, url, headers=None, json=None):
+        sent.append((method, url, json))
+        return SimpleNamespace(status_code=500 if "fail" in url else 200, text="ok")
+
+    monkeypatch.setattr(registry, "http_pool", SimpleNamespace(request_sync=request_sync))
+    handler = ACTION_HANDLERS["WEBHOOK_OUT"]
+
+    assert handler(None, {"url": "https://x.test", "body": {"a": 1}}, {}) == {"status": 200, "response": "ok"}
+    assert handler(None, {"url": "https://x.test/fail"}, {})["error"] == "HTTP 500"
+    assert handler(None, {}, {}) == {"error": "No url"}
+    assert sent[0] == ("POST", "https://x.test", {"a": 1})
+
+
+def test_math_op_uses_resolved_value():
+    run = SimpleNamespace(formula_engine=SimpleNamespace(evaluate=lambda expr, ctx: 20))
+    assert registry.math_op(run, {"expression": 5}, {}) == {"result": 5, "status": "success"}
+    assert registry.math_op(run, {"expression": "10 * 2"}, {}) == {"result": 20, "status": "success"}
+    assert registry.math_op(run, {}, {}) == {"error": "No expression"}
+
+
+def test_db_error_is_isolated_in_savepoint():
+    events = []
+
+    @contextmanager
+    def begin_nested():
+        events.append("savepoint")
+        try:
+            yield
+        except Exception:
+            events.append("rollback to savepoint")
+            raise
+
+    run = SimpleNamespace(db=SimpleNamespace(begin_nested=begin_nested))
+
+    def fail():
+        raise RuntimeError(" duplicate key ")
+
+    assert registry._in_savepoint(run, "DB_CREATE", fail) == {"error": "duplicate key"}
+    assert events == ["savepoint", "rollback to savepoint"]
+
+
+def test_batch_result_reports_error_only_when_nothing_written():
+    errors = [{"index": 0, "error": "bad"}]
+    assert "error" not in registry._batch_result("created", 1, errors)
+    assert registry._batch_result("created", 0, errors)["error"] == "bad"
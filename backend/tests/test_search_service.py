@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.engine.services.search_service import (
+    rank_expression, search_condition, search_document, search_fields, tsquery_text,
+)
+
+
+def field(name, field_type, virtual=False):
+    return SimpleNamespace(name=name, field_type=field_type, is_virtual=virtual)
+
+
+def test_search_fields_only_persisted_text():
+    fields = [field("nome", "text"), field("valor", "number"), field("email", "email"), field("calc", "text", virtual=True)]
+    assert search_fields(fields) == ["nome", "email"]
+
+
+def test_search_document_skips_nested_and_formats_bool():
+    data = {"nome": "Ana", "tags": ["a"], "ativo": True, "obs": None, "n": 3}
+    assert search_document(["nome", "tags", "ativo", "obs", "n"], data) == "Ana true 3"
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("mar silv", "mar:* & silv:*"),
+    ("  José!  ", "josé:*"),
+    ("a'b & c", "a:* & b:* & c:*"), # só tokens \w+: nada chega cru ao to_tsquery
+    ("!!!", None),
+    ("", None),
+])
+def test_tsquery_text(q, expected):
+    assert tsquery_text(q) == expected
+
+
+def test_search_condition_binds_query(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_TRIGRAM", False)
+    cond, params = search_condition("mar")
+    assert "search_vector @@ to_tsquery" in cond
+    assert params == {"search_tsq": "mar:*"}
+    assert search_condition("   ") is None
+
+
+def test_search_condition_trigram_escapes_like(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_TRIGRAM", True)
+    cond, params = search_condition("50%_off")
+    assert "ILIKE :search_like" in cond
+    assert params["search_like"] == "%50\\%\\_off%"
+
+
+def test_rank_expression_quotes_literal():
+    assert "to_tsquery('" in rank_expression("mar")
+    assert "'mar:*'" in rank_expression("mar")
+    assert rank_expression("") is None
@@ -0,0 +1,148 @@
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.core import tenant_cache as tenant_cache_module
+from app.core.tenant_cache import LocalStore, TenantCache
+from app.system import models as models_system
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON" # Tenant.fiscal_data: só para criar a tabela no SQLite
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tenant_cache_module.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def db_factory():
+    """Tenant/ApiKey em SQLite (sem schema public); conta as sessões abertas pelo cache."""
+    engine = create_engine("sqlite://").execution_options(schema_translate_map={"public": None})
+    for model in (models_system.Tenant, models_system.ApiKey):
+        model.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+    opened = []
+
+    def session_factory():
+        opened.append(1)
+        return factory()
+
+    session_factory.opened = opened
+    session_factory.new = factory
+    return session_factory
+
+
+def add_tenant(db_factory, slug="acme", api_key=None):
+    with db_factory.new() as db:
+        tenant = models_system.Tenant(id=uuid.uuid4(), name=slug, slug=slug)
+        db.add(tenant)
+        if api_key:
+            db.add(models_system.ApiKey(id=uuid.uuid4(), key=api_key, tenant_id=tenant.id, is_active=True))
+        db.commit()
+        return str(tenant.id)
+
+
+def test_local_store_ttl(clock):
+    store = LocalStore()
+    store.set("k", {"v": 1}, ttl=60)
+    clock.now += 59
+    assert store.get("k") == {"v": 1}
+    clock.now += 1
+    assert store.get("k") is None
+
+
+def test_hit_until_ttl_then_reload(clock, db_factory):
+    tenant_id = add_tenant(db_factory)
+    cache = TenantCache(LocalStore(), ttl_seconds=60, session_factory=db_factory)
+
+    assert cache.tenant_by_slug("acme") == {"id": tenant_id, "slug": "acme"}
+    assert cache.tenant_by_slug("acme") == {"id": tenant_id, "slug": "acme"}
+    assert len(db_factory.opened) == 1
+
+    clock.now += 60
+    cache.tenant_by_slug("acme")
+    assert len(db_factory.opened) == 2
+
+
+def test_negative_results_are_cached(clock, db_factory):
+    cache = TenantCache(LocalStore(), ttl_seconds=60, session_factory=db_factory)
+
+    assert cache.tenant_by_slug("ghost") is None
+    assert cache.tenant_for_api_key("wrong") is None
+    assert cache.tenant_by_slug("ghost") is None
+    assert cache.tenant_for_api_key("wrong") is None
+    assert len(db_factory.opened) == 2
+
+
+def test_invalidate_tenant_reloads(clock, db_factory):
+    cache = TenantCache(LocalStore(), ttl_seconds=60, session_factory=db_factory)
+    assert cache.tenant_by_slug("acme") is None # negativo em cache
+
+    tenant_id = add_tenant(db_factory)
+    assert cache.tenant_by_slug("acme") is None
+    cache.invalidate_tenant("acme") # rota que criou o tenant
+    assert cache.tenant_by_slug("acme") == {"id": tenant_id, "slug": "acme"}
+
+
+def test_api_key_is_stored_hashed(clock, db_factory):
+    store = LocalStore()
+    tenant_id = add_tenant(db_factory, api_key="sk-secret")
+    cache = TenantCache(store, ttl_seconds=60, session_factory=db_factory)
+
+    assert cache.tenant_for_api_key("sk-secret") == {"tenant_id": tenant_id, "slug": "acme"}
+    assert not any("sk-secret" in key for key in store._data)
+
+
+@pytest.mark.parametrize("change", ["revoke", "rotate", "delete"])
+def test_api_key_change_invalidates_on_commit(clock, db_factory, monkeypatch, change):
+    tenant_id = add_tenant(db_factory, api_key="sk-old")
+    cache = TenantCache(LocalStore(), ttl_seconds=3600, session_factory=db_factory)
+    monkeypatch.setattr(tenant_cache_module, "tenant_cache", cache)
+    assert cache.tenant_for_api_key("sk-old") == {"tenant_id": tenant_id, "slug": "acme"}
+
+    with db_factory.new() as db:
+        key = db.query(models_system.ApiKey).one()
+        if change == "revoke":
+            key.is_active = False
+        elif change == "rotate":
+            key.key = "sk-new"
+        else:
+            db.delete(key)
+        db.flush()
+        assert cache.tenant_for_api_key("sk-old") is not None # antes do commit: ainda vale
+        db.commit()
+
+    assert cache.tenant_for_api_key("sk-old") is None # sem esperar o TTL
+
+
+def test_rolled_back_change_keeps_cache(clock, db_factory, monkeypatch):
+    add_tenant(db_factory, api_key="sk-old")
+    cache = TenantCache(LocalStore(), ttl_seconds=3600, session_factory=db_factory)
+    monkeypatch.setattr(tenant_cache_module, "tenant_cache", cache)
+    cache.tenant_for_api_key("sk-old")
+    opened = len(db_factory.opened)
+
+    with db_factory.new() as db:
+        db.query(models_system.ApiKey).one().is_active = False
+        db.flush()
+        db.rollback()
+
+    cache.tenant_for_api_key("sk-old")
+    assert len(db_factory.opened) == opened
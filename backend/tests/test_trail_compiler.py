@@ -0,0 +1,125 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.engine.metadata.models import MetaTrail
+from app.engine.services.trail_compiler import TrailCompileError, TrailPlanCache, compile_trail, find_start_node
+
+
+def make_trail(nodes, updated_at=datetime(2026, 1, 1), **trigger_config):
+    return MetaTrail(id=uuid.uuid4(), tenant_id=uuid.uuid4(), name="teste", is_active=True, nodes=nodes,
+                     trigger_type="MANUAL", trigger_config=trigger_config, updated_at=updated_at)
+
+
+def toast(next_node=None):
+    return {"type": "ACTION", "action_type": "SHOW_TOAST", "config": {"message": "ok"}, "next_node_id": next_node}
+
+
+def test_builder_and_linear_node_formats():
+    plan = compile_trail(make_trail({
+        "a": {"type": "ACTION", "action": "SHOW_TOAST", "params": {"message": "=1+1"}, "outputs": {"next": "b"}},
+        "b": {"type": "ACTION", "action_type": "WEBHOOK_OUT", "config": {"url": "{{ Payload.url }}"}, "next": "c"},
+        "c": toast(),
+    }))
+    assert plan.errors == []
+    assert plan.start == "a"
+    a, b = plan.steps["a"], plan.steps["b"]
+    assert (a.action_type, a.next_node_id, list(a.config.formulas)) == ("SHOW_TOAST", "b", ["message"])
+    assert (b.next_node_id, list(b.config.templates)) == ("c", ["url"])
+
+
+@pytest.mark.parametrize("nodes, expected", [
+    ({"x": toast(), "ROOT": toast("x")}, "ROOT"),
+    ({"x": toast(), "t": {"type": "TRIGGER", "next_node_id": "x"}}, "t"),
+    ({"b": toast(), "a": toast("b")}, "a"),
+    ({"p": {"type": "PARALLEL", "branches": ["b1"]}, "b1": toast()}, "p"),
+    ({"a": toast("b"), "b": toast("a")}, None),
+])
+def test_find_start_node(nodes, expected):
+    assert find_start_node(nodes) == expected
+
+
+def test_compile_collects_graph_and_config_errors():
+    plan = compile_trail(make_trail({
+        "a": toast("ghost"),
+        "b": {"type": "ACTION", "action_type": "NOPE"},
+        "c": {"type": "ACTION", "action_type": "WEBHOOK", "config": {}},
+        "d": {"type": "ACTION", "action_type": "SHOW_TOAST", "config": {"message": "=1 +"}},
+        "e": {"type": "PARALLEL", "branches": []},
+    }))
+    errors = "\n".join(plan.errors)
+    assert "a: edge to missing node 'ghost'" in errors
+    assert "b: unknown action type 'NOPE'" in errors
+    assert "c: WEBHOOK missing required params ['url']" in errors
+    assert "d.message:" in errors
+    assert "e: PARALLEL node without branches" in errors
+
+
+def test_cycle_is_a_compile_error():
+    with pytest.raises(TrailCompileError, match="a -> b -> a"):
+        compile_trail(make_trail({"t": {"type": "TRIGGER", "next_node_id": "a"}, "a": toast("b"), "b": toast("a")}))
+
+
+def test_max_concurrency(monkeypatch):
+    monkeypatch.setattr(settings, "TRAIL_MAX_PARALLEL", 4)
+    assert compile_trail(make_trail({"a": toast()})).max_concurrency == 4
+    assert compile_trail(make_trail({"a": toast()}, max_concurrency=2)).max_concurrency == 2
+    assert compile_trail(make_trail({"a": toast()}, max_concurrency=0)).max_concurrency == 4
+    plan = compile_trail(make_trail({"a": toast()}, max_concurrency="x"))
+    assert plan.max_concurrency == 4 and "invalid max_concurrency: 'x'" in plan.errors
+
+
+class FakeQuery:
+    def __init__(self, db, full):
+        self.db, self.full = db, full
+
+    def filter(self, *criteria):
+        return self
+
+    def first(self):
+        trail = self.db.trail
+        if self.full:
+            self.db.loads += 1
+            return trail
+        return SimpleNamespace(id=trail.id, is_active=trail.is_active, updated_at=trail.updated_at)
+
+
+class FakeSession:
+    """query(MetaTrail) carrega a trilha inteira; query(colunas) só a versão."""
+
+    def __init__(self, trail):
+        self.trail = trail
+        self.loads = 0
+
+    def query(self, *entities):
+        return FakeQuery(self, entities[0] is MetaTrail)
+
+
+def test_plan_cache_compiles_once_per_version():
+    trail = make_trail({"a": toast()})
+    db, cache = FakeSession(trail), TrailPlanCache()
+
+    plan = cache.get(db, trail.id, trail.tenant_id)
+    assert cache.get(db, trail.id, trail.tenant_id) is plan
+    assert db.loads == 1
+
+    trail.updated_at = datetime(2026, 2, 1)
+    newer = cache.get(db, trail.id, trail.tenant_id)
+    assert newer is not plan and newer.version == trail.updated_at
+    assert db.loads == 2
+
+    trail.is_active = False
+    assert cache.get(db, trail.id, trail.tenant_id) is None
+
+
+def test_plan_cache_evicts_least_recent():
+    cache = TrailPlanCache(max_size=1)
+    first, second = make_trail({"a": toast()}), make_trail({"a": toast()})
+    db1, db2 = FakeSession(first), FakeSession(second)
+    cache.get(db1, first.id, first.tenant_id)
+    cache.get(db2, second.id, second.tenant_id)
+    cache.get(db1, first.id, first.tenant_id)
+    assert db1.loads == 2
@@ -0,0 +1,177 @@
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.engine.automation import registry
+from app.engine.automation.service import AutomationService
+from app.engine.metadata.models import MetaTrail
+from app.engine.services import trail_executor, workflow_service
+from app.engine.services.job_queue import JobFailed
+from app.engine.services.trail_compiler import TrailCompileError, _find_cycle, compile_trail
+from app.engine.services.trail_executor import TrailExecutor, TrailNodeError
+from app.engine.services.trail_run_log import trail_run_log
+
+TENANT_ID = uuid.uuid4()
+
+
+class FakeSession:
+    """Só registra o ciclo da transação: as ações de teste não usam o banco."""
+
+    def __init__(self):
+        self.calls = []
+
+    def commit(self):
+        self.calls.append("commit")
+
+    def rollback(self):
+        self.calls.append("rollback")
+
+    def get(self, model, ident):
+        return self.trail
+
+
+def make_trail(nodes, **trigger_config):
+    return MetaTrail(id=uuid.uuid4(), tenant_id=TENANT_ID, name="teste", is_active=True, nodes=nodes,
+                     trigger_type="MANUAL", trigger_config=trigger_config, updated_at=datetime(2026, 1, 1))
+
+
+@pytest.fixture
+def actions(monkeypatch):
+    """Ações de teste: DB_STEP (usa o banco), HTTP_STEP (uses_db=False), BOOM (exceção), FAIL (resultado com erro)."""
+    calls = []
+
+    def step(run, config, context):
+        calls.append((config.get("name"), threading.current_thread().name))
+        return {"status": "success", "name": config.get("name")}
+
+    def boom(run, config, context):
+        raise RuntimeError("boom")
+
+    def fail(run, config, context):
+        return {"error": "HTTP 500"}
+
+    monkeypatch.setattr(registry, "DB_FREE_ACTIONS", registry.DB_FREE_ACTIONS | {"HTTP_STEP", "FAIL"})
+    for name, fn in (("DB_STEP", step), ("HTTP_STEP", step), ("BOOM", boom), ("FAIL", fail)):
+        monkeypatch.setitem(registry.ACTION_HANDLERS, name, fn)
+    return calls
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """Executa a trilha compilada com sessão falsa e log em memória."""
+    recorded = []
+    monkeypatch.setattr(trail_run_log, "record", lambda trace, error=None: recorded.append(trace.finish(error)) if trace else None)
+
+    def execute(trail):
+        monkeypatch.setattr(trail_executor.trail_plan_cache, "get", lambda db, trail_id, tenant_id: compile_trail(trail))
+        db = FakeSession()
+        db.trail = trail
+        executor = TrailExecutor(db, TENANT_ID)
+        return executor, db, recorded, lambda: executor.execute_trail(str(trail.id), {"id": 1}, trigger="api")
+
+    return execute
+
+
+def node(action, next_node=None, **config):
+    return {"type": "ACTION", "action_type": action, "config": config, "next_node_id": next_node}
+
+
+def parallel_trail(branch_action, **trigger_config):
+    return make_trail({
+        "start": {"type": "TRIGGER", "next_node_id": "fan"},
+        "fan": {"type": "PARALLEL", "branches": ["a", "b"], "next_node_id": "join"},
+        "a": node(branch_action, "join", name="a"),
+        "b": node(branch_action, "join", name="b"),
+        "join": node("DB_STEP", name="join"),
+    }, **trigger_config)
+
+
+def test_find_cycle_returns_path():
+    plan_nodes = {
+        "s": {"type": "TRIGGER", "next_node_id": "x"},
+        "x": node("DB_STEP", "y"),
+        "y": {"type": "DECISION", "next_true": "x", "next_false": None},
+    }
+    with pytest.raises(TrailCompileError, match="x -> y -> x"):
+        compile_trail(make_trail(plan_nodes))
+    steps = compile_trail(make_trail({"s": {"type": "TRIGGER", "next_node_id": "x"}, "x": node("DB_STEP")})).steps
+    assert _find_cycle("s", steps) is None
+
+
+def test_parallel_concurrent_only_without_db_actions(actions):
+    assert compile_trail(parallel_trail("HTTP_STEP")).steps["fan"].concurrent
+    assert not compile_trail(parallel_trail("DB_STEP")).steps["fan"].concurrent
+    # Fórmula na config pode consultar o banco (LOOKUP...): ramo volta a ser serial
+    trail = parallel_trail("HTTP_STEP")
+    trail.nodes["a"]["config"]["url"] = "=CONCATENATE('a', 'b')"
+    assert not compile_trail(trail).steps["fan"].concurrent
+
+
+def test_parallel_db_branches_run_serially_in_one_transaction(actions, run):
+    executor, db, recorded, execute = run(parallel_trail("DB_STEP"))
+    context = execute()
+
+    assert db.calls == ["commit"]
+    assert {thread for _, thread in actions} == {threading.current_thread().name}
+    assert [name for name, _ in actions] == ["a", "b", "join"]
+    assert context["fan"]["status"] == "success"
+    assert recorded[-1]["status"] == "success"
+
+
+def test_parallel_db_free_branches_use_threads(actions, run):
+    executor, db, recorded, execute = run(parallel_trail("HTTP_STEP"))
+    context = execute()
+
+    assert db.calls == ["commit"]
+    branch_threads = {thread for name, thread in actions if name in ("a", "b")}
+    assert all(thread.startswith("trail-branch") for thread in branch_threads)
+    assert list(context["fan"]["branches"]) == ["a", "b"]
+
+
+def test_parallel_reports_failed_branch(actions, run):
+    executor, db, recorded, execute = run(parallel_trail("FAIL"))
+    context = execute()
+
+    assert context["fan"]["status"] == "failed"
+    assert "HTTP 500" in context["fan"]["error"]
+    assert recorded[-1]["status"] == "failed"
+
+
+@pytest.mark.parametrize("branch_action", ["BOOM", "DB_STEP"])
+def test_node_exception_rolls_back_the_run(actions, run, branch_action):
+    trail = parallel_trail(branch_action)
+    trail.nodes["join"] = node("BOOM", name="join")
+    executor, db, recorded, execute = run(trail)
+
+    with pytest.raises(TrailNodeError) as exc:
+        execute()
+
+    assert db.calls == ["rollback"]
+    assert exc.value.node_id in ("a", "join")
+    assert recorded[-1]["status"] == "error"
+
+
+def test_automation_service_reports_rollback(actions, run):
+    executor, db, recorded, _ = run(make_trail({"start": {"type": "TRIGGER", "next_node_id": "x"}, "x": node("BOOM")}))
+    service = AutomationService(db, TENANT_ID)
+    service.executor = executor
+
+    response = service.run_trail(str(db.trail.id), {})
+
+    assert response["success"] is False
+    assert response["failed_node"] == "x"
+    assert response["rolled_back"] is True
+    assert db.calls == ["rollback"]
+
+
+def test_workflow_job_fails_without_retry_on_node_error(actions, run, monkeypatch):
+    executor, db, recorded, _ = run(make_trail({"start": {"type": "TRIGGER", "next_node_id": "x"}, "x": node("BOOM")}))
+    db.close = lambda: db.calls.append("close")
+    monkeypatch.setattr(workflow_service, "SessionSys", lambda: db)
+
+    with pytest.raises(JobFailed, match="Node x failed"):
+        workflow_service.handle_trail_execute({"trail_id": str(db.trail.id), "tenant_id": str(TENANT_ID), "event": {"id": 1}})
+
+    assert db.calls == ["rollback", "close"]
@@ -0,0 +1,103 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.engine.metadata.data_models import TrailRun, TrailRunStep
+from app.engine.services import trail_run_log as run_log_module
+from app.engine.services.trail_run_log import TrailRunLog, TrailRunTrace
+
+PLAN = SimpleNamespace(trail_id="trail-1", version=datetime(2026, 1, 1))
+
+
+def step(node_id="n1"):
+    return SimpleNamespace(node_id=node_id, type="ACTION", action_type="SHOW_TOAST")
+
+
+def trace_with(*results):
+    trace = TrailRunTrace(PLAN, uuid.uuid4(), "api")
+    for i, result in enumerate(results):
+        trace.add_step(step(f"n{i}"), datetime(2026, 1, 1), 0.002, {"message": "ok"}, result=result)
+    return trace
+
+
+def test_step_status_and_config_size():
+    trace = trace_with({"status": "success"}, {"error": "HTTP 500"})
+    ok, failed = trace.steps
+    assert (ok["status"], ok["error"], ok["duration_ms"]) == ("success", None, 2.0)
+    assert ok["config_size"] == len('{"message": "ok"}')
+    assert (failed["status"], failed["error"]) == ("error", "HTTP 500")
+
+
+def test_run_status():
+    assert trace_with({"status": "success"}).finish()["status"] == "success"
+    assert trace_with({"error": "x"}).finish()["status"] == "failed"
+    run = trace_with({"status": "success"}).finish("boom")
+    assert (run["status"], run["error"], run["node_count"]) == ("error", "boom", 1)
+
+
+class FakeSession:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.inserts = []
+        self.calls = []
+
+    def execute(self, stmt, rows):
+        if self.fail:
+            raise RuntimeError("db down")
+        self.inserts.append((stmt.table.name, len(rows)))
+
+    def commit(self):
+        self.calls.append("commit")
+
+    def rollback(self):
+        self.calls.append("rollback")
+
+    def close(self):
+        self.calls.append("close")
+
+
+def test_start_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "TRAIL_RUN_LOG", False)
+    assert TrailRunLog().start(PLAN, uuid.uuid4()) is None
+
+
+def test_flush_writes_runs_before_steps():
+    log = TrailRunLog(batch_size=100, flush_seconds=3600)
+    log.record(trace_with({"status": "success"}, {"status": "success"}))
+    log.record(trace_with({"status": "success"}))
+    assert log.pending() == 2
+
+    db = FakeSession()
+    assert log.flush(db) == 2
+    assert db.inserts == [(TrailRun.__tablename__, 2), (TrailRunStep.__tablename__, 3)]
+    assert db.calls == ["commit"]  # sessão do chamador: não fecha
+    assert log.pending() == 0 and log.flush(db) == 0
+
+
+def test_record_flushes_when_batch_is_full(monkeypatch):
+    sessions = []
+
+    def session_sys():
+        sessions.append(FakeSession())
+        return sessions[-1]
+
+    monkeypatch.setattr(run_log_module.database, "SessionSys", session_sys)
+    log = TrailRunLog(batch_size=3, flush_seconds=3600)
+
+    log.record(trace_with({"status": "success"}, {"status": "success"}))
+    assert sessions == []
+    log.record(trace_with({"status": "success"}))
+
+    [db] = sessions
+    assert db.inserts == [(TrailRun.__tablename__, 2), (TrailRunStep.__tablename__, 3)]
+    assert db.calls == ["commit", "close"]
+
+
+def test_failed_flush_drops_batch():
+    log = TrailRunLog(batch_size=100, flush_seconds=3600)
+    log.record(trace_with({"status": "success"}))
+    db = FakeSession(fail=True)
+    assert log.flush(db) == 0
+    assert db.calls == ["rollback"]
+    assert log.pending() == 0
@@ -0,0 +1,102 @@
+import logging
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.engine.metadata.models import MetaTrail
+from app.engine.services import trail_scheduler
+from app.engine.services.trail_scheduler import CronExpression, TrailScheduler
+
+
+@pytest.mark.parametrize("expression, after, expected", [
+    ("*/15 * * * *", datetime(2026, 1, 1, 10, 7), datetime(2026, 1, 1, 10, 15)),
+    ("0 8-18 * * 1-5", datetime(2026, 1, 2, 18, 30), datetime(2026, 1, 5, 8, 0)), # sexta -> segunda
+    ("30 9 1 * *", datetime(2026, 1, 31, 12, 0), datetime(2026, 2, 1, 9, 30)),
+    ("0 0 29 2 *", datetime(2026, 3, 1), datetime(2028, 2, 29)),
+    ("@daily", datetime(2026, 1, 1, 0, 0), datetime(2026, 1, 2, 0, 0)),
+    ("0 12 * * 7", datetime(2026, 1, 1), datetime(2026, 1, 4, 12, 0)), # 7 = domingo
+    ("0 0 13 * 5", datetime(2026, 1, 1), datetime(2026, 1, 2, 0, 0)), # dia 13 OU sexta
+])
+def test_cron_next_after(expression, after, expected):
+    assert CronExpression(expression).next_after(after) == expected
+
+
+def test_cron_next_after_is_strict():
+    assert CronExpression("0 * * * *").next_after(datetime(2026, 1, 1, 10, 0)) == datetime(2026, 1, 1, 11, 0)
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* * * * 8", "*/0 * * * *", "5-1 * * * *", "a * * * *"])
+def test_cron_rejects_invalid(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression)
+
+
+def test_cron_that_never_fires():
+    with pytest.raises(ValueError, match="never fires"):
+        CronExpression("0 0 31 2 *").next_after(datetime(2026, 1, 1))
+
+
+def test_next_run_interval_and_first_run():
+    now = datetime(2026, 1, 1, 10, 0)
+    assert TrailScheduler.first_run({"interval": 15}, now) == now
+    assert TrailScheduler.next_run({"interval": 15}, now) == datetime(2026, 1, 1, 10, 15)
+    assert TrailScheduler.next_run({}, now) is None
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """meta_trails em SQLite (sem schema public): o tick roda com o ORM de verdade (onupdate incluso)."""
+    engine = create_engine("sqlite://").execution_options(schema_translate_map={"public": None})
+    MetaTrail.__table__.create(engine)
+    jobs = []
+    monkeypatch.setattr(trail_scheduler, "enqueue", lambda db, name, payload, tenant_id=None: jobs.append(payload["trail_id"]))
+    with Session(engine) as session:
+        session.jobs = jobs
+        yield session
+
+
+def add_trail(db, config, next_run_at=None):
+    trail = MetaTrail(id=uuid.uuid4(), tenant_id=uuid.uuid4(), name="agendada", is_active=True, nodes={},
+                      trigger_type="SCHEDULER", trigger_config=config, next_run_at=next_run_at, updated_at=EDITED_AT)
+    db.add(trail)
+    db.commit()
+    return trail
+
+
+EDITED_AT = datetime(2026, 1, 1)
+
+
+def test_tick_keeps_updated_at(db):
+    trail = add_trail(db, {"interval": 5})
+
+    assert TrailScheduler.tick(db) == 1 # primeira execução imediata
+    TrailScheduler._set_next_run(trail, datetime(2000, 1, 1)) # vencida de novo
+    db.commit()
+    assert TrailScheduler.tick(db) == 1
+
+    assert db.jobs == [str(trail.id)] * 2
+    assert trail.next_run_at > datetime.utcnow()
+    # Reagendar não é editar: a versão da trilha (cache de planos) não muda
+    assert trail.updated_at == EDITED_AT
+
+
+def test_invalid_schedule_is_parked_and_warned_once(db, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SCHEDULER_BATCH_SIZE", 2)
+    invalid = [add_trail(db, {"cron": "99 * * * *"}) for _ in range(2)]
+    unscheduled = add_trail(db, {})
+    valid = add_trail(db, {"interval": 5})
+
+    with caplog.at_level(logging.WARNING, logger=trail_scheduler.__name__):
+        for _ in range(3):
+            TrailScheduler.tick(db)
+
+    assert len([r for r in caplog.records if "invalid schedule" in r.message]) == 2
+    # Estacionadas fora das consultas do tick: a trilha válida não fica sem a primeira execução
+    assert all(t.next_run_at == TrailScheduler.NEVER for t in invalid + [unscheduled])
+    assert db.jobs == [str(valid.id)]
+    assert all(t.updated_at == EDITED_AT for t in invalid + [unscheduled, valid])
@@ -0,0 +1,109 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.tenant_cache import LocalStore
+from app.engine.metadata.trigger_index import TriggerIndex
+from app.engine.services import workflow_service
+from app.engine.services.workflow_service import WorkflowService
+
+TENANT_ID = uuid.uuid4()
+ENTITY_ID = uuid.uuid4()
+
+
+class SharedStore(LocalStore):
+    """LocalStore compartilhado entre instâncias do índice (faz o papel do Redis)."""
+
+    shared = True
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *args):
+        return self
+
+    def join(self, *args):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Trilhas DB_EVENT ativas do tenant; conta as cargas do índice e as checagens de versão."""
+
+    def __init__(self):
+        self.trails = []
+        self.queries = 0
+        self.version_checks = 0
+
+    def query(self, model):
+        self.queries += 1
+        return FakeQuery(self.trails if model.__name__ == "MetaTrail" else [])
+
+    def execute(self, stmt):
+        # _db_version: (contagem, max updated_at) das trilhas e dos workflows
+        self.version_checks += 1
+        latest = max((t.updated_at for t in self.trails), default=None)
+        return SimpleNamespace(one=lambda: (len(self.trails), latest, 0, None))
+
+
+def trail(updated_at=datetime(2026, 1, 1)):
+    return SimpleNamespace(id=uuid.uuid4(), updated_at=updated_at, trigger_config={"entity_id": str(ENTITY_ID), "event": "ON_CREATE"})
+
+
+def test_shared_version_invalidates_other_processes():
+    store = SharedStore()
+    api, worker = TriggerIndex(ttl_seconds=3600, store=store), TriggerIndex(ttl_seconds=3600, store=store)
+    db = FakeSession()
+
+    assert not worker.routes(db, TENANT_ID, ENTITY_ID, "ON_CREATE")
+    db.trails.append(trail())
+    api.invalidate(TENANT_ID) # builder salvou a trilha em outro processo
+
+    assert worker.routes(db, TENANT_ID, ENTITY_ID, "ON_CREATE").trail_ids == [str(db.trails[0].id)]
+    queries = db.queries
+    worker.routes(db, TENANT_ID, ENTITY_ID, "ON_CREATE")
+    assert db.queries == queries # versão igual: sem nova consulta
+    assert db.version_checks == 0 # com Redis a versão não vem do banco
+
+
+def test_db_version_detects_trail_saved_in_another_process():
+    worker = TriggerIndex(ttl_seconds=3600, store=LocalStore())
+    db = FakeSession()
+
+    assert not worker.routes(db, TENANT_ID, ENTITY_ID, "ON_CREATE")
+    loads = db.queries
+    assert not worker.routes(db, TENANT_ID, ENTITY_ID, "ON_CREATE")
+    assert db.queries == loads # só a query de versão, sem recarregar trilhas/workflows
+
+    db.trails.append(trail()) # salva pela API, sem invalidate() neste processo
+    assert worker.routes(db, TENANT_ID, ENTITY_ID, "ON_CREATE").trail_ids == [str(db.trails[0].id)]
+
+    db.trails[0].trigger_config = {"entity_id": str(ENTITY_ID), "event": "ON_DELETE"}
+    db.trails[0].updated_at = datetime(2026, 1, 2) # editada: updated_at muda a versão
+    assert not worker.routes(db, TENANT_ID, ENTITY_ID, "ON_CREATE")
+
+
+@pytest.mark.parametrize("store", [LocalStore(), SharedStore()])
+def test_enqueue_only_with_routes(monkeypatch, store):
+    index = TriggerIndex(ttl_seconds=3600, store=store)
+    meta = SimpleNamespace(entity_by_slug=lambda slug: SimpleNamespace(id=ENTITY_ID))
+    jobs = []
+    monkeypatch.setattr(workflow_service, "trigger_index", index)
+    monkeypatch.setattr(workflow_service.metadata_cache, "get", lambda db, tenant_id: meta)
+    monkeypatch.setattr(workflow_service, "enqueue", lambda db, name, payload, tenant_id=None: jobs.append(name))
+    db = FakeSession()
+
+    # Entidade sem automação: nenhum job, também sem Redis
+    WorkflowService.enqueue_event(db, "vendas", "ON_CREATE", {"id": 1}, TENANT_ID)
+    assert jobs == []
+
+    db.trails.append(trail())
+    index.invalidate(TENANT_ID)
+    WorkflowService.enqueue_event(db, "vendas", "ON_CREATE", {"id": 1}, TENANT_ID)
+    assert jobs == ["workflow.event"]
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import webhook_service
+from app.services.webhook_service import SIGNATURE_HEADER, TIMESTAMP_HEADER, WebhookService, handle_webhook_delivery
+
+
+class FakePool:
+    def __init__(self, status=200):
+        self.status = status
+        self.requests = []
+
+    async def request(self, method, url, content=None, headers=None, timeout=None):
+        self.requests.append({"method": method, "url": url, "content": content, "headers": headers})
+        return SimpleNamespace(status_code=self.status, text="erro")
+
+
+def event(n):
+    return {"id": f"ev{n}", "event": "record.created", "data": {"n": n}}
+
+
+def test_sign_matches_receiver_hmac():
+    body = b'{"id": "ev1"}'
+    expected = hmac.new(b"s3cret", b"1700000000." + body, hashlib.sha256).hexdigest()
+    assert WebhookService.sign("s3cret", "1700000000", body) == f"sha256={expected}"
+
+
+def test_deliver_signs_exact_body(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(webhook_service, "http_pool", pool)
+    config = {"name": "crm", "url": "https://example.test/hook", "secret": "s3cret", "api_headers": {"X-Key": "k"}}
+
+    asyncio.run(WebhookService.deliver(config, [event(1)]))
+
+    [req] = pool.requests
+    headers = req["headers"]
+    assert json.loads(req["content"]) == event(1)
+    assert headers["X-Key"] == "k" and headers["Content-Type"] == "application/json"
+    assert headers[SIGNATURE_HEADER] == WebhookService.sign("s3cret", headers[TIMESTAMP_HEADER], req["content"])
+
+
+def test_deliver_batch_without_secret(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(webhook_service, "http_pool", pool)
+
+    asyncio.run(WebhookService.deliver({"url": "https://example.test/hook"}, [event(1), event(2)]))
+
+    [req] = pool.requests
+    assert json.loads(req["content"]) == {"event": "batch", "count": 2, "events": [event(1), event(2)]}
+    assert SIGNATURE_HEADER not in req["headers"]
+
+
+def test_deliver_raises_on_error_status(monkeypatch):
+    monkeypatch.setattr(webhook_service, "http_pool", FakePool(status=502))
+    with pytest.raises(RuntimeError, match="502"):
+        asyncio.run(WebhookService.deliver({"name": "crm", "url": "https://example.test/hook"}, [event(1)]))
+
+
+class FakeQueue:
+    """Registra as chamadas de JobQueue feitas pelo handler (via _with_session)."""
+
+    def __init__(self, siblings):
+        self.siblings = siblings
+        self.completed = []
+        self.failed = []
+
+    def claim_group(self, db, job_type, group_key, worker_id, limit):
+        self.claimed = (job_type, group_key, limit)
+        return self.siblings
+
+    def complete(self, db, job_id):
+        self.completed.append(job_id)
+
+    def fail(self, db, job_id, attempts, max_attempts, error):
+        self.failed.append((job_id, error))
+
+
+def run_handler(monkeypatch, pool, queue):
+    monkeypatch.setattr(settings, "WEBHOOK_BATCH_MAX", 10)
+    monkeypatch.setattr(webhook_service, "http_pool", pool)
+    monkeypatch.setattr(webhook_service, "_load_config", lambda search_path, webhook_id: {"name": "crm", "url": "https://example.test/hook", "secret": None})
+    monkeypatch.setattr(webhook_service, "_with_session", lambda fn, *args: fn(None, *args))
+    monkeypatch.setattr(webhook_service, "JobQueue", SimpleNamespace(claim_group=queue.claim_group, complete=queue.complete, fail=queue.fail))
+    payload = {"search_path": "tenant_a", "webhook_id": 7, "event": event(1)}
+    asyncio.run(handle_webhook_delivery(payload))
+
+
+def test_handler_batches_queued_siblings(monkeypatch):
+    pool = FakePool()
+    siblings = [SimpleNamespace(id=i, attempts=1, max_attempts=5, payload={"event": event(i)}) for i in (2, 3)]
+    queue = FakeQueue(siblings)
+
+    run_handler(monkeypatch, pool, queue)
+
+    assert queue.claimed == ("webhook.deliver", "tenant_a:7", 9)
+    assert [e["id"] for e in json.loads(pool.requests[0]["content"])["events"]] == ["ev1", "ev2", "ev3"]
+    assert queue.completed == [2, 3] and queue.failed == []
+
+
+def test_handler_fails_siblings_with_the_batch(monkeypatch):
+    siblings = [SimpleNamespace(id=2, attempts=1, max_attempts=5, payload={"event": event(2)})]
+    queue = FakeQueue(siblings)
+
+    with pytest.raises(RuntimeError):
+        run_handler(monkeypatch, FakePool(status=500), queue)
+
+    assert queue.completed == []
+    assert [job_id for job_id, _ in queue.failed] == [2]